@@ -0,0 +1,55 @@
+import unittest
+import unittest.mock
+
+from wattro_sync.file_access import cache
+
+
+class TestFileCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.mock_read_write = unittest.mock.patch(
+            "wattro_sync.file_access.cache.read_write"
+        ).start()
+        self.mock_read_write.read.return_value = {}
+        self.mock_time = unittest.mock.patch(
+            "wattro_sync.file_access.cache.time.time", return_value=1000.0
+        ).start()
+
+    def tearDown(self) -> None:
+        unittest.mock.patch.stopall()
+
+    def test_roundtrip(self) -> None:
+        file_cache = cache.FileCache("schema_cache", ttl=10)
+        file_cache.put("key", ["a", "b"])
+        self.assertEqual(["a", "b"], file_cache.get("key"))
+        self.mock_read_write.write.assert_called_once()
+
+    def test_expires(self) -> None:
+        file_cache = cache.FileCache("schema_cache", ttl=10)
+        file_cache.put("key", "value")
+        self.mock_time.return_value += 11
+        self.assertIsNone(file_cache.get("key"))
+
+    def test_version_mismatch(self) -> None:
+        file_cache = cache.FileCache("schema_cache", ttl=10)
+        file_cache.put("key", "value", version="1")
+        self.assertIsNone(file_cache.get("key", version="2"))
+        self.assertEqual("value", file_cache.get("key", version="1"))
+
+    def test_invalidate(self) -> None:
+        file_cache = cache.FileCache("schema_cache", ttl=10)
+        file_cache.put("a", 1)
+        file_cache.put("b", 2)
+        file_cache.invalidate("a")
+        self.assertIsNone(file_cache.get("a"))
+        self.assertEqual(2, file_cache.get("b"))
+        file_cache.invalidate()
+        self.assertEqual({}, file_cache.entries)
+
+    def test_key_hides_connection_str(self) -> None:
+        key = cache.cache_key("Server=secret;Database=Mosaik", "table")
+        self.assertNotIn("secret", key)
+        self.assertEqual(key, cache.cache_key("Server=secret;Database=Mosaik", "table"))
+
+
+if __name__ == "__main__":
+    unittest.main()
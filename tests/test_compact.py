@@ -0,0 +1,63 @@
+import pathlib
+import sqlite3
+import tempfile
+import unittest
+
+from wattro_sync.api.sqlite_api import SQLiteSyncInfo
+from wattro_sync.api.src_cli import CollectionInfo
+from wattro_sync.config_reader.types import ConnectionStructure, FieldMapping
+from wattro_sync.fake_node import FakeNode
+from wattro_sync.file_access import read_write
+from wattro_sync.sync import SyncState, compact
+
+FIELD_MAPPING = FieldMapping({"human_id": {"type": "string", "src": "{id}"}})
+
+
+class TestCompact(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = pathlib.Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(read_write.use_base_folder(tmp_dir))
+        self.db_path = str(tmp_dir / "src.sqlite3")
+        cnxn = sqlite3.connect(self.db_path)
+        # the source only returns part of the records, e.g. the latest changes
+        cnxn.execute("CREATE TABLE items (id INTEGER)")
+        cnxn.executemany("INSERT INTO items VALUES (?)", [(2,), (3,)])
+        cnxn.commit()
+        cnxn.close()
+        self.con_struct = ConnectionStructure(
+            connection_type="SQLite",
+            sync_info=SQLiteSyncInfo(
+                self.db_path, CollectionInfo("items", ["id"], "id")
+            ),
+            field_mapping=FIELD_MAPPING,
+        )
+        self.node = self.enterContext(FakeNode())
+        self.state = SyncState()
+        hist = self.state.get_history()
+        for idx in range(1, 5):
+            hist.update("asset", {"id": idx}, "id", f"hash {idx}")
+
+    def test_keeps_idents_known_to_either_side(self) -> None:
+        self.node.store["asset"] = {"1": {}, "2": {}}
+        removed, reclaimed = compact(
+            "asset", self.con_struct, self.node.api(), self.state
+        )
+        self.assertEqual(1, removed)
+        self.assertGreater(reclaimed, 0)
+        self.assertEqual(
+            ["1", "2", "3"], sorted(self.state.get_history().full_hist["asset"])
+        )
+
+    def test_empty_answer_keeps_everything(self) -> None:
+        cnxn = sqlite3.connect(self.db_path)
+        cnxn.execute("DELETE FROM items")
+        cnxn.commit()
+        cnxn.close()
+        self.assertEqual(
+            (0, 0), compact("asset", self.con_struct, self.node.api(), self.state)
+        )
+        self.assertEqual(4, len(self.state.get_history().full_hist["asset"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+import pathlib
+import sqlite3
+import tempfile
+import unittest
+import unittest.mock
+
+from wattro_sync.api.rest_api import RequestRejected, WattroNodeApi
+from wattro_sync.api.sqlite_api import SQLiteSyncInfo
+from wattro_sync.api.src_cli import CollectionInfo
+from wattro_sync.config_reader.types import ConnectionStructure, FieldMapping
+from wattro_sync.fake_node import FakeNode
+from wattro_sync.file_access import read_write
+from wattro_sync.file_access.dead_letter import DeadLetters
+from wattro_sync.sync import SyncState, TransformedRecords, isolate_rejected, sync
+
+FIELD_MAPPING = FieldMapping(
+    {
+        "human_id": {"type": "string", "src": "{id}"},
+        "title": {"type": "string", "src": "{name}"},
+    }
+)
+
+
+class TestDeadLetters(unittest.TestCase):
+    def setUp(self) -> None:
+        self.mock_read_write = unittest.mock.patch(
+            "wattro_sync.file_access.dead_letter.read_write"
+        ).start()
+        self.mock_read_write.read.return_value = {}
+        self.now = 0.0
+        self.dead_letters = DeadLetters(clock=lambda: self.now)
+
+    def tearDown(self) -> None:
+        unittest.mock.patch.stopall()
+
+    def test_backoff_doubles(self) -> None:
+        first = self.dead_letters.record("asset", "7", "abc", "400: kaputt")
+        self.assertEqual(DeadLetters.BASE_BACKOFF, first["next_try"])
+        self.now = first["next_try"]
+        second = self.dead_letters.record("asset", "7", "abc", "400: kaputt")
+        self.assertEqual(2, second["attempts"])
+        self.assertEqual(self.now + 2 * DeadLetters.BASE_BACKOFF, second["next_try"])
+        self.assertEqual(0.0, second["first_failed"])
+
+    def test_backoff_is_capped(self) -> None:
+        for _ in range(20):
+            entry = self.dead_letters.record("asset", "7", "abc", "err")
+        self.assertEqual(DeadLetters.MAX_BACKOFF, entry["next_try"])
+
+    def test_skip_until_due_or_changed(self) -> None:
+        self.dead_letters.record("asset", "7", "abc", "err")
+        self.assertTrue(self.dead_letters.should_skip("asset", "7", "abc"))
+        self.assertFalse(self.dead_letters.should_skip("asset", "7", "changed"))
+        self.assertFalse(self.dead_letters.should_skip("asset", "8", "abc"))
+        self.now = DeadLetters.BASE_BACKOFF
+        self.assertFalse(self.dead_letters.should_skip("asset", "7", "abc"))
+
+    def test_requeue(self) -> None:
+        self.dead_letters.record("asset", "7", "abc", "err")
+        self.dead_letters.record("asset", "8", "def", "err")
+        self.assertEqual(1, self.dead_letters.requeue("asset", ["8", "9"]))
+        self.assertTrue(self.dead_letters.should_skip("asset", "7", "abc"))
+        self.assertFalse(self.dead_letters.should_skip("asset", "8", "def"))
+        self.assertEqual(2, self.dead_letters.requeue("asset"))
+
+    def test_save_drops_resolved(self) -> None:
+        self.dead_letters.save()
+        self.mock_read_write.write.assert_not_called()
+        self.dead_letters.record("asset", "7", "abc", "err")
+        self.dead_letters.resolve("asset", "7")
+        self.dead_letters.save()
+        self.mock_read_write.write.assert_called_once_with("dead_letter", {})
+        self.assertEqual(0, len(self.dead_letters))
+
+
+class TestIsolateRejected(unittest.TestCase):
+    def test_bisects_to_the_rejected_record(self) -> None:
+        rows = [{"id": idx, "name": f"Pumpe {idx}"} for idx in range(4)]
+        records = TransformedRecords(rows, FIELD_MAPPING, "utf-8")
+        with FakeNode() as node:
+            # 0-1 ok, 2-3 and 2 rejected, 3 ok
+            node.responses = [(200, {}), (400, {}), (400, {})]
+            complete, accepted, rejected = isolate_rejected(
+                node.api(), "asset", records, RequestRejected("400: alle")
+            )
+        self.assertTrue(complete)
+        self.assertEqual([range(0, 2), range(3, 4)], sorted(accepted, key=min))
+        self.assertEqual([2], list(rejected))
+        self.assertIn("RequestRejected", rejected[2])
+        created = [rec["human_id"] for body in node.posted for rec in body["new_data"]]
+        self.assertEqual(["0", "1", "3"], created)
+
+    def test_gives_up_on_the_same_error(self) -> None:
+        rows = [{"id": idx, "name": f"Pumpe {idx}"} for idx in range(8)]
+        records = TransformedRecords(rows, FIELD_MAPPING, "utf-8")
+        with FakeNode() as node, self.assertLogs(level="ERROR"):
+            node.responses = [(400, {}), (400, {})]
+            complete, accepted, rejected = isolate_rejected(
+                node.api(), "asset", records, RequestRejected("400: alle")
+            )
+        self.assertFalse(complete)
+        self.assertEqual(([], {}), (accepted, rejected))
+        # no further requests after the two halves
+        self.assertEqual([], node.responses)
+        self.assertEqual([], node.posted)
+
+    def test_connection_error_keeps_accepted(self) -> None:
+        rows = [{"id": idx, "name": f"Pumpe {idx}"} for idx in range(4)]
+        records = TransformedRecords(rows, FIELD_MAPPING, "utf-8")
+        api = unittest.mock.Mock(
+            bulk_create=unittest.mock.Mock(side_effect=[None, ConnectionError("weg")])
+        )
+        with self.assertLogs(level="ERROR"):
+            complete, accepted, rejected = isolate_rejected(
+                api, "asset", records, RequestRejected("400: alle")
+            )
+        self.assertFalse(complete)
+        self.assertEqual(([range(0, 2)], {}), (accepted, rejected))
+
+    def test_transform_errors_are_collected(self) -> None:
+        rows: list[dict] = [{"id": 1, "name": "a"}, {"id": 2}]
+        records = TransformedRecords(rows, FIELD_MAPPING, "utf-8")
+        self.assertEqual(["1"], [rec["human_id"] for rec in records])
+        self.assertEqual([1], list(records.failed))
+        self.assertIn("KeyError", records.failed[1])
+
+
+class TestSyncQuarantine(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = pathlib.Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(read_write.use_base_folder(tmp_dir))
+        self.db_path = str(tmp_dir / "src.sqlite3")
+        cnxn = sqlite3.connect(self.db_path)
+        cnxn.execute("CREATE TABLE items (id INTEGER, name TEXT)")
+        cnxn.executemany(
+            "INSERT INTO items VALUES (?, ?)",
+            [(idx, f"Pumpe {idx}") for idx in range(4)],
+        )
+        cnxn.commit()
+        cnxn.close()
+        self.con_struct = ConnectionStructure(
+            connection_type="SQLite",
+            sync_info=SQLiteSyncInfo(
+                self.db_path, CollectionInfo("items", ["id", "name"], "id")
+            ),
+            field_mapping=FIELD_MAPPING,
+        )
+        self.node = self.enterContext(FakeNode())
+        self.state = SyncState()
+        self.state.validated.add("asset")
+
+    def sync(self) -> tuple[int, int]:
+        return sync("asset", self.con_struct, self.node.api(), False, self.state)
+
+    def test_rejected_record_is_quarantined_until_it_changes(self) -> None:
+        # all four, then 0-1 ok, 2-3 and 2 rejected, 3 ok
+        self.node.responses = [(400, {}), (200, {}), (400, {}), (400, {})]
+        self.assertEqual((3, 1), self.sync())
+        dead_letters = self.state.get_dead_letters()
+        (rejected,) = dead_letters.keys("asset")
+        self.assertNotIn(rejected, self.state.get_history().full_hist["asset"])
+        self.assertNotIn(rejected, self.node.store["asset"])
+
+        # unchanged and not due yet: skipped without a request
+        posted = len(self.node.posted)
+        self.assertEqual((0, 0), self.sync())
+        self.assertEqual(posted, len(self.node.posted))
+
+        cnxn = sqlite3.connect(self.db_path)
+        cnxn.execute("UPDATE items SET name = 'repariert' WHERE id = ?", (rejected,))
+        cnxn.commit()
+        cnxn.close()
+        self.assertEqual((1, 0), self.sync())
+        self.assertEqual(set(), dead_letters.keys("asset"))
+        self.assertIn(rejected, self.state.get_history().full_hist["asset"])
+
+    def test_accepted_halves_are_kept_when_the_write_fails(self) -> None:
+        bulk_create = WattroNodeApi.bulk_create
+        calls = []
+
+        def flaky(api: WattroNodeApi, target: str, records: TransformedRecords) -> None:
+            calls.append(target)
+            if len(calls) == 3:
+                raise ConnectionError("weg")
+            bulk_create(api, target, records)
+
+        # all four rejected, 0-1 ok, then the connection is lost
+        self.node.responses = [(400, {})]
+        with unittest.mock.patch.object(
+            WattroNodeApi, "bulk_create", autospec=True, side_effect=flaky
+        ), self.assertLogs(level="ERROR"):
+            self.assertEqual((2, 2), self.sync())
+        self.assertEqual({"0", "1"}, set(self.state.get_history().full_hist["asset"]))
+        self.assertEqual(set(), self.state.get_dead_letters().keys("asset"))
+
+        posted = len(self.node.posted)
+        self.assertEqual((2, 0), self.sync())
+        created = [
+            rec["human_id"]
+            for body in self.node.posted[posted:]
+            for rec in body["new_data"]
+        ]
+        self.assertEqual(["2", "3"], created)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from wattro_sync.api.decoding import DecoderPlan
+from wattro_sync.api.src_cli import DBRes
+
+DESCRIPTION = ["id", "name", "blob"]
+ROWS = [
+    (1, "a", b"\xc3\xa4"),
+    (2, None, b"plain"),
+    (3, "c", None),
+]
+
+
+class TestDecoderPlan(unittest.TestCase):
+    def test_decodes_like_before(self) -> None:
+        plan = DecoderPlan(DESCRIPTION, ROWS, "utf-8")
+        self.assertEqual(
+            [
+                {"id": 1, "name": "a", "blob": "ä"},
+                {"id": 2, "name": "", "blob": "plain"},
+                {"id": 3, "name": "c", "blob": ""},
+            ],
+            list(plan.decode_rows(ROWS)),
+        )
+
+    def test_clean_columns_are_skipped(self) -> None:
+        plan = DecoderPlan(DESCRIPTION, ROWS, "utf-8")
+        self.assertEqual(["name", "blob"], [key for key, _ in plan.decoders])
+
+    def test_type_codes_skip_scan(self) -> None:
+        # the description says: never NULL, never bytes. So nothing is touched.
+        rows = [(1, None, b"x")]
+        plan = DecoderPlan(
+            DESCRIPTION, rows, "utf-8", [int, str, str], [False, False, False]
+        )
+        self.assertEqual([], plan.decoders)
+
+    def test_binary_type_code(self) -> None:
+        plan = DecoderPlan(["blob"], [], "utf-8", [bytes], [False])
+        self.assertEqual(["blob"], [key for key, _ in plan.decoders])
+
+    def test_warns_once_per_column(self) -> None:
+        rows = [(b"\xe4",), (b"\xe4b",), (b"ok",)]
+        plan = DecoderPlan(["blob"], rows, "utf-8")
+        with self.assertLogs(level="WARNING") as logs:
+            decoded = list(plan.decode_rows(rows))
+        self.assertEqual(1, len(logs.records))
+        self.assertEqual([{"blob": ""}, {"blob": "b"}, {"blob": "ok"}], decoded)
+
+
+class TestDBResDecoding(unittest.TestCase):
+    def test_plan_is_built_once(self) -> None:
+        res = DBRes(DESCRIPTION, ROWS)
+        list(res.iter_decoded("utf-8"))
+        plan = res._plans["utf-8"]
+        list(res.iter_decoded("utf-8"))
+        self.assertIs(plan, res._plans["utf-8"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import json
+import pathlib
+import sqlite3
+import tempfile
+import unittest
+
+from wattro_sync.api.sqlite_api import SQLiteSyncInfo
+from wattro_sync.api.src_cli import CollectionInfo
+from wattro_sync.config_reader.types import ConnectionStructure, FieldMapping
+from wattro_sync.fake_node import FakeNode
+from wattro_sync.file_access import read_write
+from wattro_sync.file_access.stats import RequestTimings
+from wattro_sync.hash_history import history
+from wattro_sync.sync import (
+    Estimate,
+    SyncState,
+    _estimate_payload_bytes,
+    estimate,
+    transform,
+)
+
+FIELD_MAPPING = FieldMapping(
+    {
+        "human_id": {"type": "string", "src": "{id}"},
+        "title": {"type": "string", "src": "{name}"},
+    }
+)
+ROWS = [(1, "Pumpe"), (2, "Ventil"), (3, "Motor"), (4, "Lager"), (5, "Filter")]
+
+
+class TestEstimate(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = pathlib.Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(read_write.use_base_folder(tmp_dir))
+        db_path = str(tmp_dir / "src.sqlite3")
+        cnxn = sqlite3.connect(db_path)
+        cnxn.execute("CREATE TABLE items (id INTEGER, name TEXT)")
+        cnxn.executemany("INSERT INTO items VALUES (?, ?)", ROWS)
+        cnxn.commit()
+        cnxn.close()
+        self.con_struct = ConnectionStructure(
+            connection_type="SQLite",
+            sync_info=SQLiteSyncInfo(
+                db_path, CollectionInfo("items", ["id", "name"], "id")
+            ),
+            field_mapping=FIELD_MAPPING,
+        )
+        self.node = self.enterContext(FakeNode())
+        # 1-3 are known to wattro, 1 and 2 did not change since the last sync
+        self.node.store["asset"] = {str(idx): {} for idx in (1, 2, 3)}
+        self.state = SyncState()
+        hist = self.state.get_history()
+        for row in [{"id": 1, "name": "Pumpe"}, {"id": 2, "name": "Ventil"}]:
+            record = transform([row], FIELD_MAPPING, "utf-8")[0]
+            hist.update("asset", row, "id", history.hash_record(record))
+        hist.update("asset", {"id": 3}, "id", "outdated")
+
+    def estimate(self, sample_size: int = 200) -> Estimate:
+        estimation = estimate(
+            "asset", self.con_struct, self.node.api(), self.state, sample_size
+        )
+        assert estimation is not None  # nosec
+        return estimation
+
+    def test_counts(self) -> None:
+        estimation = self.estimate()
+        self.assertEqual(
+            (2, 1, 2), (estimation.new, estimation.changed, estimation.unchanged)
+        )
+        self.assertFalse(estimation.approximate)
+        # one bulk create and one update
+        self.assertEqual(2, estimation.requests)
+        self.assertEqual([], self.node.posted)
+
+    def test_no_timings_yet(self) -> None:
+        estimation = self.estimate()
+        self.assertIsNone(estimation.seconds)
+        with self.assertLogs(level="INFO") as logs:
+            estimation.log()
+        self.assertIn("Laufzeit: unbekannt", logs.output[0])
+
+    def test_extrapolated_from_sample(self) -> None:
+        estimation = self.estimate(sample_size=1)
+        self.assertTrue(estimation.approximate)
+        # the one sampled row stands for all 3 known rows
+        self.assertIn(estimation.changed, (0, 3))
+        self.assertEqual(3, estimation.changed + estimation.unchanged)
+        with self.assertLogs(level="INFO") as logs:
+            estimation.log()
+        self.assertIn("ca. %i geändert" % estimation.changed, logs.output[0])
+
+    def test_runtime_projection(self) -> None:
+        timings = self.state.get_timings()
+        timings.record("asset", "bulk", 1.0, 100)
+        timings.record("asset", "update", 0.5, 1)
+        timings.record("asset", "update", 1.5, 1)
+        seconds = self.estimate().seconds
+        assert seconds is not None  # nosec
+        # 2 new at 0.01 s and 1 changed at 1 s
+        self.assertAlmostEqual(1.02, seconds)
+
+    def test_runtime_unknown_for_one_kind(self) -> None:
+        self.state.get_timings().record("asset", "bulk", 1.0, 100)
+        self.assertIsNone(self.estimate().seconds)
+
+    def test_payload_bytes(self) -> None:
+        # the new 4 and 5 and the changed 3
+        records = [
+            {"human_id": "4", "title": "Lager"},
+            {"human_id": "5", "title": "Filter"},
+            {"human_id": "3", "title": "Motor"},
+        ]
+        expected = sum(len(json.dumps(record).encode()) for record in records)
+        self.assertEqual(expected, self.estimate().payload_bytes)
+
+
+class TestEstimatePayloadBytes(unittest.TestCase):
+    def setUp(self) -> None:
+        self.con_struct = ConnectionStructure(
+            connection_type="SQLite",
+            sync_info=SQLiteSyncInfo("unused", CollectionInfo.empty()),
+            field_mapping=FIELD_MAPPING,
+        )
+
+    def test_empty(self) -> None:
+        self.assertEqual(0, _estimate_payload_bytes([], self.con_struct))
+
+    def test_extrapolated_from_sample(self) -> None:
+        rows = [{"id": idx, "name": "x" * 10} for idx in range(100, 200)]
+        size = len(json.dumps({"human_id": "100", "title": "x" * 10}).encode())
+        self.assertEqual(
+            100 * size, _estimate_payload_bytes(rows, self.con_struct, sample_size=5)
+        )
+
+
+class TestRequestTimings(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = pathlib.Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(read_write.use_base_folder(tmp_dir))
+        self.timings = RequestTimings()
+
+    def test_seconds_per_record(self) -> None:
+        self.assertIsNone(self.timings.seconds_per_record("asset", "bulk"))
+        self.timings.record("asset", "bulk", 2.0, 100)
+        self.timings.record("asset", "bulk", 1.0, 50)
+        self.assertEqual(0.02, self.timings.seconds_per_record("asset", "bulk"))
+        self.assertIsNone(self.timings.seconds_per_record("asset", "update"))
+
+    def test_window(self) -> None:
+        for _ in range(RequestTimings.WINDOW):
+            self.timings.record("asset", "update", 10.0, 1)
+        self.timings.record("asset", "update", 10.0 + RequestTimings.WINDOW, 1)
+        samples = self.timings.stats["asset"]["update"]
+        self.assertEqual(RequestTimings.WINDOW, len(samples))
+        self.assertEqual(11.0, self.timings.seconds_per_record("asset", "update"))
+
+    def test_saved(self) -> None:
+        self.timings.record("asset", "bulk", 1.0, 10)
+        self.timings.save()
+        self.assertEqual(0.1, RequestTimings().seconds_per_record("asset", "bulk"))
+
+
+if __name__ == "__main__":
+    unittest.main()
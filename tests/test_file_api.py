@@ -0,0 +1,113 @@
+import gzip
+import json
+import pathlib
+import tempfile
+import unittest
+
+from wattro_sync.api.file_api import FileApi, FileSyncInfo
+from wattro_sync.api.src_cli import CollectionInfo
+from wattro_sync.config_reader.types import ConfigDegenerated
+
+RECORDS = [
+    {"id": 1, "name": "Pumpe", "note": "läuft"},
+    {"id": 2, "name": "Ventil", "note": "zeile 1\nzeile 2"},
+    {"id": 3, "name": "Pumpe", "note": ""},
+]
+CSV = 'id;name;note\n1;Pumpe;läuft\n2;Ventil;"zeile 1\nzeile 2"\n3;Pumpe;\n'
+
+
+class TestFileApi(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = pathlib.Path(self.tmp_dir.name)
+        (self.folder / "items.csv").write_text(CSV, encoding="latin-1")
+        with gzip.open(self.folder / "items.jsonl.gz", "wt", encoding="utf-8") as fp:
+            for record in RECORDS:
+                fp.write(json.dumps(record) + "\n\n")
+        (self.folder / "readme.txt").write_text("no source")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def get_api(self, file_name: str, ident: str = "id") -> FileApi:
+        collection_info = CollectionInfo(file_name, ["id", "name", "note"], ident)
+        if file_name.endswith(".csv"):
+            return FileApi(
+                FileSyncInfo(str(self.folder), collection_info, "latin-1", ";")
+            )
+        return FileApi(FileSyncInfo(str(self.folder), collection_info))
+
+    def test_csv(self) -> None:
+        api = self.get_api("items.csv")
+        self.assertEqual(
+            [{"id": "1", "name": "Pumpe", "note": "läuft"}], list(api.get_old(["1"]))
+        )
+        self.assertEqual(["2", "3"], [row["id"] for row in api.get_new(["1"])])
+        self.assertEqual("zeile 1\nzeile 2", api.get_old(["2"])[0]["note"])
+        # empty cells are NULL, like in a database
+        self.assertIsNone(api.get_old(["3"])[0]["note"])
+
+    def test_encoding_errors_surface(self) -> None:
+        collection_info = CollectionInfo("items.csv", ["id", "name", "note"], "id")
+        api = FileApi(FileSyncInfo(str(self.folder), collection_info, delimiter=";"))
+        with self.assertRaises(ConnectionError):
+            api.get_new([])
+        api = FileApi(
+            FileSyncInfo(
+                str(self.folder), collection_info, delimiter=";", file_errors="replace"
+            )
+        )
+        self.assertEqual("l\ufffduft", api.get_old(["1"])[0]["note"])
+
+    def test_gzipped_jsonl(self) -> None:
+        api = self.get_api("items.jsonl.gz")
+        self.assertEqual(RECORDS, list(api.get_new([])))
+        self.assertEqual(["1", "2", "3"], api.get_idents())
+        self.assertEqual([], list(api.get_old([])))
+
+    def test_skips_non_objects(self) -> None:
+        lines = [
+            json.dumps(RECORDS[0]),
+            "[1, 2]",
+            "42",
+            "{kaputt",
+            json.dumps(RECORDS[1]),
+        ]
+        (self.folder / "mixed.jsonl").write_text("\n".join(lines), encoding="utf-8")
+        api = self.get_api("mixed.jsonl")
+        with self.assertLogs(level="WARNING") as logs:
+            self.assertEqual(RECORDS[:2], list(api.get_new([])))
+        self.assertEqual(3, len(logs.output))
+        self.assertIn("Zeile 2", logs.output[0])
+
+    def test_projection(self) -> None:
+        api = self.get_api("items.jsonl.gz")
+        api.project({"name"})
+        self.assertEqual([{"id": 3, "name": "Pumpe"}], list(api.get_old(["3"])))
+
+    def test_dup_idents(self) -> None:
+        api = self.get_api("items.csv", ident="name")
+        self.assertEqual(
+            [{"name": "Pumpe", "dup_count": 2}], list(api.get_dup_idents())
+        )
+
+    def test_collections_and_fields(self) -> None:
+        self.assertEqual(
+            ["items.csv", "items.jsonl.gz"], FileApi.get_collections(str(self.folder))
+        )
+        fields, samples = FileApi.get_fields(str(self.folder), "items.jsonl.gz")
+        self.assertEqual(["id", "name", "note"], fields)
+        self.assertEqual([1, 2, 3], samples["id"])
+
+    def test_config(self) -> None:
+        info = FileSyncInfo("x.csv", CollectionInfo.empty(), delimiter=";").asdict()
+        self.assertEqual(";", FileSyncInfo.from_dict(info).delimiter)
+        with self.assertRaises(ConfigDegenerated):
+            FileSyncInfo.from_dict({**info, "delimiter": ";;"})
+        self.assertEqual("strict", FileSyncInfo.from_dict(info).file_errors)
+        with self.assertRaises(ConfigDegenerated):
+            FileSyncInfo.from_dict({**info, "file_errors": "skip"})
+
+
+if __name__ == "__main__":
+    unittest.main()
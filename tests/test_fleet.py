@@ -0,0 +1,65 @@
+import argparse
+import json
+import pathlib
+import tempfile
+import unittest
+import unittest.mock
+
+from wattro_sync import fleet
+from wattro_sync.file_access import read_write
+
+
+class TestFleet(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = pathlib.Path(self.tmp.name)
+        for tenant in ["a", "b", "broken"]:
+            (self.folder / tenant).mkdir()
+            cfg = {"wattro_cfg": {"domain": tenant, "api_key": "key"}}
+            (self.folder / tenant / "cfg.json").write_text(json.dumps(cfg))
+        (self.folder / "no_tenant").mkdir()
+        self.args = argparse.Namespace(limit_target=None, limit_src=None)
+
+    def tearDown(self) -> None:
+        unittest.mock.patch.stopall()
+        self.tmp.cleanup()
+
+    def test_find_tenants(self) -> None:
+        self.assertEqual(
+            ["a", "b", "broken"],
+            [path.name for path in fleet.find_tenants(self.folder)],
+        )
+
+    def test_isolation(self) -> None:
+        def healthy_api(domain: str, **_) -> unittest.mock.Mock:
+            if domain == "broken":
+                raise ConnectionError("unreachable")
+            return unittest.mock.Mock(domain=domain)
+
+        seen = {}
+
+        def run_once(args, targets, wattro_api, mail_api, state) -> tuple[int, int]:
+            seen[wattro_api.domain] = read_write.get_base_folder_path()
+            return 2, 0
+
+        unittest.mock.patch.object(
+            fleet.WattroNodeApi, "get_healthy_api", side_effect=healthy_api
+        ).start()
+        unittest.mock.patch.object(fleet, "run_once", side_effect=run_once).start()
+        sessions = fleet.SessionPool(pool_size=2)
+        results = {
+            tenant.name: fleet.run_tenant(tenant, self.args, sessions, None)
+            for tenant in fleet.find_tenants(self.folder)
+        }
+        self.assertEqual({"a": self.folder / "a", "b": self.folder / "b"}, seen)
+        self.assertEqual(
+            (2, 0, None), (results["a"].success, results["a"].fail, results["a"].error)
+        )
+        self.assertEqual("unreachable", results["broken"].error)
+        self.assertEqual(["a", "b", "broken"], sorted(sessions.sessions))
+        # the context is left again
+        self.assertNotEqual(self.folder / "b", read_write.get_base_folder_path())
+
+
+if __name__ == "__main__":
+    unittest.main()
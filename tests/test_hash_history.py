@@ -1,10 +1,14 @@
 import copy
+import pathlib
 import random
+import tempfile
 import unittest
 import unittest.mock
 
+from wattro_sync.config_reader.types import ConfigDegenerated
 from wattro_sync.hash_history import history
 from wattro_sync.hash_history.history import HashHistory
+from wattro_sync.hash_history.index import HashIndex
 
 
 class FileAccessMock(unittest.TestCase):
@@ -14,6 +18,10 @@ class FileAccessMock(unittest.TestCase):
         ).start()
         self.mock_read_write.get_or_create.return_value = ("mock_path", False)
         self.mock_read_write.read.return_value = {}
+        self.tmp_dir = pathlib.Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.mock_read_write.side_path.side_effect = (
+            lambda file_type, name: self.tmp_dir / f"{file_type}.{name}"
+        )
 
     def tearDown(self) -> None:
         unittest.mock.patch.stopall()
@@ -205,5 +213,165 @@ class TestIterChanged(FileAccessMock):
         self.assertOneChanged(ident, ident_val, to_check, hh)
 
 
+class TestCompact(FileAccessMock):
+    def test_drops_stale(self) -> None:
+        self.mock_read_write.read.return_value = {
+            "target": {"1": "a", "2": "b", "3": "c"},
+            "other": {"1": "a"},
+        }
+        hh = history.HistoryHandler()
+        removed, reclaimed = hh.compact("target", [1, "3", "4"])
+        self.assertEqual(1, removed)
+        self.assertGreater(reclaimed, 0)
+        self.assertEqual({"1": "a", "3": "c"}, hh.full_hist["target"])
+        self.assertEqual({"1": "a"}, hh.full_hist["other"])
+
+    def test_nothing_to_do(self) -> None:
+        self.mock_read_write.read.return_value = {"target": {"1": "a"}}
+        hh = history.HistoryHandler()
+        self.assertEqual((0, 0), hh.compact("target", ["1"]))
+        self.assertEqual((0, 0), hh.compact("unknown", []))
+
+
+class TestRecordHashes(FileAccessMock):
+    def test_migrates_raw_row_hashes(self) -> None:
+        rows = [{"id": 1, "name": "a", "unmapped": 1}, {"id": 2, "name": "b"}]
+        records = [{"human_id": "1", "title": "a"}, {"human_id": "2", "title": "B"}]
+        hashes = [history.hash_record(record) for record in records]
+        # written by an older version: hash of the raw row
+        self.mock_read_write.read.return_value = {
+            "target": {"1": history._hashed(rows[0]), "2": "outdated"}
+        }
+        hh = history.HistoryHandler()
+        changed = list(hh.iter_changed_hashed("target", rows, "id", hashes))
+        self.assertEqual([(rows[1], hashes[1])], changed)
+        self.assertEqual(1, hh.migrated)
+        self.assertEqual(hashes[0], hh.full_hist["target"]["1"])
+        self.assertEqual([], list(hh.iter_changed("target", rows[:1], "id", hashes)))
+
+    def test_update_stores_given_hash(self) -> None:
+        hh = history.HistoryHandler()
+        hh.update("target", {"id": 1}, "id", "abc")
+        self.assertEqual({"1": "abc"}, hh.full_hist["target"])
+
+
+class TestFieldHashes(FileAccessMock):
+    def test_roundtrip(self) -> None:
+        self.mock_read_write.read.return_value = {
+            "target": {"1": "a"},
+            history.FIELDS_KEY: {
+                "target": {"fields": ["title"], "hashes": {"1": "abcabcabcabc"}}
+            },
+        }
+        hh = history.HistoryHandler()
+        self.assertEqual(["target"], list(hh.full_hist))
+        self.assertEqual({"title": "abcabcabcabc"}, hh.get_field_hashes("target", "1"))
+        self.assertIsNone(hh.get_field_hashes("target", "2"))
+        hh.update_field_hashes("target", "2", {"title": "def", "state": "123"})
+        hh.save()
+        saved = self.mock_read_write.write.call_args.args[1]
+        self.assertEqual({"1": "a"}, saved["target"])
+        self.assertEqual(
+            {
+                "fields": ["title", "state"],
+                "hashes": {"1": "abcabcabcabc", "2": "def123"},
+            },
+            saved[history.FIELDS_KEY]["target"],
+        )
+
+    def test_migrates_per_field_dicts(self) -> None:
+        self.mock_read_write.read.return_value = {
+            history.FIELDS_KEY: {"target": {"1": {"title": "abcabcabcabc"}}},
+        }
+        hh = history.HistoryHandler()
+        self.assertEqual({"title": "abcabcabcabc"}, hh.get_field_hashes("target", "1"))
+
+    def test_switches_to_index(self) -> None:
+        hashes = [history.hash_fields({"title": i}) for i in range(20)]
+        with unittest.mock.patch.object(
+            history.HistoryHandler, "INDEX_MIN_ENTRIES", 10
+        ):
+            hh = history.HistoryHandler()
+            for i, field_hashes in enumerate(hashes):
+                hh.update_field_hashes("target", str(i), field_hashes)
+        self.assertIsInstance(hh.field_hashes["target"].packed, HashIndex)
+        self.assertEqual(hashes[3], hh.get_field_hashes("target", "3"))
+        # a new field widens the index
+        grown = history.hash_fields({"title": 3, "state": "open"})
+        hh.update_field_hashes("target", "3", grown)
+        self.assertEqual(grown, hh.get_field_hashes("target", "3"))
+        self.assertEqual(hashes[4], hh.get_field_hashes("target", "4"))
+        self.assertIsInstance(hh.field_hashes["target"].packed, HashIndex)
+
+    def test_compact_drops_field_hashes(self) -> None:
+        self.mock_read_write.read.return_value = {
+            "target": {"1": "a", "2": "b"},
+            history.FIELDS_KEY: {"target": {"2": {"title": "abc"}}},
+        }
+        hh = history.HistoryHandler()
+        hh.compact("target", ["1"])
+        self.assertIsNone(hh.get_field_hashes("target", "2"))
+
+    def test_hash_fields(self) -> None:
+        hashes = history.hash_fields({"a": 1, "b": "1"})
+        self.assertEqual(history.FIELD_HASH_CHARS, len(hashes["a"]))
+        self.assertNotEqual(hashes["a"], hashes["b"])
+
+
+class TestLargeTarget(FileAccessMock):
+    def test_switches_to_index(self) -> None:
+        self.mock_read_write.read.return_value = {"big": {}, "small": {}}
+        with unittest.mock.patch.object(
+            history.HistoryHandler, "INDEX_MIN_ENTRIES", 10
+        ):
+            hh = history.HistoryHandler()
+            values = [{"id": i, "val": i} for i in range(20)]
+            for val in values:
+                hh.update("big", val, "id")
+            hh.update("small", values[0], "id")
+        self.assertIsInstance(hh.full_hist["big"], HashIndex)
+        self.assertIsInstance(hh.full_hist["small"], dict)
+        changed = {**values[3], "val": "x"}
+        self.assertEqual(
+            [changed], list(hh.iter_changed("big", values[:3] + [changed], "id"))
+        )
+        hh.save()
+        saved = self.mock_read_write.write.call_args.args[1]
+        # the index is streamed to its own file, not into history.json
+        self.assertEqual({}, saved["big"])
+        self.assertEqual(1, len(saved["small"]))
+        self.assertTrue((self.tmp_dir / "history.big.idx").is_file())
+        self.assertFalse((self.tmp_dir / "history.small.idx").exists())
+
+        self.mock_read_write.read.return_value = saved
+        loaded = history.HistoryHandler()
+        self.assertIsInstance(loaded.full_hist["big"], HashIndex)
+        self.assertEqual(dict(hh.full_hist["big"]), dict(loaded.full_hist["big"]))
+
+    def test_field_hashes_roundtrip(self) -> None:
+        hashes = [history.hash_fields({"title": i}) for i in range(20)]
+        with unittest.mock.patch.object(
+            history.HistoryHandler, "INDEX_MIN_ENTRIES", 10
+        ):
+            hh = history.HistoryHandler()
+            for i, field_hashes in enumerate(hashes):
+                hh.update_field_hashes("target", str(i), field_hashes)
+        hh.save()
+        saved = self.mock_read_write.write.call_args.args[1]
+        self.assertEqual({}, saved[history.FIELDS_KEY]["target"]["hashes"])
+        self.mock_read_write.read.return_value = saved
+        loaded = history.HistoryHandler()
+        self.assertIsInstance(loaded.field_hashes["target"].packed, HashIndex)
+        self.assertEqual(hashes[7], loaded.get_field_hashes("target", "7"))
+
+    def test_broken_index(self) -> None:
+        (self.tmp_dir / "history.big.idx").write_bytes(
+            b'{"count": 3, "digest_bytes": 16}\n'
+        )
+        self.mock_read_write.read.return_value = {"big": {}}
+        with self.assertRaises(ConfigDegenerated):
+            history.HistoryHandler()
+
+
 if __name__ == "__main__":
     unittest.main()
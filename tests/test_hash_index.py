@@ -0,0 +1,60 @@
+import hashlib
+import io
+import random
+import unittest
+
+from wattro_sync.hash_history.index import HashIndex
+
+
+def digest(val: object) -> str:
+    return hashlib.md5(str(val).encode(), usedforsecurity=False).hexdigest()
+
+
+class TestHashIndex(unittest.TestCase):
+    def test_behaves_like_dict(self) -> None:
+        rnd = random.Random(4)
+        reference = {str(i): digest(i) for i in range(3000)}
+        index = HashIndex(reference.items())
+        for step in range(5000):
+            key = str(rnd.randrange(4000))
+            action = rnd.random()
+            if action < 0.5:
+                reference[key] = index[key] = digest((key, step))
+            elif action < 0.6:
+                # values that are no md5 digest
+                reference[key] = index[key] = f"raw {step}"
+            elif key in reference:
+                del reference[key]
+                del index[key]
+        self.assertEqual(len(reference), len(index))
+        self.assertEqual(reference, dict(index))
+        index.merge()
+        self.assertEqual(reference, dict(index))
+
+    def test_dump_and_load(self) -> None:
+        index = HashIndex((str(i), digest(i)) for i in range(100))
+        index["raw"] = "no digest"
+        index["neu\nzeile"] = digest("neu")
+        del index["5"]
+        fp = io.BytesIO()
+        rest = index.dump(fp)
+        self.assertEqual({"raw": "no digest"}, rest)
+        fp.seek(0)
+        loaded = HashIndex.load(fp, rest.items())
+        self.assertEqual(dict(index), dict(loaded))
+        fp.seek(0)
+        with self.assertRaises(ValueError):
+            HashIndex.load(io.BytesIO(fp.read()[:-10]))
+
+    def test_missing(self) -> None:
+        index = HashIndex([("a", digest("a"))])
+        self.assertIsNone(index.get("b"))
+        self.assertNotIn(1, index)
+        del index["a"]
+        self.assertNotIn("a", index)
+        with self.assertRaises(KeyError):
+            del index["a"]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import json
+import subprocess  # nosec
+import sys
+import unittest
+
+# generous, so slow CI machines do not flake. Drivers alone used to exceed it.
+IMPORT_BUDGET_SECONDS = 1.5
+LAZY_MODULES = ["pyodbc", "sendgrid", "simple_term_menu"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import wattro_sync.sync
+duration = time.perf_counter() - start
+print(json.dumps({"duration": duration, "modules": sorted(sys.modules)}))
+"""
+
+
+class TestImportTime(unittest.TestCase):
+    probe: dict
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        # fresh interpreter, so nothing is imported already
+        out = subprocess.run(  # nosec
+            [sys.executable, "-c", PROBE], capture_output=True, check=True, text=True
+        ).stdout
+        cls.probe = json.loads(out)
+
+    def test_drivers_not_imported(self) -> None:
+        for module in LAZY_MODULES:
+            with self.subTest(module=module):
+                self.assertNotIn(module, self.probe["modules"])
+
+    def test_source_adapters_not_imported(self) -> None:
+        for module in [
+            "mosaik_api",
+            "odbc_api",
+            "topkontor_api",
+            "sqlite_api",
+            "file_api",
+            "snapshot_api",
+        ]:
+            with self.subTest(module=module):
+                self.assertNotIn(f"wattro_sync.api.{module}", self.probe["modules"])
+
+    def test_import_budget(self) -> None:
+        self.assertLess(self.probe["duration"], IMPORT_BUDGET_SECONDS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import gzip
+import json
+import logging
+import pathlib
+import tempfile
+import unittest
+import unittest.mock
+
+from wattro_sync.file_access import logging as wattro_logging
+
+
+class TestLogPipeline(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = pathlib.Path(self.tmp.name)
+        unittest.mock.patch(
+            "wattro_sync.file_access.logging.get_base_folder_path",
+            return_value=self.folder,
+        ).start()
+        self.logger = logging.getLogger(f"test.{self.id()}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+
+    def tearDown(self) -> None:
+        unittest.mock.patch.stopall()
+        for handler in self.logger.handlers:
+            self.logger.removeHandler(handler)
+        self.tmp.cleanup()
+
+    def read_json_lines(self) -> list[dict]:
+        lines = (self.folder / "logs.jsonl").read_text().splitlines()
+        return [json.loads(line) for line in lines]
+
+    def test_json_lines_with_context(self) -> None:
+        handler = wattro_logging.get_file_handler(json_lines=True)
+        listener = wattro_logging.start_queue_logging(self.logger, handler)
+        with wattro_logging.log_fields(target="asset"):
+            with wattro_logging.log_fields(phase="update", ident=7):
+                self.logger.warning("changed %s", "x")
+            self.logger.info("done")
+        listener.stop()
+        handler.close()
+        first, second = self.read_json_lines()
+        self.assertEqual("changed x", first["message"])
+        self.assertEqual("WARNING", first["level"])
+        self.assertEqual(
+            ("asset", "update", "7"),
+            (first["target"], first["phase"], first["ident"]),
+        )
+        self.assertEqual("asset", second["target"])
+        self.assertNotIn("phase", second)
+
+    def test_exception_kept_apart(self) -> None:
+        handler = wattro_logging.get_file_handler(json_lines=True)
+        listener = wattro_logging.start_queue_logging(self.logger, handler)
+        try:
+            raise ValueError("kaputt")
+        except ValueError:
+            self.logger.exception("failed %s", "x")
+        listener.stop()
+        handler.close()
+        (entry,) = self.read_json_lines()
+        self.assertEqual("failed x", entry["message"])
+        self.assertIn("ValueError: kaputt", entry["exc"])
+        self.assertIn("Traceback", entry["exc"])
+
+    def test_exception_in_text_log(self) -> None:
+        handler = wattro_logging.get_file_handler()
+        listener = wattro_logging.start_queue_logging(self.logger, handler)
+        try:
+            raise ValueError("kaputt")
+        except ValueError:
+            self.logger.exception("failed")
+        listener.stop()
+        handler.close()
+        content = (self.folder / "logs.log").read_text()
+        self.assertIn("| ERROR | failed\nTraceback", content)
+        self.assertEqual(1, content.count("ValueError: kaputt"))
+
+    def test_rotates_gzipped(self) -> None:
+        handler = wattro_logging.get_file_handler(max_bytes=200, backup_count=2)
+        listener = wattro_logging.start_queue_logging(self.logger, handler)
+        for idx in range(30):
+            self.logger.info("line %i", idx)
+        listener.stop()
+        handler.close()
+        self.assertEqual(
+            ["logs.log", "logs.log.1.gz", "logs.log.2.gz"],
+            sorted(path.name for path in self.folder.iterdir()),
+        )
+        with gzip.open(self.folder / "logs.log.1.gz", "rt") as rotated:
+            self.assertIn("| INFO | line", rotated.read())
+
+    def test_respects_handler_level(self) -> None:
+        handler = wattro_logging.get_file_handler()
+        handler.setLevel(logging.WARNING)
+        listener = wattro_logging.start_queue_logging(self.logger, handler)
+        self.logger.info("hidden")
+        self.logger.error("shown")
+        listener.stop()
+        handler.close()
+        content = (self.folder / "logs.log").read_text()
+        self.assertNotIn("hidden", content)
+        self.assertIn("shown", content)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import logging
+import pathlib
+import tempfile
+import unittest
+import unittest.mock
+
+from wattro_sync.api import outbox
+from wattro_sync.file_access import read_write
+
+
+class FakeTransport:
+    def __init__(self, accept: bool = True):
+        self.accept = accept
+        self.delivered: list[tuple[str, str]] = []
+
+    def deliver(self, subject: str, html_content: str) -> bool:
+        if self.accept:
+            self.delivered.append((subject, html_content))
+        return self.accept
+
+
+class TestOutbox(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = pathlib.Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(read_write.use_base_folder(tmp_dir))
+        self.now = 1000.0
+        self.transport = FakeTransport()
+
+    def outbox(self, **kwargs) -> outbox.Outbox:
+        return outbox.Outbox(self.transport, clock=lambda: self.now, **kwargs)
+
+    def test_sends_each_mail(self) -> None:
+        box = self.outbox()
+        box.put(logging.ERROR, "a", "first")
+        box.put(logging.ERROR, "b", "second")
+        self.assertEqual(2, box.drain())
+        self.assertEqual([("a", "first"), ("b", "second")], self.transport.delivered)
+        self.assertEqual(0, len(box))
+        self.assertEqual({"messages": []}, read_write.read("outbox"))
+
+    def test_loads_persisted(self) -> None:
+        read_write.write(
+            "outbox",
+            {
+                "messages": [
+                    {
+                        "created": 0.0,
+                        "log_level": logging.ERROR,
+                        "subject": "old",
+                        "html_content": "left over",
+                        "attempts": 0,
+                        "next_try": 0.0,
+                    }
+                ]
+            },
+        )
+        self.assertEqual(1, self.outbox().drain())
+        self.assertEqual([("old", "left over")], self.transport.delivered)
+
+    def test_digest_waits_for_window(self) -> None:
+        box = self.outbox(digest_window=60)
+        box.put(logging.WARNING, "warn", "first")
+        self.now += 30
+        box.put(logging.ERROR, "err", "second")
+        self.assertEqual(0, box.drain())
+        self.now += 31
+        self.assertEqual(1, box.drain())
+        ((subject, content),) = self.transport.delivered
+        self.assertEqual("err (Zusammenfassung von 2 Meldungen)", subject)
+        self.assertLess(content.index("first"), content.index("second"))
+
+    def test_critical_is_not_held(self) -> None:
+        box = self.outbox(digest_window=60)
+        box.put(logging.WARNING, "warn", "held")
+        box.put(logging.CRITICAL, "crit", "now")
+        self.assertEqual(1, box.drain())
+        self.assertEqual([("crit", "now")], self.transport.delivered)
+        self.assertEqual(1, len(box))
+
+    def test_processes_share_the_file(self) -> None:
+        first, second = self.outbox(), self.outbox()
+        first.put(logging.ERROR, "a", "first")
+        second.put(logging.ERROR, "b", "second")
+        self.assertEqual(2, len(first))
+        self.assertEqual(2, second.drain())
+        self.assertEqual(0, first.drain())
+
+    def test_claimed_mails_are_left_alone(self) -> None:
+        box = self.outbox()
+        box.put(logging.ERROR, "a", "content")
+        other = self.outbox()
+
+        def deliver(subject: str, html_content: str) -> bool:
+            # another process drains while this delivery is in flight
+            self.assertEqual(0, other.drain())
+            self.assertEqual(1, len(other))
+            return True
+
+        with unittest.mock.patch.object(self.transport, "deliver", deliver):
+            self.assertEqual(1, box.drain())
+        self.assertEqual(0, len(other))
+
+    def test_backoff_and_drop(self) -> None:
+        self.transport.accept = False
+        box = self.outbox(max_attempts=2, base_backoff=10)
+        box.put(logging.ERROR, "a", "content")
+        self.assertEqual(0, box.drain())
+        self.assertEqual(1, len(box))
+        # not due before the backoff passed
+        self.now += 19
+        with unittest.mock.patch.object(self.transport, "deliver") as deliver:
+            box.drain()
+            deliver.assert_not_called()
+        self.now += 1
+        with self.assertLogs(level=logging.ERROR):
+            box.drain()
+        self.assertEqual(0, len(box))
+
+
+class TestBackgroundSender(unittest.TestCase):
+    def test_close_drains(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir, read_write.use_base_folder(
+            pathlib.Path(tmp_dir)
+        ):
+            transport = FakeTransport()
+            box = outbox.Outbox(transport)
+            sender = outbox.BackgroundSender(box, interval=60)
+            box.put(logging.ERROR, "a", "content")
+            sender.close(timeout=5)
+        self.assertEqual([("a", "content")], transport.delivered)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import concurrent.futures
+import time
+import unittest
+from typing import Callable
+
+from wattro_sync import parallel
+from wattro_sync.api.src_cli import DBRes
+from wattro_sync.config_reader.types import FieldMapping
+from wattro_sync.file_access.logging import log_fields
+from wattro_sync.hash_history import history
+from wattro_sync.sync import transform
+
+FIELD_MAPPING = FieldMapping(
+    {
+        "human_id": {"type": "string", "src": "{id}"},
+        "title": {"type": "string", "src": "{name} ({note})", "max_length": 12},
+    }
+)
+
+
+class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+    workers = 2
+
+    def __init__(self) -> None:
+        super().__init__(max_workers=self.workers)
+        self.submitted = 0
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> concurrent.futures.Future:
+        self.submitted += 1
+        return super().submit(fn, *args, **kwargs)
+
+
+class TestParallel(unittest.TestCase):
+    pool: parallel.WorkerPool
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        pool = parallel.get_pool(2)
+        assert pool is not None  # nosec
+        cls.pool = pool
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.pool.shutdown()
+
+    def setUp(self) -> None:
+        rows = [
+            (i, f"name {i}", b"\xc3\xa4" if i % 7 else None)
+            for i in range(parallel.MIN_ROWS + 123)
+        ]
+        self.res = DBRes(["id", "name", "note"], rows)
+
+    def test_small_results_stay_in_process(self) -> None:
+        small = DBRes(self.res.description, self.res.rows[:10])
+        self.assertFalse(parallel.use_pool(self.pool, small))
+        self.assertFalse(parallel.use_pool(None, self.res))
+        self.assertTrue(parallel.use_pool(self.pool, self.res))
+
+    def test_transform_in_order(self) -> None:
+        expected = transform(self.res, FIELD_MAPPING, "utf-8")
+        result = list(
+            parallel.iter_transform(self.pool, self.res, FIELD_MAPPING, "utf-8")
+        )
+        self.assertEqual(expected, result)
+
+    def test_hashes_in_order(self) -> None:
+        expected = [
+            history.hash_record(record)
+            for record in transform(self.res, FIELD_MAPPING, "utf-8")
+        ]
+        result = parallel.iter_hashes(self.pool, self.res, FIELD_MAPPING, "utf-8")
+        self.assertEqual(expected, list(result))
+
+    def test_worker_logs_reach_the_parent(self) -> None:
+        rows = [(i, f"name {i}", b"\xff") for i in range(parallel.MIN_ROWS)]
+        res = DBRes(["id", "name", "note"], rows)
+        with self.assertLogs(level="WARNING") as logs, log_fields(target="asset"):
+            list(parallel.iter_hashes(self.pool, res, FIELD_MAPPING, "utf-8"))
+            # the listener thread forwards them asynchronously
+            deadline = time.monotonic() + 5
+            while not logs.records and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertIn("Spalte note", logs.output[0])
+        self.assertEqual("asset", getattr(logs.records[0], "target"))
+
+
+class TestBoundedSubmission(unittest.TestCase):
+    def test_submits_ahead_of_the_consumer(self) -> None:
+        res = DBRes(["id", "name", "note"], [(i, "n", None) for i in range(10_000)])
+        with CountingExecutor() as pool:
+            records = parallel.iter_transform(pool, res, FIELD_MAPPING, "utf-8")
+            next(records)
+            window = parallel.PENDING_PER_WORKER * CountingExecutor.workers
+            self.assertEqual(window, pool.submitted)
+            self.assertEqual(10_000, 1 + len(list(records)))
+        self.assertEqual(5, pool.submitted)
+
+
+if __name__ == "__main__":
+    unittest.main()
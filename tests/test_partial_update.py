@@ -0,0 +1,68 @@
+import unittest
+
+from wattro_sync.fake_node import FakeNode
+from wattro_sync.api.sqlite_api import SQLiteSyncInfo
+from wattro_sync.api.src_cli import CollectionInfo
+from wattro_sync.config_reader.types import ConnectionStructure, FieldMapping
+from wattro_sync.sync import send_partial_update
+
+FIELD_MAPPING = FieldMapping(
+    {
+        "human_id": {"type": "string", "src": "{id}"},
+        "title": {"type": "string", "src": "{name}"},
+        "state": {"type": "string", "src": "{status}"},
+        "note": {"type": "string", "src": "{note}"},
+    }
+)
+ROW = {"id": 7, "name": "Pumpe", "status": "aktiv", "note": "x" * 200}
+
+
+class TestPartialUpdate(unittest.TestCase):
+    def setUp(self) -> None:
+        self.con_struct = ConnectionStructure(
+            connection_type="SQLite",
+            sync_info=SQLiteSyncInfo("unused", CollectionInfo.empty()),
+            field_mapping=FIELD_MAPPING,
+            partial_updates=True,
+        )
+
+    def send(self, node: FakeNode, row: dict, known: None | dict) -> tuple:
+        return send_partial_update(
+            "asset", self.con_struct, node.api(), False, row, known
+        )
+
+    def test_only_changed_fields_are_sent(self) -> None:
+        with FakeNode() as node:
+            success, first_hashes, _ = self.send(node, ROW, None)
+            self.assertTrue(success)
+            success, second_hashes, _ = self.send(
+                node, {**ROW, "status": "defekt"}, first_hashes
+            )
+        self.assertTrue(success)
+        self.assertEqual(
+            ["/sync/asset/update_by_ident/", "/sync/asset/partial_update_by_ident/"],
+            node.paths,
+        )
+        full, partial = node.posted
+        self.assertEqual(4, len(full["new_data"]))
+        self.assertEqual({"new_data": {"human_id": "7", "state": "defekt"}}, partial)
+        self.assertNotEqual(first_hashes["state"], second_hashes["state"])
+        self.assertEqual(first_hashes["note"], second_hashes["note"])
+
+    def test_unmapped_change_sends_nothing(self) -> None:
+        with FakeNode() as node:
+            _, hashes, _ = self.send(node, ROW, None)
+            success, _, _ = self.send(node, {**ROW, "unmapped": 1}, hashes)
+        self.assertTrue(success)
+        self.assertEqual(1, len(node.posted))
+
+    def test_failure(self) -> None:
+        with FakeNode() as node:
+            node.responses = [(400, {})]
+            success, _, error = self.send(node, ROW, None)
+        self.assertFalse(success)
+        self.assertIn("RequestRejected", str(error))
+
+
+if __name__ == "__main__":
+    unittest.main()
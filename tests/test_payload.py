@@ -0,0 +1,123 @@
+import gzip
+import json
+import unittest
+import zlib
+
+from wattro_sync.api import payload
+from wattro_sync.config_reader.types import ConfigDegenerated, WattroCfg
+from wattro_sync.fake_node import FakeNode
+
+WIDE_RECORDS = [
+    {"human_id": str(i), "title": f"Projekt {i}", "description": "x" * 100}
+    for i in range(100)
+]
+
+
+class TestEncoder(unittest.TestCase):
+    def test_encoders_agree(self) -> None:
+        data = {"new_data": WIDE_RECORDS, "ümlaut": "ä"}
+        for name in ["json", "auto"]:
+            with self.subTest(encoder=name):
+                encoded = payload.get_encoder(name)(data)
+                self.assertEqual(data, json.loads(encoded))
+
+    def test_unknown_encoder(self) -> None:
+        with self.assertRaises(ValueError):
+            payload.get_encoder("yaml")
+
+    def test_compress(self) -> None:
+        body = payload.stdlib_dumps(WIDE_RECORDS)
+        self.assertEqual(body, gzip.decompress(payload.compress(body, "gzip")))
+        self.assertEqual(body, zlib.decompress(payload.compress(body, "deflate")))
+
+
+class TestStreamedEncoding(unittest.TestCase):
+    def test_matches_plain_encoding(self) -> None:
+        for records in [[], WIDE_RECORDS[:1], WIDE_RECORDS]:
+            with self.subTest(records=len(records)):
+                chunks = list(
+                    payload.iter_json_object(
+                        "new_data", records, payload.stdlib_dumps, chunk_size=1024
+                    )
+                )
+                self.assertEqual({"new_data": records}, json.loads(b"".join(chunks)))
+
+    def test_chunks_are_bounded(self) -> None:
+        chunks = list(
+            payload.iter_json_object(
+                "new_data", WIDE_RECORDS, payload.stdlib_dumps, chunk_size=1024
+            )
+        )
+        self.assertGreater(len(chunks), 1)
+        largest_record = max(len(payload.stdlib_dumps(r)) for r in WIDE_RECORDS)
+        self.assertLess(max(map(len, chunks)), 1024 + largest_record + 1)
+
+    def test_compressed_stream(self) -> None:
+        chunks = payload.iter_json_object(
+            "new_data", WIDE_RECORDS, payload.stdlib_dumps, chunk_size=1024
+        )
+        compressed = b"".join(payload.iter_compressed(chunks, "gzip"))
+        self.assertEqual(
+            {"new_data": WIDE_RECORDS}, json.loads(gzip.decompress(compressed))
+        )
+
+
+class TestStreamedBulk(unittest.TestCase):
+    def test_bulk_is_chunked(self) -> None:
+        with FakeNode() as node:
+            node.api().bulk_create("asset", iter(WIDE_RECORDS))
+        self.assertEqual(1, node.chunked)
+        self.assertEqual([{"new_data": WIDE_RECORDS}], node.posted)
+
+    def test_retry_reencodes(self) -> None:
+        with FakeNode() as node:
+            node.responses = [(503, {})]
+            node.api().bulk_create("asset", WIDE_RECORDS)
+        self.assertEqual([{"new_data": WIDE_RECORDS}], node.posted)
+
+    def test_one_shot_iterator_is_not_resent(self) -> None:
+        with FakeNode() as node:
+            node.responses = [(503, {})]
+            with self.assertRaises(ConnectionError):
+                node.api().bulk_create("asset", iter(WIDE_RECORDS))
+        self.assertEqual([], node.posted)
+
+
+class TestCompressedRequests(unittest.TestCase):
+    def test_bulk_is_compressed(self) -> None:
+        with FakeNode() as node:
+            api = node.api()
+            api.compression = "deflate"
+            api.bulk_create("asset", WIDE_RECORDS)
+            api.update_by_ident("asset", WIDE_RECORDS[0])
+        self.assertEqual(["deflate", None], node.encodings)
+        self.assertEqual({"new_data": WIDE_RECORDS}, node.posted[0])
+
+    def test_falls_back_if_not_supported(self) -> None:
+        with FakeNode(accept_compression=False) as node:
+            api = node.api()
+            api.compression = "auto"
+            api.bulk_create("asset", WIDE_RECORDS)
+            api.bulk_create("asset", WIDE_RECORDS)
+        self.assertEqual([None, None], node.encodings)
+        self.assertIsNone(api.compression)
+
+    def test_configured_compression_is_not_dropped(self) -> None:
+        with FakeNode(accept_compression=False) as node:
+            api = node.api()
+            api.compression = "gzip"
+            with self.assertRaises(ConnectionError):
+                api.bulk_create("asset", WIDE_RECORDS)
+        self.assertEqual("gzip", api.compression)
+        self.assertEqual([], node.posted)
+
+    def test_config_is_validated(self) -> None:
+        self.assertEqual("auto", WattroCfg("x", "key", compression="auto").compression)
+        with self.assertRaises(ConfigDegenerated):
+            WattroCfg("x", "key", compression="brotli")  # type: ignore[arg-type]
+        with self.assertRaises(ConfigDegenerated):
+            WattroCfg("x", "key", json_encoder="ujson")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import time
+import unittest
+
+from wattro_sync.api.rate_limit import RateController, parse_retry_after
+from wattro_sync.fake_node import FakeNode
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRateController(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.controller = RateController(
+            rate=4, concurrency=2, max_concurrency=4, clock=self.clock
+        )
+
+    def test_additive_increase(self) -> None:
+        self.controller.on_success(latency=0.1)
+        self.assertEqual(4.5, self.controller.rate)
+        self.assertGreater(self.controller.concurrency, 2)
+
+    def test_limits_are_capped(self) -> None:
+        for _ in range(1000):
+            self.controller.on_success(latency=0.1)
+        self.assertEqual(self.controller.max_rate, self.controller.rate)
+        self.assertEqual(self.controller.max_concurrency, self.controller.concurrency)
+
+    def test_multiplicative_decrease_on_overload(self) -> None:
+        self.controller.on_overload(retry_after=7)
+        self.assertEqual(2, self.controller.rate)
+        self.assertEqual(1, self.controller.concurrency)
+        self.assertEqual(7, self.controller.blocked_until)
+
+    def test_slow_response_decreases(self) -> None:
+        self.controller.on_success(latency=self.controller.target_latency + 1)
+        self.assertEqual(2, self.controller.rate)
+
+    def test_never_below_minimum(self) -> None:
+        for _ in range(100):
+            self.controller.on_overload(retry_after=None)
+        self.assertEqual(self.controller.min_rate, self.controller.rate)
+        self.assertEqual(1, self.controller.concurrency)
+
+
+class TestParseRetryAfter(unittest.TestCase):
+    def test_seconds(self) -> None:
+        self.assertEqual(3.0, parse_retry_after("3"))
+
+    def test_missing(self) -> None:
+        self.assertIsNone(parse_retry_after(None))
+
+    def test_http_date_in_past(self) -> None:
+        self.assertEqual(0.0, parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"))
+
+    def test_garbage(self) -> None:
+        self.assertIsNone(parse_retry_after("soon"))
+
+
+class TestAgainstFakeNode(unittest.TestCase):
+    def test_retries_after_overload(self) -> None:
+        with FakeNode() as node:
+            node.responses = [(429, {"Retry-After": "1"}), (503, {})]
+            api = node.api()
+            start = time.monotonic()
+            api.update_by_ident("asset", {"human_id": "1"})
+            self.assertGreaterEqual(time.monotonic() - start, 1)
+        self.assertEqual([{"new_data": {"human_id": "1"}}], node.posted)
+        self.assertLess(api.rate_controller.rate, RateController().rate)
+
+    def test_gives_up(self) -> None:
+        with FakeNode() as node:
+            api = node.api()
+            # keep pacing fast, the decrease is covered above
+            api.rate_controller.min_rate = api.rate_controller.rate
+            node.responses = [(503, {})] * (api._get_max_retries() + 1)
+            with self.assertRaises(ConnectionError):
+                api.update_by_ident("asset", {"human_id": "1"})
+        self.assertEqual([], node.posted)
+
+    def test_only_writes_are_paced(self) -> None:
+        with FakeNode() as node:
+            api = node.api()
+            api.rate_controller.rate = api.rate_controller.min_rate
+            start = time.monotonic()
+            for _ in range(3):
+                api.get_idents("asset")
+            self.assertLess(time.monotonic() - start, 1 / api.rate_controller.rate)
+            api.update_by_ident("asset", {"human_id": "1"})
+        self.assertGreater(api.rate_controller.rate, api.rate_controller.min_rate)
+
+    def test_streamed_upload_does_not_report_latency(self) -> None:
+        with FakeNode() as node:
+            api = node.api()
+            rate = api.rate_controller.rate
+            api.bulk_create("asset", [{"human_id": "1"}])
+        self.assertEqual(1, node.chunked)
+        self.assertEqual(rate, api.rate_controller.rate)
+
+    def test_other_errors_are_not_retried(self) -> None:
+        with FakeNode() as node:
+            node.responses = [(400, {})]
+            with self.assertRaises(ConnectionError):
+                node.api().update_by_ident("asset", {"human_id": "1"})
+            self.assertEqual([], node.responses)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import argparse
+import unittest
+
+from wattro_sync.scheduler import Scheduler, positive_int
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.scheduler = Scheduler({"asset": 60, "project": 300}, clock=self.clock)
+
+    def test_all_due_on_start(self) -> None:
+        self.assertEqual({"asset", "project"}, set(self.scheduler.due()))
+
+    def test_per_target_interval(self) -> None:
+        for target in self.scheduler.due():
+            self.scheduler.mark_run(target)
+        self.assertEqual([], self.scheduler.due())
+        self.assertEqual(60, self.scheduler.seconds_until_next())
+
+        self.clock.now += 60
+        self.assertEqual(["asset"], self.scheduler.due())
+        self.scheduler.mark_run("asset")
+
+        self.clock.now += 240
+        self.assertEqual(["asset", "project"], self.scheduler.due())
+
+    def test_jitter_delays_only(self) -> None:
+        scheduler = Scheduler({"asset": 60}, jitter=5, clock=self.clock)
+        scheduler.mark_run("asset")
+        self.assertGreaterEqual(scheduler.seconds_until_next(), 60)
+        self.assertLessEqual(scheduler.seconds_until_next(), 65)
+
+    def test_rejects_non_positive_interval(self) -> None:
+        with self.assertRaises(ValueError):
+            Scheduler({"asset": 0})
+
+    def test_interval_argument(self) -> None:
+        self.assertEqual(60, positive_int("60"))
+        for value in ("0", "-5", "abc"):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                positive_int(value)
+
+
+if __name__ == "__main__":
+    unittest.main()
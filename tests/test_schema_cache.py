@@ -0,0 +1,101 @@
+import pathlib
+import tempfile
+import threading
+import unittest
+from typing import Any
+
+from wattro_sync.api.schema_cache import SchemaCache
+from wattro_sync.api.src_cli import DBRes, SrcCli
+from wattro_sync.file_access import read_write
+
+FIELDS: dict[str, tuple[list[str], dict[str, list]]] = {
+    "items": (["id", "name"], {"id": [1, 2], "name": ["Pumpe", None]})
+}
+
+
+class FakeSource(SrcCli):
+    calls: list[str] = []
+    # released by the test to let get_fields finish
+    gate = threading.Event()
+
+    def __init__(self, sync_info: Any):
+        ...
+
+    def _exec(self, qry: str, params=None) -> DBRes:
+        raise NotImplementedError()
+
+    @classmethod
+    def get_collections(cls, connection_info: Any) -> list[str]:
+        cls.calls.append("collections")
+        return sorted(FIELDS)
+
+    @classmethod
+    def get_fields(
+        cls, connection_info: Any, collection: str
+    ) -> tuple[list[str], dict[str, list]]:
+        cls.gate.wait(5)
+        cls.calls.append(collection)
+        return FIELDS[collection]
+
+
+class TestSchemaCache(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = pathlib.Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(read_write.use_base_folder(tmp_dir))
+        FakeSource.calls = []
+        FakeSource.gate.set()
+
+    def schema(self, **kwargs) -> SchemaCache:
+        return self.enterContext(SchemaCache(FakeSource, "db", **kwargs))
+
+    def test_collections_are_cached(self) -> None:
+        self.assertEqual(["items"], self.schema().get_collections())
+        self.assertEqual(["items"], self.schema().get_collections())
+        self.assertEqual(["collections"], FakeSource.calls)
+        self.schema(refresh=True).get_collections()
+        self.assertEqual(["collections", "collections"], FakeSource.calls)
+
+    def test_fields_as_text(self) -> None:
+        fields = self.schema().get_fields("items")
+        self.assertEqual(
+            (["id", "name"], {"id": ["1", "2"], "name": ["Pumpe", "None"]}), fields
+        )
+
+    def test_preview_prefetches(self) -> None:
+        FakeSource.gate.clear()
+        schema = self.schema()
+        self.assertEqual("Felder werden geladen...", schema.preview("items"))
+        FakeSource.gate.set()
+        schema.get_fields("items")
+        self.assertEqual("id, name", schema.preview("items"))
+        self.assertEqual(["items"], FakeSource.calls)
+
+    def test_samples_are_not_persisted(self) -> None:
+        self.schema().get_fields("items")
+        self.assertNotIn("Pumpe", str(read_write.read("schema_cache")))
+        # the names are, the samples are read again
+        schema = self.schema()
+        self.assertEqual("id, name", schema.preview("items"))
+        schema.get_fields("items")
+        self.assertEqual(["items", "items"], FakeSource.calls)
+
+    def test_samples_persisted_on_request(self) -> None:
+        self.schema(keep_samples=True).get_fields("items")
+        self.assertIn("Pumpe", str(read_write.read("schema_cache")))
+        self.schema(keep_samples=True).get_fields("items")
+        self.assertEqual(["items"], FakeSource.calls)
+        # dropped once they are no longer wanted
+        schema = self.schema()
+        self.assertEqual("id, name", schema.preview("items"))
+        schema.get_fields("items")
+        self.assertNotIn("Pumpe", str(read_write.read("schema_cache")))
+
+    def test_close_stops_the_pool(self) -> None:
+        with SchemaCache(FakeSource, "db") as schema:
+            schema.get_fields("items")
+        with self.assertRaises(RuntimeError):
+            schema.prefetch("other")
+
+
+if __name__ == "__main__":
+    unittest.main()
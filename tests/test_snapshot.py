@@ -0,0 +1,187 @@
+import datetime
+import decimal
+import json
+import pathlib
+import tempfile
+import unittest
+
+from wattro_sync.api.snapshot_api import (
+    Anonymiser,
+    SnapshotApi,
+    SnapshotSyncInfo,
+    decode_target,
+    read_snapshot,
+    snapshot_target,
+    write_snapshot,
+)
+from wattro_sync.api.src_cli import CollectionInfo, DBRes
+from wattro_sync.config_reader.types import ConnectionStructure, FieldMapping
+from wattro_sync.fake_node import FakeNode
+from wattro_sync.file_access import read_write
+from wattro_sync.sync import SyncState, sync
+
+FIELD_MAPPING = FieldMapping(
+    {
+        "human_id": {"type": "string", "src": "{id}"},
+        "title": {"type": "string", "src": "{name}"},
+    }
+)
+SRC = DBRes(
+    description=["id", "name", "raw"],
+    rows=[(1, "Pumpe", b"\xc3\xa4"), (2, None, None), (3, "Ventil", b"")],
+)
+
+
+class TestAnonymiser(unittest.TestCase):
+    def test_deterministic_and_shape_preserving(self) -> None:
+        anonymiser = Anonymiser(b"key")
+        self.assertEqual(anonymiser("Pumpe"), Anonymiser(b"key")("Pumpe"))
+        self.assertNotEqual(anonymiser("Pumpe"), Anonymiser(b"other")("Pumpe"))
+        self.assertNotEqual("Pumpe", anonymiser("Pumpe"))
+        self.assertEqual(5, len(anonymiser("Pumpe")))
+        self.assertEqual(100, len(anonymiser("x" * 100)))
+        self.assertIsInstance(anonymiser(7), int)
+        self.assertEqual(2, len(anonymiser(b"\x00\x01")))
+        self.assertIsNone(anonymiser(None))
+
+    def test_digit_strings_stay_digits(self) -> None:
+        anonymiser = Anonymiser(b"key")
+        for val in ["0", "0815", "1" * 100]:
+            anonymised = anonymiser(val)
+            self.assertTrue(anonymised.isdigit())
+            self.assertEqual(len(val), len(anonymised))
+
+    def test_full_width(self) -> None:
+        anonymiser = Anonymiser(b"key")
+        self.assertLess(anonymiser(7), 2**32)
+        self.assertGreater(anonymiser(7, full_width=True).bit_length(), 64)
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmp_dir.name) / "snapshot.json.gz"
+        collection_info = CollectionInfo("asset", ["id", "name", "raw"], "id")
+        write_snapshot(
+            self.path,
+            {"asset": snapshot_target(SRC, collection_info, FIELD_MAPPING, "utf-8")},
+        )
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def get_api(self) -> SnapshotApi:
+        return SnapshotApi(
+            SnapshotSyncInfo(
+                str(self.path), CollectionInfo("asset", ["id", "name", "raw"], "id")
+            )
+        )
+
+    def test_round_trip(self) -> None:
+        data = read_snapshot(self.path)["targets"]["asset"]
+        self.assertEqual(["", "", "bytes"], data["kinds"])
+        self.assertEqual(list(SRC.rows), list(decode_target(data).rows))
+
+    def test_typed_round_trip(self) -> None:
+        src = DBRes(
+            description=["id", "changed", "due", "price", "mixed"],
+            rows=[
+                (
+                    1,
+                    datetime.datetime(2024, 5, 1, 12, 30),
+                    datetime.date(2024, 6, 1),
+                    decimal.Decimal("1.10"),
+                    decimal.Decimal("2"),
+                ),
+                (2, None, None, decimal.Decimal("-3"), "x"),
+            ],
+            type_codes=[int, datetime.datetime, datetime.date, decimal.Decimal, object],
+            nullable=[False, True, True, False, True],
+        )
+        collection_info = CollectionInfo("asset", list(src.description), "id")
+        data = snapshot_target(src, collection_info, FIELD_MAPPING, "utf-8")
+        self.assertEqual(["", "datetime", "date", "decimal", ""], data["kinds"])
+        decoded = decode_target(json.loads(json.dumps(data)))
+        self.assertEqual(list(src.rows[0][:4]), list(decoded.rows[0][:4]))
+        self.assertEqual("2", decoded.rows[0][4])
+        self.assertEqual(list(src.type_codes[:4]) + [None], list(decoded.type_codes))
+        self.assertEqual(list(src.nullable), list(decoded.nullable))
+
+    def test_anonymised_columns(self) -> None:
+        collection_info = CollectionInfo("asset", ["id", "name", "raw"], "id")
+        data = snapshot_target(
+            SRC, collection_info, FIELD_MAPPING, "utf-8", Anonymiser(b"k"), ["name"]
+        )
+        self.assertEqual(["name"], data["anonymised"])
+        self.assertEqual([1, 2, 3], data["columns"][0])
+        self.assertNotIn("Pumpe", data["columns"][1])
+        self.assertIsNone(data["columns"][1][1])
+
+    def test_anonymised_ident(self) -> None:
+        collection_info = CollectionInfo("asset", ["id", "name", "raw"], "id")
+        data = snapshot_target(
+            SRC, collection_info, FIELD_MAPPING, "utf-8", Anonymiser(b"k"), ["id"]
+        )
+        self.assertEqual(3, len(set(data["columns"][0])))
+        self.assertNotIn(1, data["columns"][0])
+        # single characters only have 16 anonymised values
+        src = DBRes(description=["id"], rows=[(chr(65 + idx),) for idx in range(40)])
+        with self.assertRaises(ValueError):
+            snapshot_target(
+                src,
+                CollectionInfo("asset", ["id"], "id"),
+                FIELD_MAPPING,
+                "utf-8",
+                Anonymiser(b"k"),
+                ["id"],
+            )
+
+    def test_api(self) -> None:
+        api = self.get_api()
+        self.assertEqual([2, 3], [row["id"] for row in api.get_new(["1"])])
+        api.project({"name"})
+        self.assertEqual([{"id": 1, "name": "Pumpe"}], list(api.get_old(["1"])))
+        self.assertEqual(["1", "2", "3"], api.get_idents())
+        self.assertEqual([], list(api.get_dup_idents()))
+
+    def test_api_keeps_column_types(self) -> None:
+        src = DBRes(
+            description=["id", "name"],
+            rows=[(1, "Pumpe")],
+            type_codes=[int, str],
+            nullable=[False, True],
+        )
+        collection_info = CollectionInfo("asset", ["id", "name"], "id")
+        write_snapshot(
+            self.path,
+            {"asset": snapshot_target(src, collection_info, FIELD_MAPPING, "utf-8")},
+        )
+        api = self.get_api()
+        api.project({"name"})
+        res = api.get_old(["1"])
+        self.assertEqual([int, str], list(res.type_codes))
+        self.assertEqual([False, True], list(res.nullable))
+
+    def test_replay_through_sync(self) -> None:
+        con = ConnectionStructure(
+            connection_type="Snapshot",
+            sync_info=SnapshotSyncInfo(
+                str(self.path), CollectionInfo("asset", ["id", "name", "raw"], "id")
+            ),
+            field_mapping=FIELD_MAPPING,
+        )
+        with read_write.use_base_folder(pathlib.Path(self.tmp_dir.name)), FakeNode(
+            keep_posted=False
+        ) as node:
+            node.fields = {
+                name: {**field_map, "read_only": False}
+                for name, field_map in FIELD_MAPPING.items()
+            }
+            state = SyncState()
+            self.assertEqual((3, 0), sync("asset", con, node.api(), False, state))
+            self.assertEqual((0, 0), sync("asset", con, node.api(), False, state))
+        self.assertEqual({"human_id": "2", "title": ""}, node.store["asset"]["2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,391 @@
+import pathlib
+import sqlite3
+import tempfile
+import threading
+import unittest
+import unittest.mock
+
+from wattro_sync.api.sqlite_api import SQLiteApi, SQLiteSyncInfo
+from wattro_sync.api.src_cli import CollectionInfo
+from wattro_sync.config_reader.types import (
+    ConfigDegenerated,
+    ConnectionStructure,
+    FieldMapping,
+)
+from wattro_sync.fake_node import FakeNode
+from wattro_sync.file_access import read_write
+from wattro_sync.hash_history import history
+from wattro_sync.sync import SyncState, mapping_columns, sync
+
+ROWS = [(1, "a", "x"), (2, "b", "y"), (3, "a", "z"), (4, "c", None), (5, "c", "w")]
+
+
+class SQLiteSource(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = str(pathlib.Path(self.tmp_dir.name) / "src.sqlite3")
+        cnxn = sqlite3.connect(self.db_path)
+        cnxn.execute("CREATE TABLE items (id INTEGER, code TEXT, note TEXT)")
+        cnxn.executemany("INSERT INTO items VALUES (?, ?, ?)", ROWS)
+        cnxn.commit()
+        cnxn.close()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def get_api(self, ident: str = "id", **kwargs) -> SQLiteApi:
+        collection_info = CollectionInfo(
+            "items", ["id", "code", "note"], ident, **kwargs
+        )
+        return SQLiteApi(SQLiteSyncInfo(self.db_path, collection_info))
+
+
+class TestDupIdents(SQLiteSource):
+    def test_unique(self) -> None:
+        self.assertEqual([], list(self.get_api("id").get_dup_idents()))
+
+    def test_dups_are_counted(self) -> None:
+        dups = list(self.get_api("code").get_dup_idents())
+        self.assertEqual(
+            [{"code": "a", "dup_count": 2}, {"code": "c", "dup_count": 2}], dups
+        )
+
+    def test_limit(self) -> None:
+        self.assertEqual(1, len(self.get_api("code").get_dup_idents(limit=1)))
+
+    def test_hardcoded_select(self) -> None:
+        api = self.get_api(
+            "code", hardcoded_select="SELECT * FROM items WHERE note IS NOT NULL"
+        )
+        self.assertEqual([{"code": "a", "dup_count": 2}], list(api.get_dup_idents()))
+
+
+class TestGetIdents(SQLiteSource):
+    def test_all_as_str(self) -> None:
+        self.assertEqual(["1", "2", "3", "4", "5"], self.get_api().get_idents())
+
+    def test_hardcoded_select(self) -> None:
+        api = self.get_api(hardcoded_select="SELECT * FROM items WHERE code = 'c'")
+        self.assertEqual(["4", "5"], api.get_idents())
+
+
+class TestProjection(SQLiteSource):
+    def test_only_needed_columns(self) -> None:
+        api = self.get_api()
+        api.project(
+            mapping_columns(
+                FieldMapping({"title": {"type": "string", "src": "{code}!"}})
+            )
+        )
+        self.assertEqual([{"id": 4, "code": "c"}], list(api.get_old(["4"])))
+        self.assertEqual(["id", "code"], list(api.get_new(["1"]).description))
+
+    def test_unknown_columns_are_ignored(self) -> None:
+        api = self.get_api()
+        api.project({"missing"})
+        self.assertEqual(["id"], list(api.get_sample().description))
+
+    def test_hardcoded_select_is_wrapped(self) -> None:
+        api = self.get_api(hardcoded_select="SELECT * FROM items WHERE code = 'c';")
+        api.project({"note"})
+        self.assertEqual([{"id": 5, "note": "w"}], list(api.get_new(["4"])))
+        self.assertEqual(["4", "5"], api.get_idents())
+
+    def test_mapping_columns(self) -> None:
+        field_mapping = FieldMapping(
+            {
+                "a": {"src": "{x} {y.z} {w[0]:>{width}} {{literal}}"},
+                "b": {"src": None},
+            }
+        )
+        self.assertEqual({"x", "y", "w", "width"}, mapping_columns(field_mapping))
+
+
+class TestUpgradeWithProjection(SQLiteSource):
+    def setUp(self) -> None:
+        super().setUp()
+        self.enterContext(read_write.use_base_folder(pathlib.Path(self.tmp_dir.name)))
+        self.node = self.enterContext(FakeNode())
+        self.node.store["asset"] = {str(row[0]): {} for row in ROWS}
+        # written by an older version: hashes of the full rows, "note" is not mapped
+        read_write.write(
+            "history",
+            {
+                "asset": {
+                    str(row[0]): history._hashed(dict(zip(["id", "code", "note"], row)))
+                    for row in ROWS
+                }
+            },
+        )
+        self.con_struct = ConnectionStructure(
+            connection_type="SQLite",
+            sync_info=SQLiteSyncInfo(
+                self.db_path, CollectionInfo("items", ["id", "code", "note"], "id")
+            ),
+            field_mapping=FieldMapping(
+                {
+                    "human_id": {"type": "string", "src": "{id}"},
+                    "title": {"type": "string", "src": "{code}"},
+                }
+            ),
+        )
+
+    def sync(self) -> tuple[int, int]:
+        state = SyncState()
+        state.validated.add("asset")
+        return sync("asset", self.con_struct, self.node.api(), False, state)
+
+    def test_unchanged_rows_are_migrated_not_resent(self) -> None:
+        self.assertEqual((0, 0), self.sync())
+        self.assertEqual([], self.node.posted)
+        hist = history.HistoryHandler()
+        self.assertFalse(hist.needs_full_rows("asset"))
+        record = {"human_id": "1", "title": "a"}
+        self.assertEqual(history.hash_record(record), hist.full_hist["asset"]["1"])
+        # later runs read only the mapped columns
+        with unittest.mock.patch.object(
+            SQLiteApi, "_exec", autospec=True, side_effect=SQLiteApi._exec
+        ) as exec_mock:
+            self.assertEqual((0, 0), self.sync())
+        self.assertFalse(
+            any("note" in call.args[1] for call in exec_mock.call_args_list[1:])
+        )
+        self.assertEqual([], self.node.posted)
+
+    def test_partial_comparison_keeps_full_rows(self) -> None:
+        # e.g. Mosaik only looks up the first 2000 idents
+        with unittest.mock.patch.object(SQLiteApi, "compares_all", return_value=False):
+            self.assertEqual((0, 0), self.sync())
+        self.assertTrue(history.HistoryHandler().needs_full_rows("asset"))
+        self.assertEqual((0, 0), self.sync())
+        self.assertFalse(history.HistoryHandler().needs_full_rows("asset"))
+
+
+class TestReadMode(SQLiteSource):
+    def get_api(self, ident: str = "id", **kwargs) -> SQLiteApi:
+        collection_info = CollectionInfo("items", ["id", "code", "note"], ident)
+        return SQLiteApi(SQLiteSyncInfo(self.db_path, collection_info, **kwargs))
+
+    def insert(self, cnxn: sqlite3.Connection) -> None:
+        cnxn.execute("INSERT INTO items VALUES (6, 'd', 'v')")
+        cnxn.commit()
+
+    def test_read_only(self) -> None:
+        api = self.get_api(read_mode="ro")
+        self.assertEqual(5, len(api.get_new([])))
+        with self.assertRaises(RuntimeError):
+            api._exec("DELETE FROM items")
+
+    def test_session_reads_one_snapshot(self) -> None:
+        cnxn = sqlite3.connect(self.db_path)
+        cnxn.execute("PRAGMA journal_mode = WAL")
+        api = self.get_api(read_mode="ro")
+        with api.session():
+            self.assertEqual(5, len(api.get_new([])))
+            self.insert(cnxn)
+            self.assertEqual(0, len(api.get_old(["6"])))
+        self.assertEqual(1, len(api.get_old(["6"])))
+        cnxn.close()
+
+    def test_copy_when_busy(self) -> None:
+        cnxn = sqlite3.connect(
+            self.db_path, isolation_level=None, check_same_thread=False
+        )
+        cnxn.execute("BEGIN EXCLUSIVE")
+        api = self.get_api(read_mode="ro", copy_when_busy=True)
+        api.BUSY_TIMEOUT = 0.05
+        # the copy waits for the lock
+        threading.Timer(0.3, cnxn.execute, ["COMMIT"]).start()
+        with self.assertLogs(level="WARNING"), api.session():
+            self.assertEqual(5, len(api.get_new([])))
+        cnxn.close()
+
+    def test_busy_without_copy(self) -> None:
+        cnxn = sqlite3.connect(self.db_path, isolation_level=None)
+        cnxn.execute("BEGIN EXCLUSIVE")
+        api = self.get_api(read_mode="ro")
+        api.BUSY_TIMEOUT = 0.05
+        with self.assertRaises(ConnectionError):
+            with api.session():
+                pass
+        cnxn.execute("COMMIT")
+        cnxn.close()
+
+    def test_busy_source_fails_the_target(self) -> None:
+        self.enterContext(read_write.use_base_folder(pathlib.Path(self.tmp_dir.name)))
+        sync_info = SQLiteSyncInfo(
+            self.db_path, CollectionInfo("items", ["id"], "id"), "ro"
+        )
+        api = SQLiteApi(sync_info)
+        api.BUSY_TIMEOUT = 0.05
+        state = SyncState()
+        state.validated.add("asset")
+        state.src_apis["asset"] = api
+        con_struct = ConnectionStructure(
+            connection_type="SQLite",
+            sync_info=sync_info,
+            field_mapping=FieldMapping({"human_id": {"type": "string", "src": "{id}"}}),
+        )
+        cnxn = sqlite3.connect(self.db_path, isolation_level=None)
+        cnxn.execute("BEGIN EXCLUSIVE")
+        with FakeNode() as node, self.assertLogs(level="ERROR"):
+            self.assertEqual(
+                (0, 1), sync("asset", con_struct, node.api(), False, state)
+            )
+        cnxn.execute("COMMIT")
+        cnxn.close()
+        self.assertEqual([], node.posted)
+
+    def test_config(self) -> None:
+        info = SQLiteSyncInfo(
+            self.db_path, CollectionInfo.empty(), "immutable", copy_when_busy=True
+        ).asdict()
+        self.assertEqual("immutable", SQLiteSyncInfo.from_dict(info).read_mode)
+        with self.assertRaises(ConfigDegenerated):
+            SQLiteSyncInfo.from_dict({**info, "read_mode": "rw"})
+
+
+class TestPartitions(SQLiteSource):
+    def test_same_rows(self) -> None:
+        api = self.get_api(partitions=3)
+        with unittest.mock.patch.object(api, "_exec", wraps=api._exec) as mock_exec:
+            new = api.get_new(["2"])
+        self.assertEqual(3, mock_exec.call_count)
+        self.assertEqual([1, 3, 4, 5], sorted(row["id"] for row in new))
+        self.assertEqual(["id", "code", "note"], list(new.description))
+        self.assertEqual(
+            [{"id": 2, "code": "b", "note": "y"}], list(api.get_old(["2"]))
+        )
+
+    def test_partition_column(self) -> None:
+        api = self.get_api(partitions=2, partition_column="id * 3")
+        self.assertEqual(5, len(api.get_new([])))
+
+    def test_empty(self) -> None:
+        self.assertEqual(0, len(self.get_api(partitions=4).get_old(["9"])))
+
+    def test_serial_in_session(self) -> None:
+        collection_info = CollectionInfo("items", ["id"], "id", partitions=3)
+        api = SQLiteApi(SQLiteSyncInfo(self.db_path, collection_info, "ro"))
+        with api.session():
+            self.assertEqual(5, len(api.get_new([])))
+
+    def test_invalid(self) -> None:
+        with self.assertRaises(ConfigDegenerated):
+            self.get_api(partitions=0)
+
+
+class TestChangeLog(SQLiteSource):
+    def get_api(self, ident: str = "id", **kwargs) -> SQLiteApi:
+        collection_info = CollectionInfo(
+            "items", ["id", "code", "note"], ident, **kwargs
+        )
+        return SQLiteApi(SQLiteSyncInfo(self.db_path, collection_info, change_log=True))
+
+    def execute(self, qry: str) -> None:
+        cnxn = sqlite3.connect(self.db_path)
+        with cnxn:
+            cnxn.execute(qry)
+        cnxn.close()
+
+    def changed(self, api: SQLiteApi) -> list:
+        res = api.get_changed(["1", "2", "3", "4", "5"])
+        assert res is not None
+        return sorted(row["id"] for row in res)
+
+    def test_only_logged_changes(self) -> None:
+        api = self.get_api()
+        api.install_change_log()
+        self.assertEqual([1, 2, 3, 4, 5], self.changed(api))
+        api.ack_changes(keep={"2"})
+        self.assertEqual([2], self.changed(api))
+        api.ack_changes(keep=set())
+        self.assertEqual([], self.changed(api))
+
+        self.execute("UPDATE items SET note = 'neu' WHERE id = 3")
+        self.execute("INSERT INTO items VALUES (6, 'd', 'v')")
+        self.assertEqual([3], self.changed(api))
+
+    def test_changes_after_read_are_kept(self) -> None:
+        api = self.get_api()
+        api.install_change_log()
+        self.changed(api)
+        self.execute("UPDATE items SET note = 'neu' WHERE id = 3")
+        api.ack_changes(keep=set())
+        self.assertEqual([3], self.changed(api))
+
+    def test_int_idents(self) -> None:
+        api = self.get_api()
+        api.install_change_log()
+        res = api.get_changed([1, 2])  # type: ignore[list-item]
+        assert res is not None
+        self.assertEqual([1, 2], sorted(row["id"] for row in res))
+
+    def test_ack_many_kept(self) -> None:
+        api = self.get_api()
+        api.install_change_log()
+        self.changed(api)
+        api.ack_changes(keep={"2", *map(str, range(100, 40_000))})
+        self.assertEqual([2], self.changed(api))
+
+    def test_ack_when_locked(self) -> None:
+        api = self.get_api()
+        api.BUSY_TIMEOUT = 0.05
+        api.install_change_log()
+        self.changed(api)
+        cnxn = sqlite3.connect(self.db_path, isolation_level=None)
+        cnxn.execute("BEGIN EXCLUSIVE")
+        with self.assertLogs(level="WARNING"):
+            api.ack_changes(keep=set())
+        cnxn.execute("COMMIT")
+        cnxn.close()
+        self.assertEqual([1, 2, 3, 4, 5], self.changed(api))
+
+    def test_changed_mapping_compares_all(self) -> None:
+        self.enterContext(read_write.use_base_folder(pathlib.Path(self.tmp_dir.name)))
+        self.get_api().install_change_log()
+        node = self.enterContext(FakeNode())
+
+        def sync_with(title_src: str) -> tuple[int, int]:
+            con_struct = ConnectionStructure(
+                connection_type="SQLite",
+                sync_info=SQLiteSyncInfo(
+                    self.db_path,
+                    CollectionInfo("items", ["id", "code", "note"], "id"),
+                    change_log=True,
+                ),
+                field_mapping=FieldMapping(
+                    {
+                        "human_id": {"type": "string", "src": "{id}"},
+                        "title": {"type": "string", "src": title_src},
+                    }
+                ),
+            )
+            state = SyncState()
+            state.validated.add("asset")
+            return sync("asset", con_struct, node.api(), False, state)
+
+        self.assertEqual((5, 0), sync_with("{code}"))
+        self.assertEqual((0, 0), sync_with("{code}"))
+        self.assertEqual((5, 0), sync_with("{code}!"))
+        self.assertEqual((0, 0), sync_with("{code}!"))
+
+    def test_remove(self) -> None:
+        api = self.get_api()
+        api.install_change_log()
+        api.remove_change_log()
+        self.execute("UPDATE items SET note = 'neu' WHERE id = 3")
+        self.assertEqual([], self.changed(api))
+
+    def test_not_enabled(self) -> None:
+        api = SQLiteApi(SQLiteSyncInfo(self.db_path, CollectionInfo.empty()))
+        self.assertIsNone(api.get_changed(["1"]))
+
+    def test_hardcoded_select(self) -> None:
+        api = self.get_api(hardcoded_select="SELECT * FROM items")
+        with self.assertRaises(ValueError):
+            api.install_change_log()
+
+
+if __name__ == "__main__":
+    unittest.main()
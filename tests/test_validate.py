@@ -0,0 +1,139 @@
+import json
+import unittest
+import unittest.mock
+
+import requests
+
+from wattro_sync.api.rest_api import WattroNodeApi
+from wattro_sync.api.sqlite_api import SQLiteSyncInfo
+from wattro_sync.api.src_cli import CollectionInfo
+
+from wattro_sync.config_reader.types import ConnectionStructure, FieldMapping
+from wattro_sync.config_reader.validate import (
+    field_mapping_issues,
+    field_mapping_warnings,
+)
+from wattro_sync.fake_node import FakeNode
+from wattro_sync.sync import field_mapping_is_valid
+
+FIELDS = {
+    "id": {"type": "integer", "read_only": True, "required": False},
+    "human_id": {"type": "string", "read_only": False, "required": True},
+    "title": {
+        "type": "string",
+        "read_only": False,
+        "required": False,
+        "max_length": 20,
+    },
+    "count": {"type": "integer", "read_only": False, "required": False},
+}
+
+
+def mapping(**overrides: dict) -> FieldMapping:
+    field_mapping = FieldMapping(
+        {
+            "human_id": {"type": "string", "src": "{id}"},
+            "title": {"type": "string", "src": "{name}", "max_length": 20},
+        }
+    )
+    field_mapping.update(overrides)
+    return field_mapping
+
+
+class TestFieldMappingIssues(unittest.TestCase):
+    def test_valid(self) -> None:
+        self.assertEqual([], field_mapping_issues(mapping(), FIELDS))
+
+    def test_skipped_fields_are_ignored(self) -> None:
+        unknown = {"type": "string", "src": None}
+        self.assertEqual([], field_mapping_issues(mapping(gone=unknown), FIELDS))
+
+    def test_unknown_field(self) -> None:
+        issues = field_mapping_issues(
+            mapping(gone={"type": "string", "src": "{x}"}), FIELDS
+        )
+        self.assertEqual(1, len(issues))
+
+    def test_read_only(self) -> None:
+        issues = field_mapping_issues(
+            mapping(id={"type": "integer", "src": "{id}"}), FIELDS
+        )
+        self.assertEqual(1, len(issues))
+
+    def test_type_changed(self) -> None:
+        issues = field_mapping_issues(
+            mapping(count={"type": "string", "src": "{x}"}), FIELDS
+        )
+        self.assertEqual(1, len(issues))
+
+    def test_max_length(self) -> None:
+        title = {"type": "string", "src": "{x}", "max_length": 21}
+        self.assertEqual(1, len(field_mapping_issues(mapping(title=title), FIELDS)))
+        self.assertEqual([], field_mapping_warnings(mapping(title=title), FIELDS))
+
+    def test_unset_max_length_only_warns(self) -> None:
+        title = {"type": "string", "src": "{x}"}
+        self.assertEqual([], field_mapping_issues(mapping(title=title), FIELDS))
+        self.assertEqual(1, len(field_mapping_warnings(mapping(title=title), FIELDS)))
+        self.assertEqual([], field_mapping_warnings(mapping(), FIELDS))
+
+    def test_required_missing(self) -> None:
+        issues = field_mapping_issues(
+            mapping(human_id={"type": "string", "src": None}), FIELDS
+        )
+        self.assertEqual(1, len(issues))
+
+
+class TestCachedFields(unittest.TestCase):
+    def setUp(self) -> None:
+        self.entries: dict = {}
+        mock_read_write = unittest.mock.patch(
+            "wattro_sync.file_access.cache.read_write"
+        ).start()
+        mock_read_write.read.return_value = self.entries
+
+    def tearDown(self) -> None:
+        unittest.mock.patch.stopall()
+
+    def test_cached_per_version(self) -> None:
+        with FakeNode() as node:
+            node.fields = FIELDS
+            api = node.api()
+            self.assertEqual(FIELDS, api.get_fields("/node/asset/"))
+            self.assertEqual(FIELDS, api.get_fields("/node/asset/"))
+            self.assertEqual(1, node.options_requests)
+
+            api.node_version = "2"
+            api.get_fields("/node/asset/")
+            self.assertEqual(2, node.options_requests)
+
+            api.get_fields("/node/asset/", use_cache=False)
+            self.assertEqual(3, node.options_requests)
+
+
+class TestFieldMappingIsValid(unittest.TestCase):
+    def setUp(self) -> None:
+        self.con_struct = ConnectionStructure(
+            connection_type="SQLite",
+            sync_info=SQLiteSyncInfo("unused", CollectionInfo.empty()),
+            field_mapping=mapping(),
+        )
+
+    def test_unreadable_description_skips_the_check(self) -> None:
+        for err in [
+            requests.ConnectionError("refused"),
+            json.JSONDecodeError("kein JSON", "", 0),
+            TypeError("no dict"),
+        ]:
+            with self.subTest(err=err):
+                api = unittest.mock.Mock(spec=WattroNodeApi)
+                api.get_fields.side_effect = err
+                with self.assertLogs(level="WARNING") as logs:
+                    self.assertTrue(
+                        field_mapping_is_valid("asset", self.con_struct, api)
+                    )
+                self.assertIn("Überspringe Prüfung", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,20 +1,38 @@
+import importlib
 from dataclasses import dataclass
+from types import ModuleType
 
-from .mosaik_api import MosaikApi, MosaikSyncInfo
-from .sqlite_api import SQLiteSyncInfo, SQLiteApi
 from .src_cli import SrcCli, SyncInfo
-from .topkontor_api import TopKontorSyncInfo, TopKontorApi
 
 
 @dataclass
 class ApiStructure:
-    connection_info: type[SyncInfo]
-    api: type[SrcCli]
+    """
+    Points to a source adapter by name.
+    The adapter module (and with it its driver, e.g. pyodbc) is only imported on first access.
+    """
+
+    module: str
+    connection_info_name: str
+    api_name: str
+
+    def _import(self) -> ModuleType:
+        return importlib.import_module(self.module, __package__)
+
+    @property
+    def connection_info(self) -> type[SyncInfo]:
+        return getattr(self._import(), self.connection_info_name)
+
+    @property
+    def api(self) -> type[SrcCli]:
+        return getattr(self._import(), self.api_name)
 
 
 ApiNameToStructureMapping: dict[str, ApiStructure] = {
-    "Mosaik": ApiStructure(MosaikSyncInfo, MosaikApi),
-    "TopKontor": ApiStructure(TopKontorSyncInfo, TopKontorApi),
-    "Benning": ApiStructure(SQLiteSyncInfo, SQLiteApi),
-    "SQLite": ApiStructure(SQLiteSyncInfo, SQLiteApi),
+    "Mosaik": ApiStructure(".mosaik_api", "MosaikSyncInfo", "MosaikApi"),
+    "TopKontor": ApiStructure(".topkontor_api", "TopKontorSyncInfo", "TopKontorApi"),
+    "Benning": ApiStructure(".sqlite_api", "SQLiteSyncInfo", "SQLiteApi"),
+    "SQLite": ApiStructure(".sqlite_api", "SQLiteSyncInfo", "SQLiteApi"),
+    "File": ApiStructure(".file_api", "FileSyncInfo", "FileApi"),
+    "Snapshot": ApiStructure(".snapshot_api", "SnapshotSyncInfo", "SnapshotApi"),
 }
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import logging
+from typing import Any, Callable, Iterator, Sequence
+
+BINARY_TYPES = (bytes, bytearray, memoryview)
+
+Decoder = Callable[[Any], Any]
+
+
+class DecoderPlan:
+    """
+    Decides once per result how each column has to be decoded:
+    NULL becomes "", bytes are decoded with `encoding`, everything else passes.
+
+    The type codes of the cursor description are used where the driver provides them
+    (pyodbc: python type and nullability). Unknown columns (e.g. SQLite) are scanned once.
+    Columns that never hold bytes or NULL are not touched per row.
+    """
+
+    def __init__(
+        self,
+        description: Sequence[str],
+        rows: Sequence[Sequence],
+        encoding: str,
+        type_codes: Sequence[Any] = (),
+        nullable: Sequence[None | bool] = (),
+    ):
+        self.description = list(description)
+        self.encoding = encoding
+        self.decoders: list[tuple[str, Decoder]] = []
+        for idx, key in enumerate(self.description):
+            type_code = type_codes[idx] if idx < len(type_codes) else None
+            null_ok = nullable[idx] if idx < len(nullable) else None
+            decoder = self._plan_column(idx, key, rows, type_code, null_ok)
+            if decoder is not None:
+                self.decoders.append((key, decoder))
+
+    def _plan_column(
+        self,
+        idx: int,
+        key: str,
+        rows: Sequence[Sequence],
+        type_code: Any,
+        null_ok: None | bool,
+    ) -> None | Decoder:
+        if isinstance(type_code, type) and null_ok is False:
+            has_null = False
+            has_bytes = issubclass(type_code, BINARY_TYPES)
+        else:
+            seen = {type(row[idx]) for row in rows}
+            has_null = type(None) in seen
+            has_bytes = any(issubclass(kind, BINARY_TYPES) for kind in seen)
+        if has_bytes:
+            return self._bytes_decoder(key)
+        if has_null:
+            return _null_to_empty
+        return None
+
+    def _bytes_decoder(self, key: str) -> Decoder:
+        encoding = self.encoding
+        warned = False
+
+        def decode(val: Any) -> Any:
+            nonlocal warned
+            if val is None:
+                return ""
+            if not isinstance(val, BINARY_TYPES):
+                return val
+            try:
+                return bytes(val).decode(encoding=encoding)
+            except UnicodeDecodeError as decode_err:
+                if not warned:
+                    warned = True
+                    logging.warning(
+                        "Spalte %s ist nicht %s kodiert (%s, etwa %r). "
+                        "Ungültige Zeichen werden ausgelassen.",
+                        key,
+                        encoding,
+                        decode_err.reason,
+                        val,
+                    )
+                return bytes(val).decode(encoding=encoding, errors="ignore")
+
+        return decode
+
+    def decode_row(self, row: Sequence) -> dict:
+        src = dict(zip(self.description, row))
+        for key, decoder in self.decoders:
+            src[key] = decoder(src[key])
+        return src
+
+    def decode_rows(self, rows: Sequence[Sequence]) -> Iterator[dict]:
+        return (self.decode_row(row) for row in rows)
+
+
+def _null_to_empty(val: Any) -> Any:
+    return "" if val is None else val
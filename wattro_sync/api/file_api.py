@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import codecs
+import csv
+import dataclasses
+import gzip
+import itertools
+import json
+import logging
+import pathlib
+from typing import IO, Any, Iterator
+
+from ..config_reader.types import ConfigDegenerated
+from .src_cli import CollectionInfo, RecordSrcCli, SyncInfo
+
+FILE_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+READ_BUFFER = 1024 * 1024
+
+
+class FileSyncInfo(SyncInfo):
+    """
+    `path` is an export file or a folder of them, `collection_info.collection_name`
+    the file name inside. csv, jsonl and ndjson files are read, each optionally gzipped.
+    `file_errors` is the codec error handler, e.g. "replace" to read files with
+    broken characters instead of failing.
+    """
+
+    path: str
+    collection_info: CollectionInfo
+
+    def __init__(
+        self,
+        path: str,
+        collection_info: CollectionInfo,
+        file_encoding: str = "utf-8",
+        delimiter: str = ",",
+        file_errors: str = "strict",
+    ):
+        self.path = path
+        self.collection_info = collection_info
+        self.file_encoding = file_encoding
+        self.delimiter = delimiter
+        self.file_errors = file_errors
+
+    def asdict(self) -> dict:
+        return {
+            "path": str(self.path),
+            "collection_info": dataclasses.asdict(self.collection_info),
+            "file_encoding": self.file_encoding,
+            "delimiter": self.delimiter,
+            "file_errors": self.file_errors,
+        }
+
+    @classmethod
+    def from_dict(cls, info: dict) -> FileSyncInfo:
+        delimiter = info.get("delimiter", ",")
+        if not isinstance(delimiter, str) or len(delimiter) != 1:
+            raise ConfigDegenerated(f"delimiter not a single character {delimiter=}")
+        file_errors = info.get("file_errors", "strict")
+        try:
+            codecs.lookup_error(file_errors)
+        except (LookupError, TypeError) as err:
+            raise ConfigDegenerated(f"unknown error handler {file_errors=}") from err
+        return cls(
+            path=info["path"],
+            collection_info=CollectionInfo(**info["collection_info"]),
+            file_encoding=info.get("file_encoding", "utf-8"),
+            delimiter=delimiter,
+            file_errors=file_errors,
+        )
+
+
+def file_format(file_path: pathlib.Path) -> None | str:
+    suffixes = file_path.suffixes
+    if suffixes and suffixes[-1] == ".gz":
+        suffixes = suffixes[:-1]
+    return FILE_FORMATS.get(suffixes[-1], None) if suffixes else None
+
+
+class FileApi(RecordSrcCli):
+    """
+    Reads export files as a source. The file is streamed on every call,
+    only the rows (and columns) that are asked for are kept.
+    """
+
+    def __init__(self, sync_info: FileSyncInfo):
+        self.path = pathlib.Path(sync_info.path)
+        self.collection_info = sync_info.collection_info
+        self.file_encoding = sync_info.file_encoding
+        self.delimiter = sync_info.delimiter
+        self.file_errors = sync_info.file_errors
+
+    def _file_path(self) -> pathlib.Path:
+        if self.path.is_dir():
+            return self.path / self.collection_info.collection_name
+        return self.path
+
+    def _open(self, file_path: pathlib.Path) -> IO[str]:
+        # newline="" lets csv handle line breaks inside quoted values
+        if file_path.suffix == ".gz":
+            return gzip.open(
+                file_path,
+                "rt",
+                encoding=self.file_encoding,
+                errors=self.file_errors,
+                newline="",
+            )
+        return open(
+            file_path,
+            encoding=self.file_encoding,
+            errors=self.file_errors,
+            newline="",
+            buffering=READ_BUFFER,
+        )
+
+    def _iter_records(self) -> Iterator[dict[str, Any]]:
+        file_path = self._file_path()
+        kind = file_format(file_path)
+        if kind is None:
+            raise ConnectionError(f"Unbekanntes Dateiformat: {file_path}")
+        try:
+            stream = self._open(file_path)
+        except OSError as err:
+            raise ConnectionError(f"Failed to open {file_path}") from err
+        with stream:
+            try:
+                yield from self._parse(stream, kind, file_path)
+            except UnicodeDecodeError as err:
+                raise ConnectionError(
+                    f"{file_path} ist nicht {self.file_encoding} kodiert ({err}). "
+                    "'file_encoding' oder 'file_errors' anpassen."
+                ) from err
+
+    def _parse(
+        self, stream: IO[str], kind: str, file_path: pathlib.Path
+    ) -> Iterator[dict[str, Any]]:
+        if kind == "csv":
+            for row in csv.DictReader(stream, delimiter=self.delimiter):
+                # like NULL in a database, so templates render it as ""
+                yield {key: None if val == "" else val for key, val in row.items()}
+            return
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                obj = None
+            if not isinstance(obj, dict):
+                logging.warning("%s Zeile %i: kein JSON-Objekt.", file_path, line_no)
+                continue
+            yield obj
+
+    @classmethod
+    def get_collections(cls, connection_info: str) -> list[str]:
+        """
+        get_collections('/path/to/exports')
+        """
+        path = pathlib.Path(connection_info)
+        if path.is_file():
+            return [path.name]
+        return sorted(
+            child.name
+            for child in path.iterdir()
+            if child.is_file() and file_format(child) is not None
+        )
+
+    @classmethod
+    def get_fields(
+        cls, connection_info: str, collection: str
+    ) -> tuple[list[str], dict[str, list]]:
+        fake_api = cls(
+            FileSyncInfo(connection_info, CollectionInfo(collection, [], ""))
+        )
+        samples: dict[str, list] = {}
+        for record in itertools.islice(fake_api._iter_records(), 50):
+            for key, val in record.items():
+                samples.setdefault(key, []).append(val)
+        return sorted(samples), samples
@@ -1,21 +1,35 @@
-import logging
+from __future__ import annotations
 
-import sendgrid
-from sendgrid.helpers import mail
+import logging
+from typing import TYPE_CHECKING
 
+from wattro_sync.api.outbox import BackgroundSender, Outbox
 from wattro_sync.config_reader.types import MailCfg
 
+if TYPE_CHECKING:
+    from sendgrid.helpers import mail
+
 
 class MailApi:
     def __init__(self, mail_cfg: MailCfg | None):
+        self.sender: None | BackgroundSender = None
         if mail_cfg is None:
             self.dummy = True
             self.cfg = MailCfg("", "")
             return
+        # imported here, so runs without mail config do not pay for it
+        import sendgrid
+
         self.dummy = False
         self.cfg = mail_cfg
         self.sg = sendgrid.SendGridAPIClient(mail_cfg.api_key)
 
+    def _get_sender(self) -> BackgroundSender:
+        if self.sender is None:
+            outbox = Outbox(self, digest_window=self.cfg.digest_window)
+            self.sender = BackgroundSender(outbox)
+        return self.sender
+
     def send_registered(self) -> bool:
         """returns True if mail was sent successfully."""
         msg = "E-Mail Logging für das Wattro Synchronisations Script wurde aktiviert."
@@ -23,6 +37,8 @@ class MailApi:
         return res is not None
 
     def _msg(self, subject: str, html_content: str) -> mail.Mail:
+        from sendgrid.helpers import mail
+
         return mail.Mail(
             from_email=self.cfg.form_email,
             to_emails=self.cfg.to_emails,
@@ -43,13 +59,24 @@ class MailApi:
             )
             return None
 
+    def deliver(self, subject: str, html_content: str) -> bool:
+        return self._send(self._msg(subject, html_content)) is not None
+
     def send(self, log_lvl: int, msg: str) -> None:
+        """queue the mail, it is sent in the background"""
         if self.dummy or log_lvl < self.cfg.log_level:
             logging.log(log_lvl, f"(sending mail skipped), {msg}")
             return
-        self._send(
-            self._msg(
-                subject=f"Wattro Sync: {logging.getLevelName(log_lvl)}",
-                html_content=msg,
-            )
-        )
+        sender = self._get_sender()
+        sender.outbox.put(log_lvl, f"Wattro Sync: {logging.getLevelName(log_lvl)}", msg)
+        sender.wake()
+
+    def resume(self) -> None:
+        """start sending what earlier runs left in the outbox"""
+        if not self.dummy:
+            self._get_sender()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """give queued mails a moment to go out, the rest is sent by the next run"""
+        if self.sender is not None:
+            self.sender.close(timeout)
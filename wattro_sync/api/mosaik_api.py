@@ -72,3 +72,6 @@ class MosaikApi(OdbcSrcCliAltSample):
         This assumes that we are conntected to a view that sorts by changed date and is limited to the last 2k (or less)
         """
         return super().get_old(known_idents[: self.MAX_SQL_TOKENS])
+
+    def compares_all(self, known_idents: Sequence[str]) -> bool:
+        return len(known_idents) <= self.MAX_SQL_TOKENS
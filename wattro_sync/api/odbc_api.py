@@ -46,10 +46,7 @@ class OdbcSrcCli(SrcCli, ABC):
             if params is None:
                 params = tuple()
             rows = cursor.execute(qry, params).fetchall()
-            if not rows:
-                res = DBRes([], [])
-            else:
-                res = DBRes([n[0] for n in cursor.description], rows)
+            res = DBRes.from_cursor(cursor, rows)
         except Exception as err:
             raise RuntimeError(
                 f"Failed to execute {qry = !r} with {params = !r}"
@@ -65,3 +62,6 @@ class OdbcSrcCliAltSample(OdbcSrcCli, ABC):
         qry = self._qry("").strip(";")
         sample_table = f"({qry}) as sample_table"
         return self._exec(f"SELECT TOP 1 * FROM {sample_table};")
+
+    def _limit(self, qry: str, limit: int) -> str:
+        return f"SELECT TOP {limit} * FROM ({qry}) AS limited"
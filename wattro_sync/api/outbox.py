@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from typing import Callable, Iterator, Protocol
+
+from ..file_access import read_write
+
+
+class MailTransport(Protocol):
+    def deliver(self, subject: str, html_content: str) -> bool:
+        """returns True if the mail was accepted"""
+        ...
+
+
+class Outbox:
+    """
+    Mails waiting to be sent, persisted in outbox.json.
+
+    With a `digest_window` (seconds) pending mails are held until the oldest one
+    is that old and then merged into a single mail. CRITICAL mails are sent right away.
+    Failed deliveries are retried with exponential backoff and dropped after `max_attempts`.
+    The file is locked while it is changed, so several processes can share it.
+    Mails being delivered are claimed for `claim_seconds`, so no other process sends them too.
+    """
+
+    def __init__(
+        self,
+        transport: MailTransport,
+        digest_window: float = 0,
+        max_attempts: int = 8,
+        base_backoff: float = 30.0,
+        clock: Callable[[], float] = time.time,
+        claim_seconds: float = 600.0,
+    ):
+        self.transport = transport
+        self.digest_window = digest_window
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.clock = clock
+        self.claim_seconds = claim_seconds
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _messages(self) -> Iterator[list[dict]]:
+        """the persisted mails, written back after the block"""
+        with self._lock, read_write.locked("outbox"):
+            messages = read_write.read("outbox").get("messages", [])
+            for msg in messages:
+                # written by older versions
+                msg.setdefault("id", uuid.uuid4().hex)
+                msg.setdefault("claimed_until", 0.0)
+            yield messages
+            read_write.write("outbox", {"messages": messages})
+
+    def put(self, log_level: int, subject: str, html_content: str) -> None:
+        with self._messages() as messages:
+            messages.append(
+                {
+                    "id": uuid.uuid4().hex,
+                    "created": self.clock(),
+                    "log_level": log_level,
+                    "subject": subject,
+                    "html_content": html_content,
+                    "attempts": 0,
+                    "next_try": 0.0,
+                    "claimed_until": 0.0,
+                }
+            )
+
+    def __len__(self) -> int:
+        with self._lock, read_write.locked("outbox"):
+            return len(read_write.read("outbox").get("messages", []))
+
+    def drain(self) -> int:
+        """deliver what is due, returns the number of delivered mails"""
+        with self._messages() as messages:
+            batches = self._due_batches(messages)
+            claimed_until = self.clock() + self.claim_seconds
+            for batch in batches:
+                for msg in batch:
+                    msg["claimed_until"] = claimed_until
+        delivered = 0
+        for batch in batches:
+            subject, html_content = _merge(batch)
+            success = self.transport.deliver(subject, html_content)
+            ids = {msg["id"] for msg in batch}
+            # saved after each batch, so a delivered mail is not sent again
+            with self._messages() as messages:
+                if success:
+                    delivered += 1
+                    messages[:] = [msg for msg in messages if msg["id"] not in ids]
+                else:
+                    self._reschedule(
+                        messages, [msg for msg in messages if msg["id"] in ids]
+                    )
+        return delivered
+
+    def _due_batches(self, messages: list[dict]) -> list[list[dict]]:
+        now = self.clock()
+        due = [
+            msg
+            for msg in messages
+            if msg["next_try"] <= now and msg["claimed_until"] <= now
+        ]
+        if self.digest_window <= 0:
+            return [[msg] for msg in due]
+        batches = [[msg] for msg in due if msg["log_level"] >= logging.CRITICAL]
+        held = [msg for msg in due if msg["log_level"] < logging.CRITICAL]
+        if held and now - min(msg["created"] for msg in held) >= self.digest_window:
+            batches.append(held)
+        return batches
+
+    def _reschedule(self, messages: list[dict], batch: list[dict]) -> None:
+        for msg in batch:
+            msg["attempts"] += 1
+            msg["claimed_until"] = 0.0
+            if msg["attempts"] >= self.max_attempts:
+                logging.error(
+                    "Mail %r nach %i Versuchen verworfen.",
+                    msg["subject"],
+                    msg["attempts"],
+                )
+                messages.remove(msg)
+                continue
+            msg["next_try"] = self.clock() + self.base_backoff * 2 ** msg["attempts"]
+
+
+def _merge(batch: list[dict]) -> tuple[str, str]:
+    if len(batch) == 1:
+        return batch[0]["subject"], batch[0]["html_content"]
+    worst = max(batch, key=lambda msg: msg["log_level"])
+    subject = f"{worst['subject']} (Zusammenfassung von {len(batch)} Meldungen)"
+    parts = [
+        f"<p><strong>{time.strftime('%Y-%m-%d %H:%M', time.localtime(msg['created']))}"
+        f"</strong><br />{msg['html_content']}</p>"
+        for msg in sorted(batch, key=lambda msg: msg["created"])
+    ]
+    return subject, "<hr />".join(parts)
+
+
+class BackgroundSender:
+    """Drains an outbox in a daemon thread, so sending never blocks the sync."""
+
+    def __init__(self, outbox: Outbox, interval: float = 60.0):
+        self.outbox = outbox
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        # the context carries e.g. the base folder of the outbox file
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(
+            target=context.run, args=(self._run,), name="mail-outbox", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.outbox.drain()
+            except Exception as err:
+                logging.error("Versand aus dem Postausgang fehlgeschlagen: %s", err)
+            if self._stop.is_set():
+                return
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def close(self, timeout: float) -> None:
+        """wait up to `timeout` seconds for a last drain, undelivered mails stay persisted"""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
@@ -0,0 +1,80 @@
+"""Serialisation and compression of request bodies."""
+from __future__ import annotations
+
+import gzip
+import json
+import zlib
+from typing import Any, Callable, Iterable, Iterator, Literal
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None  # type: ignore[assignment]
+
+Encoder = Callable[[Any], bytes]
+Compression = Literal["gzip", "deflate"]
+
+# compressing tiny bodies costs more than it saves
+MIN_COMPRESS_BYTES = 1024
+
+
+def stdlib_dumps(data: Any) -> bytes:
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def get_encoder(name: str = "auto") -> Encoder:
+    """'auto' uses orjson if it is installed, 'json' always uses the stdlib."""
+    if name == "json":
+        return stdlib_dumps
+    if name == "orjson" or (name == "auto" and orjson is not None):
+        if orjson is None:
+            raise ImportError("orjson is not installed")
+        return orjson.dumps
+    if name == "auto":
+        return stdlib_dumps
+    raise ValueError(f"Unknown encoder {name!r}")
+
+
+def compress(body: bytes, method: Compression) -> bytes:
+    if method == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    if method == "deflate":
+        return zlib.compress(body, 6)
+    raise ValueError(f"Unknown compression {method!r}")
+
+
+# bodies are streamed in pieces of about this size
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def iter_json_object(
+    key: str,
+    items: Iterable[Any],
+    encoder: Encoder,
+    chunk_size: int = STREAM_CHUNK_BYTES,
+) -> Iterator[bytes]:
+    """
+    Encode `{key: [*items]}` item by item.
+    Only about one chunk of encoded data is held in memory at a time.
+    """
+    buffer = bytearray(encoder({key: []})[:-2])  # '{"key":['
+    separator = b""
+    for item in items:
+        buffer += separator
+        buffer += encoder(item)
+        separator = b","
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b"]}"
+    yield bytes(buffer)
+
+
+def iter_compressed(chunks: Iterable[bytes], method: Compression) -> Iterator[bytes]:
+    wbits = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}[method]
+    compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import contextlib
+import datetime
+import email.utils
+import logging
+import threading
+import time
+from typing import Callable, Iterator
+
+OVERLOAD_STATUS_CODES = (429, 503)
+# reads are few and cheap for the node, only writes are paced
+UNPACED_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RateController:
+    """
+    Client side flow control with additive increase / multiplicative decrease.
+
+    Limits both the request rate and the number of requests in flight.
+    Fast successful responses slowly raise both limits,
+    slow responses or overload answers (429/503) cut them down.
+    Only requests of a roughly constant size should report their latency,
+    the duration of a large upload says little about the load of the node.
+    """
+
+    def __init__(
+        self,
+        rate: float = 5.0,
+        min_rate: float = 0.2,
+        max_rate: float = 50.0,
+        concurrency: float = 1.0,
+        max_concurrency: int = 4,
+        target_latency: float = 2.0,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        self.clock = clock
+        self.in_flight = 0
+        self.next_slot = 0.0
+        self.blocked_until = 0.0
+        self._cond = threading.Condition()
+
+    @contextlib.contextmanager
+    def slot(self) -> Iterator[None]:
+        """wait until a request may be sent, keep the slot while it is in flight"""
+        with self._cond:
+            while True:
+                now = self.clock()
+                start_at = max(self.next_slot, self.blocked_until)
+                if self.in_flight >= int(self.concurrency):
+                    self._cond.wait()
+                elif start_at > now:
+                    self._cond.wait(start_at - now)
+                else:
+                    break
+            self.next_slot = now + 1 / self.rate
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def on_success(self, latency: float) -> None:
+        with self._cond:
+            if latency > self.target_latency:
+                self._decrease()
+                return
+            self.rate = min(self.rate + self.increase, self.max_rate)
+            # roughly +1 per window of `concurrency` successful requests
+            self.concurrency = min(
+                self.concurrency + self.increase / self.concurrency,
+                self.max_concurrency,
+            )
+            self._cond.notify_all()
+
+    def on_overload(self, retry_after: None | float) -> None:
+        with self._cond:
+            self._decrease()
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, self.clock() + retry_after)
+            logging.warning(
+                "Wattro überlastet. Neue Rate: %.2f/s, parallel: %i, Pause: %ss",
+                self.rate,
+                int(self.concurrency),
+                retry_after,
+            )
+
+    def _decrease(self) -> None:
+        self.rate = max(self.rate * self.decrease, self.min_rate)
+        self.concurrency = max(self.concurrency * self.decrease, 1.0)
+
+
+def parse_retry_after(value: None | str) -> None | float:
+    """Retry-After is either a number of seconds or a HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        logging.warning("Ungültiger Retry-After Header: %r", value)
+        return None
+    now = datetime.datetime.now(tz=retry_at.tzinfo or datetime.timezone.utc)
+    return max((retry_at - now).total_seconds(), 0.0)
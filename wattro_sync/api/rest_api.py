@@ -1,14 +1,33 @@
 from __future__ import annotations
 
 import abc
-import json
+import contextlib
 import logging
+import time
 import urllib.error
 import urllib.parse
 import urllib.request
+from typing import Callable, Iterable, Iterator
 
 import requests
 
+from . import payload
+from ..file_access.cache import FileCache, cache_key
+from .rate_limit import (
+    OVERLOAD_STATUS_CODES,
+    UNPACED_METHODS,
+    RateController,
+    parse_retry_after,
+)
+
+
+# answers to a request the server will not accept, no matter how often it is sent
+REJECTED_STATUS_CODES = (400, 409, 413, 422)
+
+
+class RequestRejected(ConnectionError):
+    """the server refused the request itself, sending it again will not help"""
+
 
 class RESTApi(abc.ABC):
     def _get_headers(self) -> dict:
@@ -29,6 +48,59 @@ class RESTApi(abc.ABC):
     def _get_base_waittime(self) -> float:
         return getattr(self, "base_waittime", 3.0)
 
+    def _get_session(self) -> requests.Session | None:
+        """a session keeps connections alive between requests"""
+        return getattr(self, "session", None)
+
+    def _get_rate_controller(self) -> RateController | None:
+        return getattr(self, "rate_controller", None)
+
+    def _get_max_retries(self) -> int:
+        return getattr(self, "max_retries", 5)
+
+    def _get_encoder(self) -> payload.Encoder:
+        return getattr(self, "encoder", payload.stdlib_dumps)
+
+    def _get_compression(self) -> None | payload.Compression:
+        compression = getattr(self, "compression", None)
+        if compression == "auto":
+            # most nodes accept gzip, a 415 answer switches it off
+            return "gzip"
+        return compression
+
+    def _content_encoding(
+        self, body: None | bytes, stream: None | Callable
+    ) -> None | payload.Compression:
+        compression = self._get_compression()
+        if stream is not None:
+            return compression
+        if body is None or len(body) < payload.MIN_COMPRESS_BYTES:
+            return None
+        return compression
+
+    def _compress(
+        self, body: None | bytes, compression: None | payload.Compression
+    ) -> None | bytes:
+        if body is None or compression is None:
+            return body
+        compressed = payload.compress(body, compression)
+        logging.debug(
+            "%s komprimiert: %i -> %i bytes", compression, len(body), len(compressed)
+        )
+        return compressed
+
+    def _compress_stream(
+        self, chunks: Iterable[bytes], compression: None | payload.Compression
+    ) -> Iterable[bytes]:
+        if compression is None:
+            return chunks
+        return payload.iter_compressed(chunks, compression)
+
+    def get_max_concurrency(self) -> int:
+        """upper bound of parallel requests the rate controller may allow"""
+        controller = self._get_rate_controller()
+        return controller.max_concurrency if controller else 1
+
     def _request(
         self,
         method: str,
@@ -36,27 +108,84 @@ class RESTApi(abc.ABC):
         *,
         custom_header: dict | None = None,
         data: dict | None = None,
+        stream: None | Callable[[], Iterable[bytes]] = None,
         params: dict | None = None,
     ) -> dict:
-        header = self._get_headers()
+        """
+        `stream` is an alternative to `data`: it returns the already encoded body in chunks,
+        which is sent with chunked transfer encoding. It is called again for every retry.
+        """
+        header = dict(self._get_headers())
         if custom_header:
             header.update(custom_header)
-        parsed_data = None
+        body = None
         if data is not None:
-            parsed_data = json.dumps(data)
+            body = self._get_encoder()(data)
+        if body is not None or stream is not None:
             header.update({"Content-Type": "application/json"})
-        res = requests.request(
-            method=method,
-            url=url,
-            data=parsed_data,
-            params=params,
-            headers=header,
-            timeout=20,
+        content_encoding = self._content_encoding(body, stream)
+        parsed_data: None | bytes | Iterable[bytes] = self._compress(
+            body, content_encoding
         )
+        session = self._get_session()
+        controller = None
+        if method not in UNPACED_METHODS:
+            controller = self._get_rate_controller()
+        for attempt in range(self._get_max_retries() + 1):
+            if stream is not None:
+                parsed_data = self._compress_stream(stream(), content_encoding)
+            if content_encoding:
+                header["Content-Encoding"] = content_encoding
+            else:
+                header.pop("Content-Encoding", None)
+            slot = controller.slot() if controller else contextlib.nullcontext()
+            with slot:
+                start = time.monotonic()
+                res = (session or requests).request(
+                    method=method,
+                    url=url,
+                    data=parsed_data,
+                    params=params,
+                    headers=header,
+                    timeout=20,
+                )
+                latency = time.monotonic() - start
+            if res.status_code == 415 and content_encoding:
+                if getattr(self, "compression", None) != "auto":
+                    raise ConnectionError(
+                        f"{self._get_hostname()} lehnt {content_encoding} komprimierte "
+                        "Anfragen ab (415). 'compression' in wattro_cfg anpassen."
+                    )
+                logging.warning(
+                    "%s unterstützt keine %s komprimierten Anfragen. Sende unkomprimiert.",
+                    self._get_hostname(),
+                    content_encoding,
+                )
+                setattr(self, "compression", None)
+                content_encoding = None
+                parsed_data = body
+                continue
+            if res.status_code not in OVERLOAD_STATUS_CODES:
+                break
+            retry_after = parse_retry_after(res.headers.get("Retry-After"))
+            if retry_after is None:
+                retry_after = self._get_base_waittime() * 2**attempt
+            if controller:
+                controller.on_overload(retry_after)
+            else:
+                time.sleep(retry_after)
+            logging.info(
+                "%s %s: %s (Versuch %i)", method, url, res.status_code, attempt + 1
+            )
         if res.ok:
+            # a streamed upload takes as long as the records take to transform
+            if controller and stream is None:
+                controller.on_success(latency)
             return res.json()
         logging.error("%s Request to %s Failed", method, url)
         logging.error("%s: %s", res.status_code, res.content)
+        if res.status_code in REJECTED_STATUS_CODES:
+            raise RequestRejected(f"{res.status_code}: {res.text[:500]}")
         raise ConnectionError()
 
     def _url(self, path: str) -> str:
@@ -70,9 +199,21 @@ class RESTApi(abc.ABC):
     def _post(self, path: str, data: dict) -> dict:
         return self._request(method="POST", data=data, url=self._url(path))
 
+    def _post_stream(self, path: str, stream: Callable[[], Iterable[bytes]]) -> dict:
+        return self._request(method="POST", stream=stream, url=self._url(path))
+
 
 class WattroNodeApi(RESTApi):
-    def __init__(self, domain: str, api_key: str):
+    FIELD_CACHE_TTL = 24 * 60 * 60
+
+    def __init__(
+        self,
+        domain: str,
+        api_key: str,
+        compression: None | str = None,
+        json_encoder: str = "auto",
+        session: None | requests.Session = None,
+    ):
         if domain == "local":
             self.protocol = "http"
             self.hostname = "127.0.0.1:8000"
@@ -80,6 +221,13 @@ class WattroNodeApi(RESTApi):
             self.protocol = "https"
             self.hostname = f"node.{domain}.wattro.de"
         self.headers = {"Authorization": f"Api-Key {api_key}"}
+        # may be shared by several apis talking to the same host
+        self.session = session or requests.Session()
+        self.rate_controller = RateController()
+        self.compression = compression
+        self.encoder = payload.get_encoder(json_encoder)
+        # set by the health check, if the node tells
+        self.node_version: None | str = None
 
     def _get(self, path: str, params: dict | None = None) -> dict:
         path = path.strip("/") + "/"
@@ -103,13 +251,25 @@ class WattroNodeApi(RESTApi):
             RuntimeError(f"Expected list from Wattro API got {idents!r}")
         return idents
 
-    def get_fields(self, path: str) -> dict:
+    def get_fields(self, path: str, use_cache: bool = True) -> dict:
+        """
+        Writable fields of `path` as announced by OPTIONS.
+        Cached on disk per node version for FIELD_CACHE_TTL seconds.
+        """
+        cache = FileCache("field_cache", ttl=self.FIELD_CACHE_TTL)
+        key = cache_key(self._get_hostname(), path)
+        if use_cache:
+            fields = cache.get(key, version=self.node_version)
+            if fields is not None:
+                return fields
         res = self._request(method="OPTIONS", url=self._url(path))
-        return res["actions"]["POST"]
+        fields = res["actions"]["POST"]
+        cache.put(key, fields, version=self.node_version)
+        return fields
 
     @classmethod
-    def get_healthy_api(cls, domain: str, api_key: str) -> WattroNodeApi:
-        api = cls(domain, api_key)
+    def get_healthy_api(cls, domain: str, api_key: str, **kwargs) -> WattroNodeApi:
+        api = cls(domain, api_key, **kwargs)
         try:
             health = api.get_health()
         except urllib.error.URLError as urllib_err:
@@ -121,12 +281,35 @@ class WattroNodeApi(RESTApi):
             raise ConnectionError(
                 f"Not allowed to connect to {api.get_ref_url()!r}: {health}"
             )
+        if health.get("version", None) is not None:
+            api.node_version = str(health["version"])
         return api
 
-    def bulk_create(self, target: str, new_target_data: list[dict]) -> None:
-        self._post(f"/sync/{target}/bulk/", data={"new_data": new_target_data})
+    def bulk_create(self, target: str, new_target_data: Iterable[dict]) -> None:
+        """
+        The records are encoded while they are uploaded.
+        Pass something that can be iterated more than once to allow retries.
+        """
+        encoder = self._get_encoder()
+        pending = [new_target_data]
+        is_one_shot = iter(new_target_data) is new_target_data
+
+        def stream() -> Iterator[bytes]:
+            if is_one_shot and not pending:
+                raise ConnectionError("Datenstrom kann nicht erneut gesendet werden.")
+            records = pending.pop() if is_one_shot else new_target_data
+            return payload.iter_json_object("new_data", records, encoder)
+
+        self._post_stream(f"/sync/{target}/bulk/", stream)
 
     def update_by_ident(self, target: str, new_target_data: dict) -> None:
         self._post(
             f"/sync/{target}/update_by_ident/", data={"new_data": new_target_data}
         )
+
+    def partial_update_by_ident(self, target: str, changed_target_data: dict) -> None:
+        """`changed_target_data` holds the ident and only the fields to change"""
+        self._post(
+            f"/sync/{target}/partial_update_by_ident/",
+            data={"new_data": changed_target_data},
+        )
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import concurrent.futures
+import contextvars
+import logging
+import threading
+from typing import Any
+
+from ..file_access.cache import FileCache, cache_key
+from .src_cli import SrcCli
+
+Fields = tuple[list[str], dict[str, list]]
+
+
+class SchemaCache:
+    """
+    Collections and field names of a source, persisted between setup runs.
+
+    Field samples are kept as strings, as they are only used for previews.
+    They are customer data, so they are only persisted with `keep_samples`.
+    `prefetch` loads the fields of a collection in the background,
+    `close` (or leaving the `with` block) stops loading.
+    """
+
+    TTL = 7 * 24 * 60 * 60
+
+    def __init__(
+        self,
+        api: type[SrcCli],
+        connection_info: Any,
+        refresh: bool = False,
+        keep_samples: bool = False,
+    ):
+        self.api = api
+        self.connection_info = connection_info
+        self.keep_samples = keep_samples
+        self.cache = FileCache("schema_cache", ttl=self.TTL)
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self._pending: dict[str, concurrent.futures.Future[Fields]] = {}
+        self._lock = threading.Lock()
+        if refresh:
+            self.invalidate()
+
+    def __enter__(self) -> SchemaCache:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _key(self, collection: None | str = None) -> str:
+        return cache_key(self.api.__name__, self.connection_info, collection)
+
+    def invalidate(self) -> None:
+        collections = self.cache.get(self._key()) or []
+        keys = [self._key()] + [self._key(name) for name in collections]
+        logging.info("Verwerfe zwischengespeicherte Struktur der Quelle.")
+        self.cache.invalidate(*keys)
+
+    def get_collections(self) -> list[str]:
+        collections = self.cache.get(self._key())
+        if collections is None:
+            collections = self.api.get_collections(self.connection_info)
+            self.cache.put(self._key(), collections)
+        return collections
+
+    def _cached(self, collection: str) -> None | list:
+        """persisted `[field_names]`, or `[field_names, samples]` with `keep_samples`"""
+        cached = self.cache.get(self._key(collection))
+        if cached is not None and len(cached) > 1 and not self.keep_samples:
+            # written with keep_samples, or by an older version
+            cached = cached[:1]
+            self.cache.put(self._key(collection), cached)
+        return cached
+
+    def _loaded(self, collection: str) -> None | Fields:
+        with self._lock:
+            future = self._pending.get(collection, None)
+        if future is None or not future.done() or future.exception():
+            return None
+        return future.result()
+
+    def get_fields(self, collection: str) -> Fields:
+        loaded = self._loaded(collection)
+        if loaded is not None:
+            return loaded
+        cached = self._cached(collection)
+        if cached is not None and len(cached) > 1:
+            field_names, sample_values = cached
+            return field_names, sample_values
+        return self._future(collection).result()
+
+    def prefetch(self, collection: str) -> None:
+        if self._loaded(collection) is None:
+            self._future(collection)
+
+    def preview(self, collection: str) -> str:
+        """preview text for a menu; starts loading the collection if needed"""
+        loaded = self._loaded(collection)
+        if loaded is not None:
+            return ", ".join(loaded[0])
+        cached = self._cached(collection)
+        if cached is None or len(cached) == 1:
+            # the samples are needed once the collection is chosen
+            self.prefetch(collection)
+        if cached is None:
+            return "Felder werden geladen..."
+        return ", ".join(cached[0])
+
+    def _future(self, collection: str) -> concurrent.futures.Future[Fields]:
+        with self._lock:
+            future = self._pending.get(collection, None)
+            if future is None or (future.done() and future.exception()):
+                # the pool threads do not inherit the context (base folder)
+                future = self._pool.submit(
+                    contextvars.copy_context().run, self._load_fields, collection
+                )
+                self._pending[collection] = future
+            return future
+
+    def _load_fields(self, collection: str) -> Fields:
+        field_names, sample_values = self.api.get_fields(
+            self.connection_info, collection
+        )
+        as_text = {
+            field: [str(val) for val in values]
+            for field, values in sample_values.items()
+        }
+        persisted = [field_names, as_text] if self.keep_samples else [field_names]
+        self.cache.put(self._key(collection), persisted)
+        return field_names, as_text
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import base64
+import dataclasses
+import datetime
+import decimal
+import gzip
+import hashlib
+import hmac
+import json
+import pathlib
+from typing import Any, Callable, Collection, Iterator, Sequence
+
+from .src_cli import CollectionInfo, DBRes, RecordSrcCli, SyncInfo
+
+SNAPSHOT_VERSION = 1
+BYTES_COLUMN = "bytes"
+
+
+class Anonymiser:
+    """
+    Replaces values with a keyed hash (HMAC-SHA256) of them, so equal values stay equal
+    across rows, targets and exports with the same key. Types, NULLs and string lengths are kept,
+    digit strings stay digits.
+    """
+
+    def __init__(self, key: bytes):
+        self.key = key
+
+    def _digest(self, raw: bytes) -> str:
+        return hmac.new(self.key, raw, hashlib.sha256).hexdigest()
+
+    def __call__(self, val: Any, full_width: bool = False) -> Any:
+        """`full_width` keeps all bits of the digest for ints, e.g. for ident columns"""
+        if val is None or isinstance(val, bool):
+            return val
+        if isinstance(val, (bytes, bytearray, memoryview)):
+            raw = bytes(val)
+            return _stretch(self._digest(raw), len(raw)).encode()
+        digest = self._digest(str(val).encode())
+        if isinstance(val, int):
+            return int(digest if full_width else digest[:8], 16)
+        if isinstance(val, float):
+            return float(int(digest[:8], 16))
+        val = str(val)
+        if val.isascii() and val.isdigit():
+            return _stretch(str(int(digest, 16)), len(val))
+        return _stretch(digest, len(val))
+
+
+def _stretch(digest: str, length: int) -> str:
+    return (digest * (length // len(digest) + 1))[:length]
+
+
+# column kinds stored as strings, with how to restore them
+DECODERS: dict[str, Callable[[str], Any]] = {
+    BYTES_COLUMN: base64.b64decode,
+    "datetime": datetime.datetime.fromisoformat,
+    "date": datetime.date.fromisoformat,
+    "time": datetime.time.fromisoformat,
+    "decimal": decimal.Decimal,
+}
+# type codes of the cursor description that can be stored by name
+TYPE_CODES: dict[str, type] = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": bool,
+    BYTES_COLUMN: bytes,
+    "bytearray": bytearray,
+    "datetime": datetime.datetime,
+    "date": datetime.date,
+    "time": datetime.time,
+    "decimal": decimal.Decimal,
+}
+TYPE_NAMES = {type_code: name for name, type_code in TYPE_CODES.items()}
+
+
+def _encode_value(kind: str, val: Any) -> Any:
+    if kind == BYTES_COLUMN:
+        return base64.b64encode(bytes(val)).decode()
+    if kind == "decimal":
+        return str(val)
+    return val.isoformat()
+
+
+def _encode_column(values: Sequence[Any]) -> tuple[str, list]:
+    """json compatible values of one column and how they are stored"""
+    if any(isinstance(val, (bytes, bytearray, memoryview)) for val in values):
+        kind = BYTES_COLUMN
+    else:
+        kinds = {type(val) for val in values if val is not None}
+        if all(issubclass(val_type, (str, int, float)) for val_type in kinds):
+            return "", list(values)
+        kind = TYPE_NAMES.get(kinds.pop(), "") if len(kinds) == 1 else ""
+        if kind not in DECODERS:
+            # mixed or unknown types, templates render them the same way as strings
+            return "", [
+                val if val is None or isinstance(val, (str, int, float)) else str(val)
+                for val in values
+            ]
+    return kind, [None if val is None else _encode_value(kind, val) for val in values]
+
+
+def snapshot_target(
+    src_data: DBRes,
+    collection_info: CollectionInfo,
+    field_mapping: dict,
+    encoding: str,
+    anonymiser: None | Anonymiser = None,
+    anonymise: Collection[str] = (),
+) -> dict:
+    """the rows of `src_data` column by column, with what is needed to sync them again"""
+    columns = list(zip(*src_data.rows)) if src_data.rows else []
+    kinds, encoded, type_codes = [], [], []
+    for idx, (name, values) in enumerate(zip(src_data.description, columns)):
+        type_code = src_data.type_codes[idx] if src_data.type_codes else None
+        if anonymiser is not None and name in anonymise:
+            is_ident = name == collection_info.ident
+            anonymised = tuple(anonymiser(val, full_width=is_ident) for val in values)
+            if is_ident and len(set(anonymised)) < len(set(values)):
+                # e.g. short strings, the records would be merged on replay
+                raise ValueError(
+                    f"Anonymisierte Werte der Ident-Spalte {name} sind nicht eindeutig."
+                )
+            values = anonymised
+            # e.g. dates become strings
+            type_code = None
+        kind, column = _encode_column(values)
+        kinds.append(kind)
+        encoded.append(column)
+        type_codes.append(
+            TYPE_NAMES.get(type_code, None) if isinstance(type_code, type) else None
+        )
+    return {
+        "collection_info": dataclasses.asdict(collection_info),
+        "field_mapping": field_mapping,
+        "encoding": encoding,
+        "description": list(src_data.description),
+        "kinds": kinds,
+        "columns": encoded,
+        "type_codes": type_codes if src_data.type_codes else [],
+        "nullable": [
+            None if null_ok is None else bool(null_ok) for null_ok in src_data.nullable
+        ],
+        "anonymised": sorted(set(anonymise) & set(src_data.description)),
+    }
+
+
+def write_snapshot(path: pathlib.Path, targets: dict[str, dict]) -> None:
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "targets": targets,
+    }
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=9) as fp:
+        json.dump(snapshot, fp, ensure_ascii=False, separators=(",", ":"))
+
+
+def read_snapshot(path: pathlib.Path) -> dict:
+    with gzip.open(path, "rt", encoding="utf-8") as fp:
+        snapshot = json.load(fp)
+    if snapshot.get("version", None) != SNAPSHOT_VERSION:
+        raise ValueError(f"Unbekannte Snapshot Version {snapshot.get('version')!r}")
+    return snapshot
+
+
+def decode_target(data: dict) -> DBRes:
+    columns = [
+        [None if val is None else DECODERS[kind](val) for val in column]
+        if kind
+        else column
+        for kind, column in zip(data["kinds"], data["columns"])
+    ]
+    rows = list(zip(*columns))
+    if not rows:
+        return DBRes([], [])
+    # snapshots written before type codes were kept have none
+    return DBRes(
+        description=data["description"],
+        rows=rows,
+        type_codes=[TYPE_CODES.get(name, None) for name in data.get("type_codes", [])],
+        nullable=data.get("nullable", []),
+    )
+
+
+class SnapshotSyncInfo(SyncInfo):
+    """`path` of a snapshot file, `collection_info.collection_name` is the target in it"""
+
+    path: str
+    collection_info: CollectionInfo
+
+    def __init__(self, path: str, collection_info: CollectionInfo):
+        self.path = path
+        self.collection_info = collection_info
+
+    def asdict(self) -> dict:
+        return {
+            "path": str(self.path),
+            "collection_info": dataclasses.asdict(self.collection_info),
+        }
+
+    @classmethod
+    def from_dict(cls, info: dict) -> SnapshotSyncInfo:
+        return cls(
+            path=info["path"],
+            collection_info=CollectionInfo(**info["collection_info"]),
+        )
+
+
+class SnapshotApi(RecordSrcCli):
+    """Replays the rows of a snapshot, see `python -m wattro_sync.snapshot`."""
+
+    def __init__(self, sync_info: SnapshotSyncInfo):
+        self.collection_info = sync_info.collection_info
+        snapshot = read_snapshot(pathlib.Path(sync_info.path))
+        self.data = decode_target(
+            snapshot["targets"][self.collection_info.collection_name]
+        )
+
+    def _iter_records(self) -> Iterator[dict[str, Any]]:
+        return iter(self.data)
+
+    def _columns(self) -> list[str]:
+        return [col for col in super()._columns() if col in self.data.description]
+
+    def _column_types(
+        self, columns: Sequence[str]
+    ) -> tuple[Sequence[Any], Sequence[None | bool]]:
+        positions = [self.data.description.index(col) for col in columns]
+        type_codes, nullable = self.data.type_codes, self.data.nullable
+        return (
+            [type_codes[pos] for pos in positions] if type_codes else (),
+            [nullable[pos] for pos in positions] if nullable else (),
+        )
+
+    @classmethod
+    def get_collections(cls, connection_info: str) -> list[str]:
+        return sorted(read_snapshot(pathlib.Path(connection_info))["targets"])
+
+    @classmethod
+    def get_fields(
+        cls, connection_info: str, collection: str
+    ) -> tuple[list[str], dict[str, list]]:
+        data = read_snapshot(pathlib.Path(connection_info))["targets"][collection]
+        samples = {
+            name: column[:50]
+            for name, column in zip(data["description"], data["columns"])
+        }
+        return sorted(samples), samples
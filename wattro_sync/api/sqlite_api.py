@@ -1,37 +1,209 @@
 from __future__ import annotations
 
+import contextlib
 import dataclasses
+import logging
+import os
+import pathlib
 import sqlite3
+import tempfile
+from typing import Collection, Iterator, Sequence
 
+from ..config_reader.types import ConfigDegenerated
 from .src_cli import SrcCli, DBRes, CollectionInfo, SyncInfo
 
+# None: default connection, "ro": read only, "immutable": read only without any locking
+READ_MODES = (None, "ro", "immutable")
+
 
 class SQLiteSyncInfo(SyncInfo):
     db_path: str
     collection_info: CollectionInfo
 
-    def __init__(self, db_path: str, collection_info: CollectionInfo):
+    def __init__(
+        self,
+        db_path: str,
+        collection_info: CollectionInfo,
+        read_mode: None | str = None,
+        copy_when_busy: bool = False,
+        change_log: bool = False,
+    ):
         self.db_path = db_path
         self.collection_info = collection_info
+        self.read_mode = read_mode
+        self.copy_when_busy = copy_when_busy
+        self.change_log = change_log
 
     def asdict(self) -> dict:
-        return {
+        info: dict = {
             "db_path": str(self.db_path),
             "collection_info": dataclasses.asdict(self.collection_info),
         }
+        if self.read_mode is not None:
+            info["read_mode"] = self.read_mode
+        if self.copy_when_busy:
+            info["copy_when_busy"] = True
+        if self.change_log:
+            info["change_log"] = True
+        return info
 
     @classmethod
     def from_dict(cls, info: dict) -> SQLiteSyncInfo:
+        read_mode = info.get("read_mode", None)
+        if read_mode not in READ_MODES:
+            raise ConfigDegenerated(f"read_mode not one of {READ_MODES} {read_mode=}")
+        copy_when_busy = info.get("copy_when_busy", False)
+        if not isinstance(copy_when_busy, bool):
+            raise ConfigDegenerated(f"copy_when_busy not a bool {copy_when_busy=}")
+        change_log = info.get("change_log", False)
+        if not isinstance(change_log, bool):
+            raise ConfigDegenerated(f"change_log not a bool {change_log=}")
         return cls(
             db_path=info["db_path"],
             collection_info=CollectionInfo(**info["collection_info"]),
+            read_mode=read_mode,
+            copy_when_busy=copy_when_busy,
+            change_log=change_log,
         )
 
 
 class SQLiteApi(SrcCli):
+    # applied to read mode connections
+    MMAP_SIZE = 256 * 1024 * 1024
+    CACHE_KIB = 64 * 1024
+    BUSY_TIMEOUT = 5.0
+    CHANGE_LOG_TABLE = "wattro_sync_changelog"
+
     def __init__(self, sync_info: SQLiteSyncInfo):
         self.db_path = sync_info.db_path
         self.collection_info = sync_info.collection_info
+        self.read_mode = sync_info.read_mode
+        self.copy_when_busy = sync_info.copy_when_busy
+        self.change_log = sync_info.change_log
+        # the connection of the open session
+        self._cnxn: None | sqlite3.Connection = None
+        # last change log entry returned by get_changed
+        self._change_seq: None | int = None
+
+    def _trigger_names(self) -> tuple[str, str]:
+        collection = self.collection_info.collection_name
+        return f"wattro_sync_{collection}_insert", f"wattro_sync_{collection}_update"
+
+    def install_change_log(self) -> None:
+        """
+        Create the change log table and the triggers that fill it with the idents
+        of inserted and updated rows. All current rows are logged once,
+        so the next sync compares them all.
+        """
+        if self.collection_info.hardcoded_select:
+            raise ValueError(
+                "Änderungsprotokoll nicht möglich: hardcoded_select liest evtl. weitere Tabellen."
+            )
+        collection = self.collection_info.collection_name
+        ident = self.collection_info.ident
+        insert_trigger, update_trigger = self._trigger_names()
+        log_entry = (
+            f"INSERT INTO {self.CHANGE_LOG_TABLE} (collection, ident) "
+            f"VALUES ('{collection}', NEW.{ident});"
+        )
+        cnxn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            cnxn.execute("BEGIN IMMEDIATE")
+            cnxn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.CHANGE_LOG_TABLE} "
+                "(seq INTEGER PRIMARY KEY AUTOINCREMENT, collection TEXT NOT NULL, ident)"
+            )
+            cnxn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.CHANGE_LOG_TABLE}_collection "
+                f"ON {self.CHANGE_LOG_TABLE} (collection, seq)"
+            )
+            cnxn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {insert_trigger} AFTER INSERT ON {collection} "
+                f"BEGIN {log_entry} END"
+            )
+            cnxn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {update_trigger} AFTER UPDATE ON {collection} "
+                f"BEGIN {log_entry} END"
+            )
+            cnxn.execute(
+                f"INSERT INTO {self.CHANGE_LOG_TABLE} (collection, ident) "
+                f"SELECT ?, {ident} FROM {collection}",
+                (collection,),
+            )
+            cnxn.execute("COMMIT")
+        except Exception:
+            if cnxn.in_transaction:
+                cnxn.execute("ROLLBACK")
+            raise
+        finally:
+            cnxn.close()
+
+    def remove_change_log(self) -> None:
+        """drop the triggers and the logged changes of this collection"""
+        cnxn = sqlite3.connect(self.db_path)
+        try:
+            with cnxn:
+                for trigger in self._trigger_names():
+                    cnxn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+                cnxn.execute(
+                    f"DELETE FROM {self.CHANGE_LOG_TABLE} WHERE collection = ?",
+                    (self.collection_info.collection_name,),
+                )
+        except sqlite3.OperationalError as err:
+            # no change log table, nothing was installed
+            logging.debug(err)
+        finally:
+            cnxn.close()
+
+    def get_changed(self, known_idents: Sequence[str]) -> None | DBRes:
+        if not self.change_log:
+            return None
+        log = self._exec(
+            f"SELECT MAX(seq), COUNT(*) FROM {self.CHANGE_LOG_TABLE} WHERE collection = ?",
+            (self.collection_info.collection_name,),
+        )
+        self._change_seq, count = log.rows[0]
+        if not count:
+            return DBRes([], [])
+        logged = self._exec(
+            f"SELECT DISTINCT ident FROM {self.CHANGE_LOG_TABLE} "
+            "WHERE collection = ? AND seq <= ?",
+            (self.collection_info.collection_name, self._change_seq),
+        )
+        known = set(map(str, known_idents))
+        changed = [str(row[0]) for row in logged.rows if str(row[0]) in known]
+        logging.info(
+            "Änderungsprotokoll: %i Einträge, %i bekannte Datensätze geändert.",
+            count,
+            len(changed),
+        )
+        return self.get_old(changed)
+
+    def ack_changes(self, keep: Collection[str]) -> None:
+        if self._change_seq is None:
+            return
+        change_seq, self._change_seq = self._change_seq, None
+        # trimming needs write access, also in read mode
+        try:
+            cnxn = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT)
+            try:
+                with cnxn:
+                    # a temp table avoids SQLite's limit on bound variables
+                    cnxn.execute("CREATE TEMP TABLE temp_keep (ident TEXT PRIMARY KEY)")
+                    cnxn.executemany(
+                        "INSERT OR IGNORE INTO temp_keep VALUES (?)",
+                        ((str(ident),) for ident in keep),
+                    )
+                    cnxn.execute(
+                        f"DELETE FROM {self.CHANGE_LOG_TABLE} WHERE collection = ? AND seq <= ? "
+                        "AND CAST(ident AS TEXT) NOT IN (SELECT ident FROM temp_keep)",
+                        (self.collection_info.collection_name, change_seq),
+                    )
+            finally:
+                cnxn.close()
+        except sqlite3.OperationalError as err:
+            # e.g. locked or read only, the entries are compared again in the next run
+            logging.warning("Änderungsprotokoll nicht geleert: %s", err)
 
     @classmethod
     def get_fields(
@@ -61,24 +233,102 @@ class SQLiteApi(SrcCli):
         db_res = fake_api._exec(f"PRAGMA table_list")
         return sorted([x["name"] for x in db_res])
 
+    def _connect(self, tune: bool = True) -> sqlite3.Connection:
+        if self.read_mode is None:
+            return sqlite3.connect(self.db_path)
+        uri = f"{pathlib.Path(self.db_path).resolve().as_uri()}?mode=ro"
+        if self.read_mode == "immutable":
+            uri += "&immutable=1"
+        cnxn = sqlite3.connect(
+            uri, uri=True, timeout=self.BUSY_TIMEOUT, isolation_level=None
+        )
+        if tune:
+            self._tune(cnxn)
+        return cnxn
+
+    def _tune(self, cnxn: sqlite3.Connection) -> None:
+        # these already read the database and may hit a lock
+        cnxn.execute("PRAGMA query_only = ON")
+        cnxn.execute(f"PRAGMA mmap_size = {self.MMAP_SIZE}")
+        cnxn.execute(f"PRAGMA cache_size = -{self.CACHE_KIB}")
+
+    @contextlib.contextmanager
+    def session(self) -> Iterator[None]:
+        """
+        In read mode all queries inside share one connection and read transaction,
+        so they see the same snapshot. If the database is locked and `copy_when_busy` is set,
+        the queries run on a backup copy instead.
+        """
+        if self.read_mode is None or self._cnxn is not None:
+            yield
+            return
+        copy_path = None
+        try:
+            cnxn = self._connect(tune=False)
+        except Exception as err:
+            raise ConnectionError(f"Failed to open db at {self.db_path}") from err
+        try:
+            self._tune(cnxn)
+            cnxn.execute("BEGIN")
+            # the read transaction starts with the first read
+            cnxn.execute("SELECT COUNT(*) FROM sqlite_master").fetchall()
+        except sqlite3.OperationalError as err:
+            cnxn.close()
+            if not self.copy_when_busy:
+                raise ConnectionError(f"Failed to read db at {self.db_path}") from err
+            logging.warning("Datenbank belegt (%s). Lese aus einer Kopie.", err)
+            cnxn, copy_path = self._backup_copy()
+        self._cnxn = cnxn
+        try:
+            yield
+        finally:
+            self._cnxn = None
+            cnxn.close()
+            if copy_path is not None:
+                os.remove(copy_path)
+
+    def _backup_copy(self) -> tuple[sqlite3.Connection, str]:
+        """copy the database page by page, waiting for the locks in between"""
+        handle, copy_path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(handle)
+        src = self._connect(tune=False)
+        copy = sqlite3.connect(copy_path, isolation_level=None)
+        try:
+            src.backup(copy, pages=1024, sleep=0.25)
+        except Exception as err:
+            copy.close()
+            os.remove(copy_path)
+            raise ConnectionError(f"Failed to copy db at {self.db_path}") from err
+        finally:
+            src.close()
+        self._tune(copy)
+        return copy, copy_path
+
+    def _can_partition(self) -> bool:
+        # a session connection is bound to its thread, and to one snapshot
+        return self._cnxn is None
+
     def _exec(self, qry: str, params=None) -> DBRes:
+        if self._cnxn is not None:
+            return self._run(self._cnxn, qry, params)
         try:
-            cnxn = sqlite3.connect(self.db_path)
+            cnxn = self._connect()
         except Exception as err:
             raise ConnectionError(f"Failed to open db at {self.db_path}") from err
+        try:
+            return self._run(cnxn, qry, params)
+        finally:
+            cnxn.close()
+
+    @staticmethod
+    def _run(cnxn: sqlite3.Connection, qry: str, params=None) -> DBRes:
         try:
             cursr = cnxn.cursor()
             if params is None:
                 params = tuple()
             rows = cursr.execute(qry, params).fetchall()
-            if not rows:
-                res = DBRes([], [])
-            else:
-                res = DBRes([n[0] for n in cursr.description], rows)
+            return DBRes.from_cursor(cursr, rows)
         except Exception as err:
             raise RuntimeError(
                 "Failed to execute {qry = !r} with {params = !r}"
             ) from err
-        finally:
-            cnxn.close()
-        return res
@@ -1,9 +1,24 @@
 from __future__ import annotations
 
 import abc
+import concurrent.futures
+import collections
+import contextlib
+import itertools
 import logging
-from dataclasses import dataclass
-from typing import Any, Iterator, Sequence, overload
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Iterable,
+    Iterator,
+    Sequence,
+    overload,
+)
+
+from ..config_reader.types import ConfigDegenerated
+from .decoding import DecoderPlan
 
 
 class SyncInfo(abc.ABC):
@@ -25,6 +40,16 @@ class CollectionInfo:
     fields: list[str]
     ident: str
     hardcoded_select: None | str = None
+    # read new and known rows in this many queries in parallel, split by
+    # `ABS(partition_column) % partitions` (numeric column, default: the ident)
+    partitions: int = 1
+    partition_column: None | str = None
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.partitions, int) or self.partitions < 1:
+            raise ConfigDegenerated(
+                f"partitions not a positive number {self.partitions=}"
+            )
 
     @classmethod
     def empty(cls) -> CollectionInfo:
@@ -35,6 +60,47 @@ class CollectionInfo:
 class DBRes(Sequence):
     description: Sequence[str]
     rows: Sequence[tuple]
+    # from cursor.description, if the driver provides them
+    type_codes: Sequence[Any] = ()
+    nullable: Sequence[None | bool] = ()
+    _plans: dict[str, DecoderPlan] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    @classmethod
+    def concat(cls, parts: Sequence[DBRes]) -> DBRes:
+        """rows of all `parts`, which must come from the same select"""
+        filled = [part for part in parts if part.rows]
+        if not filled:
+            return cls([], [])
+        first = filled[0]
+        return cls(
+            description=first.description,
+            rows=[row for part in filled for row in part.rows],
+            type_codes=first.type_codes,
+            nullable=first.nullable,
+        )
+
+    @classmethod
+    def from_cursor(cls, cursor: Any, rows: Sequence[tuple]) -> DBRes:
+        if not rows:
+            return cls([], [])
+        return cls(
+            description=[col[0] for col in cursor.description],
+            rows=rows,
+            type_codes=[col[1] for col in cursor.description],
+            nullable=[col[6] for col in cursor.description],
+        )
+
+    def iter_decoded(self, encoding: str) -> Iterator[dict]:
+        """rows as dicts with NULL as "" and bytes decoded, see DecoderPlan"""
+        plan = self._plans.get(encoding, None)
+        if plan is None:
+            plan = DecoderPlan(
+                self.description, self.rows, encoding, self.type_codes, self.nullable
+            )
+            self._plans[encoding] = plan
+        return plan.decode_rows(self.rows)
 
     def _dictify_row(self, row: tuple) -> dict:
         return {key: val for key, val in zip(self.description, row)}
@@ -61,14 +127,54 @@ class DBRes(Sequence):
 
 class SrcCli(abc.ABC):
     collection_info: CollectionInfo
+    # columns the sync reads, see `project`
+    projection: None | list[str] = None
 
     def _qry(self, restrict: str) -> str:
-        select = (
-            self.collection_info.hardcoded_select
-            or f"SELECT {','.join(self.collection_info.fields)} FROM {self.collection_info.collection_name}"
-        )
+        hardcoded = self.collection_info.hardcoded_select
+        if hardcoded and self.projection:
+            select = f"SELECT {','.join(self.projection)} FROM ({hardcoded.strip().strip(';')}) AS src"
+        elif hardcoded:
+            select = hardcoded
+        else:
+            columns = self.projection or self.collection_info.fields
+            select = f"SELECT {','.join(columns)} FROM {self.collection_info.collection_name}"
         return f"{select} {restrict.strip(';')};"
 
+    def project(self, columns: Iterable[str]) -> None:
+        """
+        read only `columns` (and the ident) of the configured fields.
+        Columns that are not configured are left out, rendering them fails like before.
+        """
+        wanted = {*columns, self.collection_info.ident}
+        projection = [col for col in self.collection_info.fields if col in wanted]
+        if self.collection_info.ident not in projection:
+            # e.g. a hardcoded select without configured fields
+            self.projection = None
+            return
+        skipped = len(self.collection_info.fields) - len(projection)
+        if skipped > 0:
+            logging.debug(
+                "%i von %i Spalten werden nicht benötigt.",
+                skipped,
+                len(self.collection_info.fields),
+            )
+        self.projection = projection
+
+    @contextlib.contextmanager
+    def unprojected(self) -> Iterator[None]:
+        """read all configured fields inside, ignoring `project`"""
+        projection, self.projection = self.projection, None
+        try:
+            yield
+        finally:
+            self.projection = projection
+
+    @contextlib.contextmanager
+    def session(self) -> Iterator[None]:
+        """queries inside may share a connection and snapshot, if the source supports it"""
+        yield
+
     @classmethod
     def get_healthy_connection(cls, sync_info: SyncInfo):
         inst = cls(sync_info)
@@ -97,23 +203,79 @@ class SrcCli(abc.ABC):
         restrict = ""
         if len(known_idents) > 0:
             restrict = f"WHERE {self.collection_info.ident} NOT IN ({','.join(['?' for _ in known_idents])})"
-        qry = self._qry(restrict)
-        return self._exec(qry, known_idents)
+        return self._fetch(restrict, known_idents)
+
+    def _fetch(self, restrict: str, params: Sequence) -> DBRes:
+        """`_qry(restrict)`, split into the configured partitions, each on its own connection"""
+        partitions = self.collection_info.partitions
+        if partitions <= 1 or not self._can_partition():
+            return self._exec(self._qry(restrict), params)
+        column = self.collection_info.partition_column or self.collection_info.ident
+        glue = " AND " if restrict.strip() else "WHERE "
+        queries = [
+            self._qry(
+                f"{restrict.strip(';')}{glue}ABS({column}) % {partitions} = {part}"
+            )
+            for part in range(partitions)
+        ]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=partitions) as pool:
+            parts = list(pool.map(lambda qry: self._exec(qry, params), queries))
+        return DBRes.concat(parts)
+
+    def _can_partition(self) -> bool:
+        return True
+
+    def _limit(self, qry: str, limit: int) -> str:
+        """restrict `qry` (without trailing ';') to at most `limit` rows"""
+        return f"{qry} LIMIT {limit}"
+
+    def get_dup_idents(self, limit: int = 10) -> DBRes:
+        """
+        Get up to `limit` ident values that occur more than once, with their `dup_count`.
+        Counting is done by the source, only the offending keys are transferred.
+        """
+        ident = self.collection_info.ident
+        src = self._qry("").strip().strip(";")
+        qry = (
+            f"SELECT {ident}, COUNT(*) AS dup_count FROM ({src}) AS src "
+            f"GROUP BY {ident} HAVING COUNT(*) > 1"
+        )
+        return self._exec(f"{self._limit(qry, limit)};")
+
+    def get_idents(self) -> list[str]:
+        """all ident values of the source, as strings"""
+        ident = self.collection_info.ident
+        src = self._qry("").strip().strip(";")
+        res = self._exec(f"SELECT {ident} FROM ({src}) AS src;")
+        return [str(row[0]) for row in res.rows]
 
     def get_old(self, known_idents: Sequence[str]) -> DBRes:
         if len(known_idents) == 0:
             return DBRes([], [])
         restrict = f"WHERE {self.collection_info.ident} IN ({','.join(['?' for _ in known_idents])})"
-        qry = self._qry(restrict)
-        return self._exec(qry, known_idents)
+        return self._fetch(restrict, known_idents)
+
+    def compares_all(self, known_idents: Sequence[str]) -> bool:
+        """whether `get_old` looks up all of `known_idents`"""
+        return True
+
+    def get_changed(self, known_idents: Sequence[str]) -> None | DBRes:
+        """
+        the known entries that changed since the last `ack_changes`,
+        None if the source does not track changes and all of `get_old` must be compared
+        """
+        return None
+
+    def ack_changes(self, keep: Collection[str]) -> None:
+        """forget the changes returned by `get_changed`, except those of the idents in `keep`"""
 
     @abc.abstractmethod
     def __init__(self, sync_info: SyncInfo):
         ...
 
-    @abc.abstractmethod
     def _exec(self, qry: str, params=None) -> DBRes:
-        ...
+        """run `qry`, needed by the query helpers above unless they are overridden"""
+        raise NotImplementedError(f"{type(self).__name__} unterstützt keine Abfragen.")
 
     @classmethod
     @abc.abstractmethod
@@ -135,3 +297,63 @@ class SrcCli(abc.ABC):
         - list of a list of up to 10 sample values
         """
         ...
+
+
+class RecordSrcCli(SrcCli):
+    """
+    Base for sources without a query language, e.g. files or snapshots.
+    `_iter_records` yields the rows as dicts, the query helpers filter them in memory.
+    """
+
+    @abc.abstractmethod
+    def _iter_records(self) -> Iterator[dict[str, Any]]:
+        ...
+
+    def _columns(self) -> list[str]:
+        return self.projection or self.collection_info.fields
+
+    def _column_types(
+        self, columns: Sequence[str]
+    ) -> tuple[Sequence[Any], Sequence[None | bool]]:
+        """type codes and nullable of `columns`, if the source knows them"""
+        return (), ()
+
+    def _ident(self, record: dict[str, Any]) -> str:
+        return str(record.get(self.collection_info.ident, ""))
+
+    def _select(self, keep: Callable[[str], bool], limit: None | int = None) -> DBRes:
+        """records whose ident `keep` accepts, projected like a select would"""
+        columns = self._columns()
+        records: Iterator[dict[str, Any]] = (
+            record for record in self._iter_records() if keep(self._ident(record))
+        )
+        if limit is not None:
+            records = itertools.islice(records, limit)
+        rows = [tuple(record.get(col, None) for col in columns) for record in records]
+        if not rows:
+            return DBRes([], [])
+        type_codes, nullable = self._column_types(columns)
+        return DBRes(columns, rows, type_codes, nullable)
+
+    def get_sample(self) -> DBRes:
+        return self._select(lambda _: True, limit=1)
+
+    def get_new(self, known_idents: Sequence[str]) -> DBRes:
+        known = set(map(str, known_idents))
+        return self._select(lambda ident: ident not in known)
+
+    def get_old(self, known_idents: Sequence[str]) -> DBRes:
+        if len(known_idents) == 0:
+            return DBRes([], [])
+        known = set(map(str, known_idents))
+        return self._select(lambda ident: ident in known)
+
+    def get_idents(self) -> list[str]:
+        return [self._ident(record) for record in self._iter_records()]
+
+    def get_dup_idents(self, limit: int = 10) -> DBRes:
+        counts = collections.Counter(self.get_idents())
+        dups = [(key, count) for key, count in counts.items() if count > 1]
+        if not dups:
+            return DBRes([], [])
+        return DBRes([self.collection_info.ident, "dup_count"], dups[:limit])
@@ -0,0 +1,72 @@
+#!/bin/env python3
+import argparse
+import logging
+
+import wattro_sync.config_reader.access
+import wattro_sync.file_access.read_write
+from wattro_sync.api.sqlite_api import SQLiteApi, SQLiteSyncInfo
+from wattro_sync.helpers import TARGET_NODE_MAPPING
+from wattro_sync.sync import select_targets
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    if not wattro_sync.file_access.read_write.exists("cfg"):
+        logging.error(
+            "Keine Konfiguration gefunden. Bitte zuerst eine via `setup` erstellen."
+        )
+        return -1
+    cfg = wattro_sync.config_reader.access.get_or_create()
+    result = 0
+    for target, connection_struct in select_targets(args, cfg).items():
+        sync_info = connection_struct.sync_info
+        if not isinstance(sync_info, SQLiteSyncInfo):
+            logging.error("%s: Nur für SQLite Quellen möglich.", target)
+            result = -1
+            continue
+        api = SQLiteApi(sync_info)
+        try:
+            if args.command == "install":
+                api.install_change_log()
+            else:
+                api.remove_change_log()
+        except Exception as err:
+            logging.error("%s: %s", target, err)
+            result = -1
+            continue
+        sync_info.change_log = args.command == "install"
+        wattro_sync.config_reader.access.write_basic_connection(
+            target, connection_struct.connection_type, sync_info
+        )
+        logging.info(
+            "%s: Änderungsprotokoll %s.",
+            target,
+            "eingerichtet" if sync_info.change_log else "entfernt",
+        )
+    return result
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Richtet Trigger ein, die geänderte Idents einer SQLite Quelle protokollieren. "
+        "Die Synchronisation vergleicht dann nur noch diese statt aller bekannten Datensätze."
+    )
+    parser.add_argument(
+        "command",
+        choices=("install", "remove"),
+        help="install: einrichten (erneut: alle Datensätze einmal vergleichen), "
+        "remove: Trigger und Protokoll entfernen.",
+    )
+    parser.add_argument(
+        "--limit_target",
+        help="Schränkt die Ziele ein.",
+        choices=TARGET_NODE_MAPPING.keys(),
+        nargs="*",
+    )
+    parser.set_defaults(limit_src=None)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    exit(main())
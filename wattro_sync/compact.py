@@ -0,0 +1,71 @@
+#!/bin/env python3
+import argparse
+import dataclasses
+import logging
+
+import wattro_sync.config_reader.access
+import wattro_sync.file_access.read_write
+from wattro_sync.api.rest_api import WattroNodeApi
+from wattro_sync.helpers import TARGET_NODE_MAPPING
+from wattro_sync.sync import SyncState, compact, select_targets
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    if not wattro_sync.file_access.read_write.exists("cfg"):
+        logging.error(
+            "Keine Konfiguration gefunden. Bitte zuerst eine via `setup` erstellen."
+        )
+        return -1
+    cfg = wattro_sync.config_reader.access.get_or_create()
+    try:
+        wattro_api = WattroNodeApi.get_healthy_api(**dataclasses.asdict(cfg.wattro_cfg))
+    except Exception as err:
+        logging.critical("Verbindung zu Wattro API fehlgeschlagen: %s", err)
+        return -1
+
+    state = SyncState()
+    tot_removed, tot_reclaimed = 0, 0
+    for target, connection_struct in select_targets(args, cfg).items():
+        removed, reclaimed = compact(target, connection_struct, wattro_api, state)
+        tot_removed += removed
+        tot_reclaimed += reclaimed
+    if args.dry:
+        logging.info("Dry Run. Historie wurde nicht gespeichert.")
+    elif tot_removed > 0:
+        state.get_history().save()
+        timings = state.get_timings()
+        timings.reset_runs("compaction")
+        timings.save()
+    verb = "würden" if args.dry else "wurden"
+    print(
+        f"{tot_removed} Einträge {verb} entfernt, {tot_reclaimed / 1024:.1f} kB freigegeben."
+    )
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Entfernt Einträge aus der Historie, "
+        "deren Ident weder in Wattro noch in der Quelle existiert."
+    )
+    parser.add_argument(
+        "--dry",
+        action="store_true",
+        help="Zeigt nur, was entfernt würde.",
+        default=False,
+    )
+    parser.add_argument(
+        "--limit_target",
+        help="Schränkt die Ziele ein.",
+        choices=TARGET_NODE_MAPPING.keys(),
+        nargs="*",
+    )
+    # select_targets also filters by source
+    parser.set_defaults(limit_src=None)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -38,12 +38,20 @@ def extract_src_cfg(cfg: dict, target: str) -> ConnectionStructure | None:
     con_info = api_structure.connection_info.from_dict(con_info_data)
     field_mapping = cfg_data.get("field_mapping", {})
     encoding = cfg_data.get("encoding", "utf-8")
+    interval = cfg_data.get("interval", None)
+    if interval is not None and (not isinstance(interval, int) or interval <= 0):
+        raise ConfigDegenerated(f"interval not a positive number {interval=} {target=}")
+    partial_updates = cfg_data.get("partial_updates", False)
+    if not isinstance(partial_updates, bool):
+        raise ConfigDegenerated(f"partial_updates not a bool {target=}")
 
     return ConnectionStructure(
         connection_type=con_type,
         sync_info=con_info,
         field_mapping=field_mapping,
         encoding=encoding,
+        interval=interval,
+        partial_updates=partial_updates,
     )
 
 
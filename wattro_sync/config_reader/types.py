@@ -2,25 +2,45 @@ from __future__ import annotations
 
 import logging
 from dataclasses import dataclass
-from typing import Literal, NewType
+from typing import TYPE_CHECKING, Literal, NewType
 
-from wattro_sync.api.sqlite_api import SQLiteSyncInfo
+if TYPE_CHECKING:
+    from wattro_sync.api.src_cli import SyncInfo
+
+COMPRESSIONS = (None, "gzip", "deflate", "auto")
+JSON_ENCODERS = ("auto", "json", "orjson")
 
 FieldMapping = NewType("FieldMapping", dict[str, dict[str, None | int | str]])
 
 
 @dataclass
 class ConnectionStructure:
-    connection_type: Literal["SQLite"]
-    sync_info: SQLiteSyncInfo
+    # a key of ApiNameToStructureMapping
+    connection_type: str
+    sync_info: SyncInfo
     field_mapping: FieldMapping
     encoding: str = "utf-8"
+    interval: None | int = None
+    # send only changed fields, needs a node with partial_update_by_ident
+    partial_updates: bool = False
 
 
 @dataclass
 class WattroCfg:
     domain: str
     api_key: str
+    compression: None | Literal["gzip", "deflate", "auto"] = None
+    json_encoder: str = "auto"
+
+    def __post_init__(self) -> None:
+        if self.compression not in COMPRESSIONS:
+            raise ConfigDegenerated(
+                f"compression not one of {COMPRESSIONS} {self.compression=}"
+            )
+        if self.json_encoder not in JSON_ENCODERS:
+            raise ConfigDegenerated(
+                f"json_encoder not one of {JSON_ENCODERS} {self.json_encoder=}"
+            )
 
 
 @dataclass
@@ -29,6 +49,8 @@ class MailCfg:
     to_emails: str
     log_level: int = logging.WARNING
     form_email: str = "admin@wattro.de"
+    # seconds to collect mails before they are sent as one digest
+    digest_window: int = 0
 
 
 @dataclass
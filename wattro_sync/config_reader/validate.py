@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from .types import FieldMapping
+
+
+def field_mapping_issues(field_mapping: FieldMapping, fields: dict) -> list[str]:
+    """
+    Compare a field mapping with the fields wattro announces for the target.
+    Returns a readable description for each mismatch.
+    """
+    issues = []
+    for field_name, field_map in field_mapping.items():
+        if field_map.get("src", None) is None:
+            continue
+        meta = fields.get(field_name, None)
+        if meta is None:
+            issues.append(f"Feld {field_name!r} existiert nicht in Wattro.")
+            continue
+        if meta.get("read_only", False):
+            issues.append(f"Feld {field_name!r} ist schreibgeschützt.")
+        if field_map.get("type", None) != meta.get("type", None):
+            issues.append(
+                f"Feld {field_name!r} hat Typ {meta.get('type')!r}, "
+                f"konfiguriert ist {field_map.get('type')!r}."
+            )
+        max_length = meta.get("max_length", None)
+        configured = field_map.get("max_length", None)
+        if (
+            max_length is not None
+            and configured is not None
+            and (not isinstance(configured, int) or configured > max_length)
+        ):
+            issues.append(
+                f"Feld {field_name!r} erlaubt höchstens {max_length} Zeichen, "
+                f"konfiguriert ist {configured!r}."
+            )
+    for field_name, meta in fields.items():
+        if meta.get("read_only", True) or not meta.get("required", False):
+            continue
+        if field_mapping.get(field_name, {}).get("src", None) is None:
+            issues.append(f"Pflichtfeld {field_name!r} ist nicht zugeordnet.")
+    return issues
+
+
+def field_mapping_warnings(field_mapping: FieldMapping, fields: dict) -> list[str]:
+    """mismatches that do not block the sync, e.g. a missing `max_length`"""
+    warnings = []
+    for field_name, field_map in field_mapping.items():
+        meta = fields.get(field_name, None)
+        if field_map.get("src", None) is None or meta is None:
+            continue
+        max_length = meta.get("max_length", None)
+        if max_length is not None and field_map.get("max_length", None) is None:
+            warnings.append(
+                f"Feld {field_name!r} erlaubt höchstens {max_length} Zeichen, "
+                "ohne 'max_length' werden längere Werte nicht gekürzt."
+            )
+    return warnings
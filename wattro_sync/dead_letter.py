@@ -0,0 +1,60 @@
+#!/bin/env python3
+import argparse
+import datetime
+import logging
+
+from wattro_sync.file_access.dead_letter import DeadLetters
+from wattro_sync.helpers import TARGET_NODE_MAPPING
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    dead_letters = DeadLetters()
+    targets = args.limit_target or sorted(dead_letters.letters)
+    if args.command == "requeue":
+        count = sum(
+            dead_letters.requeue(target, args.idents or None) for target in targets
+        )
+        dead_letters.save()
+        print(f"{count} Einträge werden im nächsten Lauf erneut gesendet.")
+        return 0
+
+    count = 0
+    for target in targets:
+        for key, entry in sorted(dead_letters.letters.get(target, {}).items()):
+            if args.idents and key not in args.idents:
+                continue
+            count += 1
+            next_try = datetime.datetime.fromtimestamp(entry["next_try"])
+            print(
+                f"{target} | {key} | Versuche: {entry['attempts']} | "
+                f"nächster Versuch: {next_try:%Y-%m-%d %H:%M} | {entry['error']}"
+            )
+    print(f"{count} Einträge in Quarantäne.")
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Zeigt Datensätze in Quarantäne oder gibt sie für den nächsten Lauf frei."
+    )
+    parser.add_argument(
+        "command",
+        choices=("list", "requeue"),
+        help="list: anzeigen, requeue: im nächsten Lauf erneut senden.",
+    )
+    parser.add_argument(
+        "idents", nargs="*", help="Schränkt auf diese Idents ein (Standard: alle)."
+    )
+    parser.add_argument(
+        "--limit_target",
+        help="Schränkt die Ziele ein.",
+        choices=TARGET_NODE_MAPPING.keys(),
+        nargs="*",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    exit(main())
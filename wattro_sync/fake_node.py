@@ -0,0 +1,157 @@
+#!/bin/env python3
+"""
+Minimal local stand in for a wattro node, for tests and offline benchmarks
+(see `python -m wattro_sync.snapshot replay`).
+`python -m wattro_sync.fake_node` serves it where the domain "local" points to.
+"""
+import argparse
+import gzip
+import json
+import logging
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from wattro_sync.api.rest_api import WattroNodeApi
+from wattro_sync.helpers import TARGET_IDENT_FIELD
+
+
+class FakeNode:
+    """
+    `responses` is a list of (status, headers) answered in order to POST requests,
+    once it is empty every POST succeeds. Received bodies are kept in `posted`
+    (unless `keep_posted` is False), their path in `paths`, their Content-Encoding in `encodings`.
+    `chunked` counts chunked uploads. Accepted records are stored per target in `store`,
+    `get_idents` answers with them. OPTIONS answers with `fields` as the POST action.
+    """
+
+    def __init__(
+        self, accept_compression: bool = True, port: int = 0, keep_posted: bool = True
+    ) -> None:
+        self.accept_compression = accept_compression
+        self.keep_posted = keep_posted
+        self.responses: list[tuple[int, dict]] = []
+        self.posted: list[dict] = []
+        self.paths: list[str] = []
+        self.encodings: list[None | str] = []
+        self.store: dict[str, dict[str, dict]] = {}
+        self.chunked = 0
+        self.fields: dict = {}
+        self.options_requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _store(self, path: str, body: dict) -> None:
+        """keep the records of a sync request by their ident"""
+        parts = path.strip("/").split("/")
+        if len(parts) < 2 or parts[0] != "sync":
+            return
+        data = body.get("new_data", [])
+        records = self.store.setdefault(parts[1], {})
+        for record in data if isinstance(data, list) else [data]:
+            ident = str(record.get(TARGET_IDENT_FIELD, ""))
+            records.setdefault(ident, {}).update(record)
+
+    def __enter__(self) -> "FakeNode":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def api(self) -> WattroNodeApi:
+        api = WattroNodeApi("local", "stand-in-key")
+        api.hostname = f"127.0.0.1:{self.server.server_port}"
+        # optional attribute, see RESTApi._get_base_waittime
+        setattr(api, "base_waittime", 0.01)
+        return api
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *_) -> None:
+                pass
+
+            def _answer(self, status: int, headers: dict, body: dict) -> None:
+                raw = json.dumps(body).encode()
+                self.send_response(status)
+                for key, val in headers.items():
+                    self.send_header(key, val)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def _read_body(self) -> bytes:
+                if self.headers.get("Transfer-Encoding", None) != "chunked":
+                    return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                raw = b""
+                while size := int(self.rfile.readline().strip(), 16):
+                    raw += self.rfile.read(size)
+                    self.rfile.readline()
+                self.rfile.readline()
+                node.chunked += 1
+                return raw
+
+            def do_GET(self) -> None:
+                parts = self.path.strip("/").split("/")
+                if parts[0] == "sync" and parts[-1] == "get_idents":
+                    with node.lock:
+                        idents = list(node.store.get(parts[1], {}))
+                    return self._answer(200, {}, {"idents": idents})
+                self._answer(200, {}, {"auth_status": {"has_permission": True}})
+
+            def do_OPTIONS(self) -> None:
+                node.options_requests += 1
+                self._answer(200, {}, {"actions": {"POST": node.fields}})
+
+            def do_POST(self) -> None:
+                raw = self._read_body()
+                encoding = self.headers.get("Content-Encoding", None)
+                if encoding and not node.accept_compression:
+                    return self._answer(415, {}, {})
+                if encoding == "gzip":
+                    raw = gzip.decompress(raw)
+                elif encoding == "deflate":
+                    raw = zlib.decompress(raw)
+                body = json.loads(raw)
+                with node.lock:
+                    status, headers = (
+                        node.responses.pop(0) if node.responses else (200, {})
+                    )
+                    if status < 300:
+                        node._store(self.path, body)
+                        if node.keep_posted:
+                            node.posted.append(body)
+                            node.paths.append(self.path)
+                            node.encodings.append(encoding)
+                self._answer(status, headers, {})
+
+        return Handler
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Startet eine lokale Test-Node (Domain `local`), bis sie mit Strg+C beendet wird."
+    )
+    parser.add_argument("--port", type=int, default=8000, help="Standard: 8000")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    node = FakeNode(port=args.port, keep_posted=False)
+    logging.info("Test-Node auf http://127.0.0.1:%i", args.port)
+    try:
+        node.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.server.server_close()
+    for target, records in node.store.items():
+        logging.info("%s: %i Datensätze empfangen.", target, len(records))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+import typing
+
+from . import read_write
+
+
+def cache_key(*parts: typing.Any) -> str:
+    """stable key that does not store connection strings in plain text"""
+    seed = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha256(seed).hexdigest()
+
+
+class FileCache:
+    """
+    Key value store in the wattro folder.
+    Entries expire after `ttl` seconds or when they were stored for another `version`.
+    """
+
+    def __init__(self, file_type: read_write.ShortType, ttl: float):
+        self.file_type = file_type
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.entries: dict[str, dict] = read_write.read(file_type)
+
+    def get(self, key: str, version: None | str = None) -> typing.Any:
+        """cached value or None"""
+        with self._lock:
+            entry = self.entries.get(key, None)
+        if entry is None:
+            return None
+        if time.time() - entry["stored_at"] > self.ttl:
+            return None
+        if entry.get("version", None) != version:
+            return None
+        return entry["value"]
+
+    def put(self, key: str, value: typing.Any, version: None | str = None) -> None:
+        with self._lock:
+            self.entries[key] = {
+                "stored_at": time.time(),
+                "version": version,
+                "value": value,
+            }
+            read_write.write(self.file_type, self.entries)
+
+    def invalidate(self, *keys: str) -> None:
+        """drop the given keys, or everything if none are given"""
+        with self._lock:
+            if not keys:
+                self.entries.clear()
+            for key in keys:
+                self.entries.pop(key, None)
+            read_write.write(self.file_type, self.entries)
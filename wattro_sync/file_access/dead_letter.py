@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Iterable
+
+from . import read_write
+
+
+class DeadLetters:
+    """
+    Records that failed to transform or were rejected by wattro, per target and ident.
+
+    Each entry holds the error, the number of attempts and the hash of the source row.
+    A quarantined row is skipped until either its hash changes
+    or its exponential retry time (`BASE_BACKOFF` * 2 ** (attempts - 1), at most `MAX_BACKOFF`) is reached.
+    """
+
+    BASE_BACKOFF = 60 * 60
+    MAX_BACKOFF = 7 * 24 * 60 * 60
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self.letters: dict[str, dict[str, dict]] = read_write.read("dead_letter")
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def record(self, target: str, key: str, row_hash: str, error: str) -> dict:
+        now = self.clock()
+        with self._lock:
+            entry = self.letters.setdefault(target, {}).get(key, None)
+            if entry is None:
+                entry = {"attempts": 0, "first_failed": now}
+                self.letters[target][key] = entry
+            self.dirty = True
+            entry["attempts"] += 1
+            entry.update(
+                error=error,
+                hash=row_hash,
+                last_failed=now,
+                next_try=now
+                + min(
+                    self.BASE_BACKOFF * 2 ** (entry["attempts"] - 1), self.MAX_BACKOFF
+                ),
+            )
+        return entry
+
+    def should_skip(self, target: str, key: str, row_hash: str) -> bool:
+        entry = self.letters.get(target, {}).get(key, None)
+        if entry is None:
+            return False
+        return entry["hash"] == row_hash and self.clock() < entry["next_try"]
+
+    def keys(self, target: str) -> set[str]:
+        return set(self.letters.get(target, {}))
+
+    def resolve(self, target: str, key: str) -> None:
+        with self._lock:
+            if self.letters.get(target, {}).pop(key, None) is not None:
+                self.dirty = True
+
+    def requeue(self, target: str, keys: None | Iterable[str] = None) -> int:
+        """retry on the next run, all entries of `target` if `keys` is None"""
+        entries = self.letters.get(target, {})
+        selected = list(entries) if keys is None else [k for k in keys if k in entries]
+        for key in selected:
+            entries[key]["next_try"] = 0.0
+        self.dirty = self.dirty or bool(selected)
+        return len(selected)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.letters.values())
+
+    def save(self) -> None:
+        """write the store, if anything changed"""
+        if not self.dirty:
+            return
+        with self._lock:
+            letters = {
+                target: entries for target, entries in self.letters.items() if entries
+            }
+            read_write.write("dead_letter", letters)
+            self.dirty = False
@@ -1,15 +1,135 @@
+import atexit
+import contextlib
+import contextvars
+import copy
+import gzip
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
 import sys
+from typing import Iterator
 
 from wattro_sync.file_access.read_write import get_base_folder_path
 
 formatter = logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
+# needs the ContextFilter of start_queue_logging
+tenant_formatter = logging.Formatter(
+    "%(asctime)s | %(levelname)s | %(tenant)s | %(message)s"
+)
 
+CONTEXT_FIELDS = ("tenant", "target", "phase", "ident")
+_log_context: contextvars.ContextVar[dict[str, str]] = contextvars.ContextVar(
+    "log_context", default={}
+)
 
-def get_file_handler() -> logging.FileHandler:
+
+@contextlib.contextmanager
+def log_fields(**fields: object) -> Iterator[None]:
+    """attach e.g. target, phase and ident to all records logged inside"""
+    merged = {**_log_context.get(), **{key: str(val) for key, val in fields.items()}}
+    token = _log_context.set(merged)
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def get_log_fields() -> dict[str, str]:
+    """the fields `log_fields` attaches here, e.g. to pass them to another process"""
+    return dict(_log_context.get())
+
+
+class ContextFilter(logging.Filter):
+    """
+    copies the log context onto the record. Runs in the thread that logs,
+    before the record is queued, as the context is not visible anywhere else.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get()
+        for key in CONTEXT_FIELDS:
+            if not hasattr(record, key):
+                setattr(record, key, context.get(key, ""))
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS:
+            if getattr(record, key, ""):
+                entry[key] = getattr(record, key)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues records with their log context. Unlike QueueHandler, the traceback is not
+    folded into the message but kept as `exc_text`, so each formatter can place it.
+    """
+
+    def __init__(self, log_queue) -> None:
+        super().__init__(log_queue)
+        self.addFilter(ContextFilter())
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        # tracebacks can not be pickled for other processes
+        record.exc_info = None
+        return record
+
+
+def _gzip_namer(name: str) -> str:
+    return f"{name}.gz"
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def get_file_handler(
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    when: None | str = None,
+    json_lines: bool = False,
+    text_formatter: logging.Formatter = formatter,
+) -> logging.Handler:
+    """
+    Rotating log file, rotated files are gzipped.
+    Rotates by size, or by time if `when` is given (see TimedRotatingFileHandler).
+    """
     wattro_folder = get_base_folder_path()
-    logging_fh = logging.FileHandler(wattro_folder / "logs.log", mode="a")
-    logging_fh.setFormatter(formatter)
+    log_file = str(wattro_folder / ("logs.jsonl" if json_lines else "logs.log"))
+    logging_fh: logging.handlers.BaseRotatingHandler
+    if when:
+        logging_fh = logging.handlers.TimedRotatingFileHandler(
+            log_file, when=when, backupCount=backup_count, delay=True
+        )
+    else:
+        logging_fh = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, delay=True
+        )
+    logging_fh.namer = _gzip_namer
+    logging_fh.rotator = _gzip_rotator
+    logging_fh.setFormatter(JsonLinesFormatter() if json_lines else text_formatter)
     logging_fh.setLevel(logging.DEBUG)
     return logging_fh
 
@@ -19,3 +139,26 @@ def get_stdout_handler() -> logging.StreamHandler:
     stdout_handler.setLevel(logging.DEBUG)
     stdout_handler.setFormatter(formatter)
     return stdout_handler
+
+
+def start_queue_logging(
+    logger: logging.Logger, *handlers: logging.Handler
+) -> logging.handlers.QueueListener:
+    """
+    Attach `handlers` to `logger` behind a queue, so writing happens in a background thread.
+    The listener is stopped (and the queue flushed) at exit.
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(LogQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    return listener
+
+
+def _stop_listener(listener: logging.handlers.QueueListener) -> None:
+    # stop() must not run twice
+    if listener._thread is not None:
+        listener.stop()
@@ -1,20 +1,44 @@
 from __future__ import annotations
 
+import contextlib
+import contextvars
 import json
 import logging
 import os
 import pathlib
+import types
 import typing
 
 from wattro_sync.config_reader.types import ConfigDegenerated
 
+fcntl: None | types.ModuleType
+try:
+    import fcntl
+except ImportError:
+    # e.g. Windows, files are not locked there
+    fcntl = None
+
 BASE_FOLDER = ".wattro_sync"
-FILE_NAMES = ["cfg.json", "history.json"]
+FILE_NAMES = [
+    "cfg.json",
+    "history.json",
+    "stats.json",
+    "schema_cache.json",
+    "field_cache.json",
+    "outbox.json",
+    "dead_letter.json",
+]
 CON_TYPE_KEY = "connection_type"
 CON_INFO_KEY = "connection_info"
 FIELD_MAP_KEY = "field_mapping"
 
-ShortType = typing.Literal["cfg", "history"]
+_base_folder: contextvars.ContextVar[None | pathlib.Path] = contextvars.ContextVar(
+    "base_folder", default=None
+)
+
+ShortType = typing.Literal[
+    "cfg", "history", "stats", "schema_cache", "field_cache", "outbox", "dead_letter"
+]
 
 
 def exists(file_type: ShortType) -> bool:
@@ -50,6 +74,31 @@ def write(file_type: ShortType, val: typing.Any) -> None:
     return write_path(file_p, val)
 
 
+@contextlib.contextmanager
+def locked(file_type: ShortType) -> typing.Iterator[None]:
+    """
+    exclusive lock on `file_type` across processes, for reading and rewriting it
+    without losing what another process wrote in between
+    """
+    file_p, _ = get_or_create(file_type)
+    with open(file_p.with_suffix(".lock"), "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def side_path(file_type: ShortType, name: str) -> pathlib.Path:
+    """
+    side_path('history', 'asset.idx')
+    a further file stored next to `file_type`, e.g. in a format other than json
+    """
+    return _get_file_path(file_type).with_suffix(f".{name}")
+
+
 def read_path(file_path: pathlib.Path) -> dict:
     try:
         raw_read = json.loads(file_path.read_text())
@@ -102,9 +151,25 @@ def cfg_rm() -> None:
 
 def get_base_folder_path() -> pathlib.Path:
     """Path where all configs and logs are stored"""
+    base_folder = _base_folder.get()
+    if base_folder is not None:
+        return base_folder
     return pathlib.Path.home() / BASE_FOLDER
 
 
+@contextlib.contextmanager
+def use_base_folder(folder: pathlib.Path) -> typing.Iterator[None]:
+    """
+    Read and write the files of `folder` instead of ~/.wattro_sync in this context.
+    Threads started inside have to run in a copy of the context to see it.
+    """
+    token = _base_folder.set(folder)
+    try:
+        yield
+    finally:
+        _base_folder.reset(token)
+
+
 def _get_or_create_base_folder() -> pathlib.Path:
     """gets or creates wattro config folder"""
     wattro_folder = get_base_folder_path()
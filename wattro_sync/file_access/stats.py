@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from typing import Literal
+
+from . import read_write
+
+RequestKind = Literal["bulk", "update"]
+
+
+class RequestTimings:
+    """
+    Rolling window of recent write durations, stored per target and request kind.
+    Each sample is `[seconds, records]`.
+    """
+
+    WINDOW = 20
+
+    def __init__(self):
+        self.stats = read_write.read("stats")
+
+    def record(
+        self, target: str, kind: RequestKind, seconds: float, records: int
+    ) -> None:
+        samples = self.stats.setdefault(target, {}).setdefault(kind, [])
+        samples.append([round(seconds, 4), records])
+        del samples[: -self.WINDOW]
+
+    def seconds_per_record(self, target: str, kind: RequestKind) -> None | float:
+        samples = self.stats.get(target, {}).get(kind, [])
+        records = sum(count for _, count in samples)
+        if records == 0:
+            return None
+        return sum(seconds for seconds, _ in samples) / records
+
+    def count_run(self, key: str) -> int:
+        """count a run towards the periodic job `key`, returns runs since it last ran"""
+        runs = self.stats.setdefault("_runs_since", {})
+        runs[key] = runs.get(key, 0) + 1
+        return runs[key]
+
+    def reset_runs(self, key: str) -> None:
+        self.stats.setdefault("_runs_since", {})[key] = 0
+
+    def save(self) -> None:
+        read_write.write("stats", self.stats)
@@ -0,0 +1,218 @@
+#!/bin/env python3
+"""
+Sync many customer configurations in one process.
+
+Every sub folder of the fleet folder is used like ~/.wattro_sync of one tenant
+(cfg.json, history.json, ...). Tenants run in a thread pool, share the process pool
+for transforming and hashing and one HTTP connection pool per Wattro host.
+A failing tenant neither stops the others nor sends mails to them.
+"""
+import argparse
+import concurrent.futures
+import contextvars
+import dataclasses
+import datetime
+import logging
+import pathlib
+import threading
+import time
+
+import requests
+import requests.adapters
+
+import wattro_sync.config_reader.access
+from wattro_sync import parallel
+from wattro_sync.api.mail import MailApi
+from wattro_sync.api.rest_api import WattroNodeApi
+from wattro_sync.file_access import read_write
+from wattro_sync.file_access.logging import log_fields, tenant_formatter
+from wattro_sync.helpers import TARGET_NODE_MAPPING
+from wattro_sync.sync import (
+    SyncState,
+    add_log_args,
+    run_once,
+    select_targets,
+    setup_logger,
+)
+
+
+@dataclasses.dataclass
+class TenantResult:
+    tenant: str
+    success: int = 0
+    fail: int = 0
+    error: None | str = None
+    seconds: float = 0.0
+
+
+class SessionPool:
+    """one requests session, and with it one connection pool, per Wattro domain"""
+
+    def __init__(self, pool_size: int):
+        self.pool_size = pool_size
+        self.sessions: dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def get(self, domain: str) -> requests.Session:
+        with self._lock:
+            if domain not in self.sessions:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=1, pool_maxsize=self.pool_size
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self.sessions[domain] = session
+            return self.sessions[domain]
+
+    def close(self) -> None:
+        for session in self.sessions.values():
+            session.close()
+
+
+def find_tenants(fleet_folder: pathlib.Path) -> list[pathlib.Path]:
+    return sorted(
+        path for path in fleet_folder.iterdir() if (path / "cfg.json").is_file()
+    )
+
+
+def run_tenant(
+    tenant_folder: pathlib.Path,
+    args: argparse.Namespace,
+    sessions: SessionPool,
+    pool: None | concurrent.futures.Executor,
+) -> TenantResult:
+    result = TenantResult(tenant_folder.name)
+    start = time.perf_counter()
+    with read_write.use_base_folder(tenant_folder), log_fields(tenant=result.tenant):
+        mail_api: None | MailApi = None
+        try:
+            cfg = wattro_sync.config_reader.access.get_or_create()
+            mail_api = MailApi(cfg.mail_cfg)
+            mail_api.resume()
+            wattro_api = WattroNodeApi.get_healthy_api(
+                **dataclasses.asdict(cfg.wattro_cfg),
+                session=sessions.get(cfg.wattro_cfg.domain),
+            )
+            targets = select_targets(args, cfg)
+            result.success, result.fail = run_once(
+                args, targets, wattro_api, mail_api, SyncState(pool=pool)
+            )
+        except Exception as err:
+            logging.exception("Tenant %s fehlgeschlagen: %s", result.tenant, err)
+            result.error = str(err)
+            if mail_api is not None:
+                mail_api.send(
+                    logging.CRITICAL,
+                    f"Synchronisation abgebrochen: {err}. Es wurden evtl. nicht alle Daten gesendet.",
+                )
+        finally:
+            if mail_api is not None:
+                mail_api.close()
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def main() -> int:
+    args = parse_args()
+    fleet_folder = pathlib.Path(args.fleet_folder).expanduser().resolve()
+    with read_write.use_base_folder(fleet_folder):
+        setup_logger(args, text_formatter=tenant_formatter)
+    tenants = find_tenants(fleet_folder)
+    if not tenants:
+        logging.error(
+            "Keine Konfigurationen (*/cfg.json) in %s gefunden.", fleet_folder
+        )
+        return -1
+    logging.info("%i Tenants in %s gefunden.", len(tenants), fleet_folder)
+
+    start = time.perf_counter()
+    sessions = SessionPool(pool_size=4 * args.parallel)
+    pool = parallel.get_pool(args.workers)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.parallel) as runner:
+            futures = [
+                # a fresh context per tenant, threads of the runner are reused
+                runner.submit(
+                    contextvars.copy_context().run,
+                    run_tenant,
+                    tenant,
+                    args,
+                    sessions,
+                    pool,
+                )
+                for tenant in tenants
+            ]
+            results = [future.result() for future in futures]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        sessions.close()
+
+    for result in results:
+        logging.info(
+            "%s: %s | erfolgreich: %i | nicht erfolgreich: %i | %.1f s",
+            result.tenant,
+            "FEHLER " + result.error if result.error else "ok",
+            result.success,
+            result.fail,
+            result.seconds,
+        )
+    failed = [result.tenant for result in results if result.error or result.fail]
+    logging.info(
+        "Fleet beendet nach %.1f s (%s). Tenants mit Fehlern: %s",
+        time.perf_counter() - start,
+        datetime.datetime.now(),
+        failed or "keine",
+    )
+    return 1 if failed else 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Synchronisiert alle Konfigurationen eines Ordners in einem Prozess."
+    )
+    parser.add_argument(
+        "fleet_folder",
+        help="Ordner mit einem Unterordner je Tenant (cfg.json, history.json, ...).",
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        help="Anzahl gleichzeitig synchronisierter Tenants.",
+        default=4,
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Anzahl Prozesse für Umwandlung und Hashing großer Datenmengen, "
+        "gemeinsam für alle Tenants. 0 oder 1: kein Prozesspool.",
+        default=0,
+    )
+    parser.add_argument(
+        "--dry",
+        action="store_true",
+        help="Dry Run. Modifiziert keine Daten. Impliziert -v",
+        default=False,
+    )
+    parser.add_argument("-v", help="Setzt das Loglevel auf 'info'", action="store_true")
+    parser.add_argument(
+        "--limit_target",
+        help="Schränkt die Ziele ein.",
+        choices=TARGET_NODE_MAPPING.keys(),
+        nargs="*",
+    )
+    parser.add_argument(
+        "--compact_every",
+        type=int,
+        help="Kompaktiert die Historie jedes Tenants alle N Läufe. 0 (Standard): nie.",
+        default=0,
+    )
+    add_log_args(parser)
+    # options of the single sync that do not apply here
+    parser.set_defaults(limit_src=None, estimate=False)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    exit(main())
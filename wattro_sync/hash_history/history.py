@@ -1,37 +1,242 @@
 import hashlib
 import json
-from typing import Literal, NewType, Iterable, Iterator
+import os
+import pathlib
+from typing import Literal, NewType, Iterable, Iterator, MutableMapping
 
+from ..config_reader.types import ConfigDegenerated
 from ..file_access import read_write
+from .index import HashIndex
 
 Target = Literal["asset", "project"]
 
 HashHistory = NewType("HashHistory", dict[str, str])
 
+# hash of a row that could not be transformed, never stored
+NO_HASH = ""
+# top level key of history.json holding the field hashes
+FIELDS_KEY = "_fields"
+# top level key of history.json listing the targets without raw row hashes
+RECORD_HASHED_KEY = "_record_hashed"
+# top level key of history.json holding the hash of the field mapping per target
+MAPPINGS_KEY = "_mappings"
+# collisions only cost a missed partial update of one field until the row changes again
+FIELD_HASH_CHARS = 12
+# stands in for a field a record did not have
+MISSING_FIELD_HASH = "0" * FIELD_HASH_CHARS
+
+
+class FieldHashes:
+    """
+    per field hashes of one target: the field names once, per ident the hashes
+    of all fields concatenated in that order
+    """
+
+    def __init__(self, stored: None | dict = None) -> None:
+        stored = stored or {}
+        self.fields: list[str] = []
+        self.packed: MutableMapping[str, str] = {}
+        if isinstance(stored.get("fields", None), list):
+            self.fields = stored["fields"]
+            self.packed = stored.get("hashes", {})
+        else:
+            # written by an older version: ident -> field -> hash
+            for key, hashes in stored.items():
+                self[key] = hashes
+
+    def __getitem__(self, key: str) -> dict[str, str]:
+        packed = self.packed[key]
+        hashes = {}
+        for pos, field in enumerate(self.fields):
+            hashed = packed[pos * FIELD_HASH_CHARS : (pos + 1) * FIELD_HASH_CHARS]
+            if hashed and hashed != MISSING_FIELD_HASH:
+                hashes[field] = hashed
+        return hashes
+
+    def __setitem__(self, key: str, hashes: dict[str, str]) -> None:
+        new_fields = [field for field in hashes if field not in self.fields]
+        if new_fields:
+            self.fields.extend(new_fields)
+            if isinstance(self.packed, HashIndex):
+                # the packed width grows, pad the known entries to it
+                self.packed = self._indexed(self.packed.items())
+        self.packed[key] = "".join(
+            hashes.get(field, MISSING_FIELD_HASH) for field in self.fields
+        )
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.packed
+
+    def __len__(self) -> int:
+        return len(self.packed)
+
+    def pop(self, key: str) -> str:
+        """remove `key`, returns its packed hashes"""
+        return self.packed.pop(key)
+
+    def maybe_index(self, min_entries: int) -> None:
+        if isinstance(self.packed, dict) and len(self.packed) > min_entries:
+            self.packed = self._indexed(self.packed.items())
+
+    def _indexed(self, items: Iterable[tuple[str, str]]) -> HashIndex:
+        width = len(self.fields) * FIELD_HASH_CHARS
+        return HashIndex(
+            ((key, val.ljust(width, "0")) for key, val in items),
+            digest_bytes=width // 2,
+        )
+
+    def to_json(self, target: str) -> dict:
+        return {
+            "fields": self.fields,
+            "hashes": _dump_index(f"{target}.fields", self.packed),
+        }
+
 
 class HistoryHandler:
-    def __init__(self):
-        self.full_hist = read_write.read("history")
+    # targets with more entries are kept in a HashIndex instead of a dict,
+    # stored in a binary file next to history.json
+    INDEX_MIN_ENTRIES = 100_000
+
+    def __init__(self) -> None:
+        full_hist = read_write.read("history")
+        # only for partial updates
+        self.field_hashes = {
+            target: FieldHashes(stored)
+            for target, stored in full_hist.pop(FIELDS_KEY, {}).items()
+        }
+        for target, fields in self.field_hashes.items():
+            fields.packed = _load_index(f"{target}.fields", fields.packed)
+        # targets whose entries were all compared with full rows once, see needs_full_rows
+        self.record_hashed: set[str] = set(full_hist.pop(RECORD_HASHED_KEY, []))
+        # field mapping of the last sync, see mapping_changed
+        self.mappings: dict[str, str] = full_hist.pop(MAPPINGS_KEY, {})
+        self.full_hist: dict[str, MutableMapping[str, str]] = full_hist
+        # entries rewritten from raw row hashes, see iter_changed_hashed
+        self.migrated = 0
+        for target in self.full_hist:
+            self.full_hist[target] = _load_index(target, self.full_hist[target])
+            self._maybe_index(target)
+        for fields in self.field_hashes.values():
+            fields.maybe_index(self.INDEX_MIN_ENTRIES)
+
+    def _maybe_index(self, target: str) -> None:
+        hist = self.full_hist[target]
+        if isinstance(hist, dict) and len(hist) > self.INDEX_MIN_ENTRIES:
+            self.full_hist[target] = HashIndex(hist.items())
 
     def iter_changed(
-        self, target: str, to_check: Iterable[dict], ident: str
+        self,
+        target: str,
+        to_check: Iterable[dict],
+        ident: str,
+        hashes: None | Iterable[str] = None,
     ) -> Iterator[dict]:
-        ident = ident
+        """`hashes` may hold the already computed hash of each value in `to_check`"""
+        for val, _ in self.iter_changed_hashed(target, to_check, ident, hashes):
+            yield val
+
+    def iter_changed_hashed(
+        self,
+        target: str,
+        to_check: Iterable[dict],
+        ident: str,
+        hashes: None | Iterable[str] = None,
+    ) -> Iterator[tuple[dict, str]]:
+        """
+        changed values with their new hash.
+        `hashes` usually are the hashes of the transformed records (see `hash_record`).
+        Entries still holding the hash of the raw source row (written by older versions)
+        count as unchanged if the row is, and are migrated to the new hash.
+        """
         hist = self.full_hist.get(target, {})
-        for val in to_check:
+        if hashes is None:
+            hashes = (_hashed(val) for val in to_check)
+        for val, hashed in zip(to_check, hashes):
             key = str(val[ident])
-            if hist.get(key, None) != _hashed(val):
-                yield val
+            known = hist.get(key, None)
+            if known == hashed:
+                continue
+            if hashed != NO_HASH and known is not None and known == _hashed(val):
+                hist[key] = hashed
+                self.migrated += 1
+                continue
+            yield val, hashed
 
-    def update(self, target: str, val: dict, ident: str) -> None:
-        ident = ident
+    def needs_full_rows(self, target: str) -> bool:
+        """
+        `target` may still hold hashes of raw rows, written by versions that read
+        all configured fields. They can only be migrated by comparing the full rows.
+        """
+        return (
+            bool(self.full_hist.get(target, None)) and target not in self.record_hashed
+        )
+
+    def mark_record_hashed(self, target: str) -> None:
+        """all entries of `target` were compared, see needs_full_rows"""
+        self.record_hashed.add(target)
+
+    def mapping_changed(self, target: str, field_mapping: dict) -> bool:
+        """`field_mapping` differs from the one stored with `set_mapping`"""
+        return self.mappings.get(target, None) != _hashed_mapping(field_mapping)
+
+    def set_mapping(self, target: str, field_mapping: dict) -> None:
+        self.mappings[target] = _hashed_mapping(field_mapping)
+
+    def update(
+        self, target: str, val: dict, ident: str, hashed: None | str = None
+    ) -> None:
+        """store `hashed`, by default the hash of `val` itself"""
         key = str(val[ident])
         if target not in self.full_hist:
             self.full_hist[target] = {}
-        self.full_hist[target][key] = _hashed(val)
+        self.full_hist[target][key] = _hashed(val) if hashed is None else hashed
+        self._maybe_index(target)
+
+    def get_field_hashes(self, target: str, key: str) -> None | dict[str, str]:
+        fields = self.field_hashes.get(target, None)
+        if fields is None or key not in fields:
+            return None
+        return fields[key]
+
+    def update_field_hashes(
+        self, target: str, key: str, field_hashes: dict[str, str]
+    ) -> None:
+        fields = self.field_hashes.setdefault(target, FieldHashes())
+        fields[key] = field_hashes
+        fields.maybe_index(self.INDEX_MIN_ENTRIES)
+
+    def compact(self, target: str, live_idents: Iterable[str | int]) -> tuple[int, int]:
+        """
+        drop entries of `target` whose ident is not in `live_idents`,
+        returns the number of removed entries and the reclaimed bytes
+        """
+        hist = self.full_hist.get(target, {})
+        live = {str(key) for key in live_idents}
+        stale = [key for key in hist if key not in live]
+        if not stale:
+            return 0, 0
+        reclaimed = sum(_entry_size(key, hist[key]) for key in stale)
+        fields = self.field_hashes.get(target, FieldHashes())
+        for key in stale:
+            del hist[key]
+            if key in fields:
+                reclaimed += _entry_size(key, fields.pop(key))
+        return len(stale), reclaimed
 
     def save(self) -> None:
-        read_write.write("history", self.full_hist)
+        full_hist: dict = {
+            target: _dump_index(target, hist) for target, hist in self.full_hist.items()
+        }
+        if self.record_hashed:
+            full_hist[RECORD_HASHED_KEY] = sorted(self.record_hashed)
+        if self.mappings:
+            full_hist[MAPPINGS_KEY] = self.mappings
+        if self.field_hashes:
+            full_hist[FIELDS_KEY] = {
+                target: fields.to_json(target)
+                for target, fields in self.field_hashes.items()
+            }
+        read_write.write("history", full_hist)
 
 
 def _generate_from_values(new_values: Iterable[dict], ident: str) -> HashHistory:
@@ -39,6 +244,71 @@ def _generate_from_values(new_values: Iterable[dict], ident: str) -> HashHistory
     return HashHistory({str(val[ident]): _hashed(val) for val in new_values})
 
 
+def _index_path(name: str) -> pathlib.Path:
+    return read_write.side_path("history", f"{name}.idx")
+
+
+def _load_index(
+    name: str, stored: MutableMapping[str, str]
+) -> MutableMapping[str, str]:
+    """`stored` with the entries `_dump_index` wrote to the index file of `name`"""
+    path = _index_path(name)
+    if not path.is_file():
+        return stored
+    try:
+        with path.open("rb") as fp:
+            return HashIndex.load(fp, stored.items())
+    except (KeyError, ValueError) as err:
+        raise ConfigDegenerated(f"{path} could not be parsed.") from err
+
+
+def _dump_index(name: str, hist: MutableMapping[str, str]) -> dict[str, str]:
+    """
+    the entries of `hist` to store in history.json. Those of a HashIndex are
+    streamed to its own file instead, without building a dict of them.
+    """
+    path = _index_path(name)
+    if not isinstance(hist, HashIndex):
+        path.unlink(missing_ok=True)
+        return hist if isinstance(hist, dict) else dict(hist)
+    tmp_path = path.with_suffix(".tmp")
+    with tmp_path.open("wb") as fp:
+        rest = hist.dump(fp)
+    os.replace(tmp_path, path)
+    return rest
+
+
+def _entry_size(key: str, val: str) -> int:
+    """bytes of `"key": val, ` in history.json"""
+    return len(json.dumps(key)) + len(json.dumps(val)) + 4
+
+
+def _hashed_mapping(field_mapping: dict) -> str:
+    seed = json.dumps(field_mapping, sort_keys=True, default=str).encode()
+    return hashlib.md5(seed, usedforsecurity=False).hexdigest()
+
+
+def hash_fields(record: dict) -> dict[str, str]:
+    """short hash per field of a transformed record"""
+    return {
+        key: hashlib.md5(
+            json.dumps(val, sort_keys=True, default=str).encode(),
+            usedforsecurity=False,
+        ).hexdigest()[:FIELD_HASH_CHARS]
+        for key, val in record.items()
+    }
+
+
+def hash_row(row: dict) -> str:
+    """hash of a raw source row"""
+    return _hashed(row)
+
+
+def hash_record(record: dict) -> str:
+    """hash of a transformed target record, stored per ident"""
+    return _hashed(record)
+
+
 def _hashed(raw_dict: dict) -> str:
     """generate hash value from a dict that can be json serialized."""
     # sort_keys: make stable under dict shuffle
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import bisect
+import json
+from typing import BinaryIO, Iterable, Iterator, MutableMapping
+
+DIGEST_BYTES = 16
+
+
+class HashIndex(MutableMapping[str, str]):
+    """
+    Memory saving stand in for the `{ident: md5 hex}` dict of a large target.
+
+    Idents are kept in a sorted list, their digests as 16 raw bytes each in one bytearray
+    at the same position. Lookups bisect the list. New idents go to a small overlay dict
+    that is merged into the arrays once it grows, deletions are tombstones until then.
+    Values that are no md5 hex digest stay in the overlay.
+    `digest_bytes` sets the packed width for hex values of other lengths.
+    """
+
+    def __init__(
+        self, items: Iterable[tuple[str, str]] = (), digest_bytes: int = DIGEST_BYTES
+    ):
+        self.digest_bytes = digest_bytes
+        self._keys: list[str] = []
+        self._digests = bytearray()
+        self._overlay: dict[str, str] = {}
+        self._deleted: set[str] = set()
+        self._rebuild(items)
+
+    def _rebuild(self, items: Iterable[tuple[str, str]]) -> None:
+        packed: list[tuple[str, bytes]] = []
+        for key, val in items:
+            digest = _pack(val, self.digest_bytes)
+            if digest is None:
+                self._overlay[key] = val
+            else:
+                packed.append((key, digest))
+        packed.sort()
+        self._keys = [key for key, _ in packed]
+        self._digests = bytearray(b"".join(digest for _, digest in packed))
+
+    def _find(self, key: str) -> int:
+        """position of `key` in the arrays, -1 if not there"""
+        pos = bisect.bisect_left(self._keys, key)
+        if pos < len(self._keys) and self._keys[pos] == key:
+            return pos
+        return -1
+
+    def __getitem__(self, key: str) -> str:
+        if key in self._overlay:
+            return self._overlay[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        pos = self._find(key)
+        if pos < 0:
+            raise KeyError(key)
+        start = pos * self.digest_bytes
+        return self._digests[start : start + self.digest_bytes].hex()
+
+    def __setitem__(self, key: str, val: str) -> None:
+        # a key is either live in the arrays or in the overlay, never both
+        digest = _pack(val, self.digest_bytes)
+        pos = self._find(key)
+        if pos >= 0 and digest is not None:
+            start = pos * self.digest_bytes
+            self._digests[start : start + self.digest_bytes] = digest
+            self._overlay.pop(key, None)
+            self._deleted.discard(key)
+            return
+        if pos >= 0:
+            self._deleted.add(key)
+        self._overlay[key] = val
+        if len(self._overlay) > max(1024, len(self._keys) // 8):
+            self.merge()
+
+    def __delitem__(self, key: str) -> None:
+        if key in self._overlay:
+            del self._overlay[key]
+        elif key in self:
+            self._deleted.add(key)
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._overlay:
+            return True
+        if not isinstance(key, str) or key in self._deleted:
+            return False
+        return self._find(key) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self._keys:
+            if key not in self._deleted:
+                yield key
+        yield from self._overlay
+
+    def __len__(self) -> int:
+        return len(self._keys) - len(self._deleted) + len(self._overlay)
+
+    def merge(self) -> None:
+        """fold overlay and tombstones into the sorted arrays"""
+        items = [*self._iter_packed(), *self._overlay.items()]
+        self._overlay = {}
+        self._deleted = set()
+        self._rebuild(items)
+
+    def dump(self, fp: BinaryIO) -> dict[str, str]:
+        """
+        write the packed entries to `fp` without building a dict of them,
+        returns the remaining entries whose values are no hex digests
+        """
+        self.merge()
+        header = {"count": len(self._keys), "digest_bytes": self.digest_bytes}
+        fp.write(json.dumps(header).encode() + b"\n")
+        fp.write(self._digests)
+        for key in self._keys:
+            fp.write(json.dumps(key).encode() + b"\n")
+        return dict(self._overlay)
+
+    @classmethod
+    def load(cls, fp: BinaryIO, rest: Iterable[tuple[str, str]] = ()) -> HashIndex:
+        """read what `dump` wrote, `rest` are the entries it returned"""
+        header = json.loads(fp.readline())
+        index = cls(digest_bytes=header["digest_bytes"])
+        index._digests = bytearray(fp.read(header["count"] * index.digest_bytes))
+        index._keys = [json.loads(line) for line in fp]
+        if (
+            len(index._keys) != header["count"]
+            or len(index._digests) != len(index._keys) * index.digest_bytes
+        ):
+            raise ValueError("Index unvollständig.")
+        for key, val in rest:
+            index[key] = val
+        return index
+
+    def _iter_packed(self) -> Iterator[tuple[str, str]]:
+        for pos, key in enumerate(self._keys):
+            if key not in self._deleted:
+                start = pos * self.digest_bytes
+                yield key, self._digests[start : start + self.digest_bytes].hex()
+
+
+def _pack(val: str, digest_bytes: int) -> None | bytes:
+    if not isinstance(val, str) or len(val) != 2 * digest_bytes:
+        return None
+    try:
+        return bytes.fromhex(val)
+    except ValueError:
+        return None
@@ -1,3 +1,4 @@
+import functools
 import logging
 from typing import overload, Literal
 
@@ -28,16 +29,23 @@ class StupidTerminalChoice:
         return int(choice)
 
 
-try:
-    from simple_term_menu import TerminalMenu
-except NotImplementedError as platform_err:
-    TerminalMenu = StupidTerminalChoice
-    logging.warning(f"{platform_err} - falling back to {TerminalMenu!r}")
+@functools.cache
+def get_terminal_menu() -> type:
+    """imported on first use, as only the setup wizard needs a menu"""
+    try:
+        from simple_term_menu import TerminalMenu
+    except NotImplementedError as platform_err:
+        logging.warning(f"{platform_err} - falling back to {StupidTerminalChoice!r}")
+        return StupidTerminalChoice
+    return TerminalMenu
+
 
 from wattro_sync.api.api_mapping import ApiNameToStructureMapping
 
 SOURCE_CHOICES = ApiNameToStructureMapping.keys()
 TARGET_NODE_MAPPING = {"project": "/project/project/", "asset": "/node/asset/"}
+# target field wattro identifies synced records by
+TARGET_IDENT_FIELD = "human_id"
 
 
 # TerminalMenu Helpers
@@ -87,7 +95,7 @@ def _select(
     menu_entries: list[str], is_multi: bool, required: bool, **kwargs
 ) -> None | int | tuple[int]:
     is_many = len(menu_entries) > 7
-    res = TerminalMenu(
+    res = get_terminal_menu()(
         menu_entries,
         **kwargs,
         multi_select=is_multi,
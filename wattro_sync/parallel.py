@@ -0,0 +1,151 @@
+"""
+Decode, transform and hash large results in a process pool.
+
+Rows are sent to the workers in chunks, results come back in the original order,
+so history and send logic behave exactly as in a single process.
+Only a few chunks per worker are in flight, so a slow consumer (e.g. an upload)
+bounds the memory. Records the workers log are handled by the parent process.
+"""
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import logging
+import logging.handlers
+import multiprocessing
+from typing import Callable, Iterable, Iterator, Sequence, TypeVar
+
+from .api.src_cli import DBRes
+from .config_reader.types import FieldMapping
+from .file_access.logging import LogQueueHandler, get_log_fields, log_fields
+
+CHUNK_SIZE = 2_000
+# below this, starting to pickle rows costs more than it saves
+MIN_ROWS = 2 * CHUNK_SIZE
+# chunks submitted per worker ahead of the one being consumed
+PENDING_PER_WORKER = 2
+
+Job = tuple[DBRes, FieldMapping, str, dict[str, str]]
+Result = TypeVar("Result")
+
+
+class WorkerPool(concurrent.futures.ProcessPoolExecutor):
+    """process pool whose workers log through the handlers of this process"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.log_queue: multiprocessing.Queue = multiprocessing.Queue()
+        super().__init__(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.log_queue, logging.getLogger().level),
+        )
+        self.listener = logging.handlers.QueueListener(
+            self.log_queue, _ForwardHandler()
+        )
+        self.listener.start()
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        super().shutdown(wait=wait, cancel_futures=cancel_futures)
+        self.listener.stop()
+
+
+class _ForwardHandler(logging.Handler):
+    """hands records of the workers to the logger they were logged with"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        logging.getLogger(record.name).handle(record)
+
+
+def _init_worker(log_queue: multiprocessing.Queue, level: int) -> None:
+    # forked workers inherit the handlers of the parent, whose queue nobody reads here
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(LogQueueHandler(log_queue))
+    root.setLevel(level)
+
+
+def use_pool(pool: None | concurrent.futures.Executor, src_data: Sequence) -> bool:
+    return (
+        pool is not None and isinstance(src_data, DBRes) and len(src_data) >= MIN_ROWS
+    )
+
+
+def _chunks(res: DBRes, size: int = CHUNK_SIZE) -> Iterator[DBRes]:
+    for start in range(0, len(res.rows), size):
+        # plain tuples, as driver rows are not necessarily picklable
+        rows = [tuple(row) for row in res.rows[start : start + size]]
+        yield DBRes(res.description, rows, res.type_codes, res.nullable)
+
+
+def _transform_chunk(args: Job) -> list[dict | Exception]:
+    from .sync import iter_transform_safe
+
+    res, field_mapping, encoding, fields = args
+    with log_fields(**fields):
+        return list(iter_transform_safe(res, field_mapping, encoding))
+
+
+def _hash_chunk(args: Job) -> list[str]:
+    from .hash_history.history import NO_HASH, hash_record
+
+    return [
+        hash_record(record) if isinstance(record, dict) else NO_HASH
+        for record in _transform_chunk(args)
+    ]
+
+
+def _jobs(res: DBRes, field_mapping: FieldMapping, encoding: str) -> Iterator[Job]:
+    fields = get_log_fields()
+    return ((chunk, field_mapping, encoding, fields) for chunk in _chunks(res))
+
+
+def _map_bounded(
+    pool: concurrent.futures.Executor,
+    func: Callable[[Job], Result],
+    jobs: Iterable[Job],
+) -> Iterator[Result]:
+    """like `pool.map`, but submits the next job only once a result is taken"""
+    window = PENDING_PER_WORKER * getattr(pool, "workers", 1)
+    pending: collections.deque[concurrent.futures.Future[Result]] = collections.deque()
+    try:
+        for job in jobs:
+            pending.append(pool.submit(func, job))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def iter_transform(
+    pool: concurrent.futures.Executor,
+    res: DBRes,
+    field_mapping: FieldMapping,
+    encoding: str,
+) -> Iterator[dict | Exception]:
+    """transformed records, or the error of a row that failed"""
+    for transformed in _map_bounded(
+        pool, _transform_chunk, _jobs(res, field_mapping, encoding)
+    ):
+        yield from transformed
+
+
+def iter_hashes(
+    pool: concurrent.futures.Executor,
+    res: DBRes,
+    field_mapping: FieldMapping,
+    encoding: str,
+) -> Iterator[str]:
+    """hashes of the transformed records"""
+    for hashes in _map_bounded(pool, _hash_chunk, _jobs(res, field_mapping, encoding)):
+        yield from hashes
+
+
+def get_pool(workers: int) -> None | WorkerPool:
+    if workers < 2:
+        return None
+    return WorkerPool(workers)
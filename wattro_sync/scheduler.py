@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import random
+import signal
+import threading
+import time
+from typing import Callable, Iterable
+
+
+class Scheduler:
+    """
+    Keeps track of when each target is due next.
+
+    scheduler = Scheduler({"asset": 60, "project": 300}, jitter=5)
+    for target in scheduler.due():
+        ...
+        scheduler.mark_run(target)
+    """
+
+    def __init__(
+        self,
+        intervals: dict[str, float],
+        jitter: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if any(interval <= 0 for interval in intervals.values()):
+            raise ValueError(f"Intervals must be positive: {intervals}")
+        self.intervals = intervals
+        self.jitter = max(jitter, 0.0)
+        self.clock = clock
+        now = self.clock()
+        # every target is due on start
+        self.next_run: dict[str, float] = {target: now for target in intervals}
+
+    def due(self) -> list[str]:
+        """targets that should run now, most overdue first"""
+        now = self.clock()
+        overdue = [target for target, at in self.next_run.items() if at <= now]
+        return sorted(overdue, key=lambda target: self.next_run[target])
+
+    def mark_run(self, target: str) -> None:
+        offset = random.uniform(0, self.jitter) if self.jitter else 0.0  # nosec
+        self.next_run[target] = self.clock() + self.intervals[target] + offset
+
+    def seconds_until_next(self) -> float:
+        if not self.next_run:
+            return 0.0
+        return max(min(self.next_run.values()) - self.clock(), 0.0)
+
+
+def positive_int(value: str) -> int:
+    """argparse type for intervals"""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"keine positive ganze Zahl: {value!r}")
+    return number
+
+
+class GracefulShutdown:
+    """Turns SIGINT/SIGTERM into a stop flag, so the running cycle can finish."""
+
+    def __init__(self, signals: Iterable[int] = (signal.SIGINT, signal.SIGTERM)):
+        self.stop = threading.Event()
+        for sig in signals:
+            signal.signal(sig, self._handle)
+
+    def _handle(self, signum: int, _frame) -> None:
+        if self.stop.is_set():
+            raise KeyboardInterrupt()
+        logging.warning(
+            "Signal %s empfangen. Beende nach dem laufenden Durchlauf.", signum
+        )
+        self.stop.set()
+
+    def wait(self, timeout: float) -> bool:
+        """sleep up to `timeout` seconds; True if a shutdown was requested"""
+        return self.stop.wait(timeout)
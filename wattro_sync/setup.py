@@ -11,12 +11,15 @@ from wattro_sync.api.mosaik_api import MosaikSyncInfo, MosaikConInfo
 from wattro_sync.config_reader.types import SyncCfg, MailCfg
 from wattro_sync.helpers import (
     SOURCE_CHOICES,
+    TARGET_IDENT_FIELD,
     TARGET_NODE_MAPPING,
     multi_select,
     select,
 )
 from .api.api_mapping import ApiNameToStructureMapping, ApiStructure
+from .api.file_api import FileSyncInfo
 from .api.rest_api import WattroNodeApi
+from .api.schema_cache import SchemaCache
 from .api.sqlite_api import SQLiteSyncInfo
 from .api.src_cli import CollectionInfo, SrcCli, SyncInfo
 from .config_reader import access as cfg_access
@@ -57,16 +60,18 @@ def main() -> int:
 def write_mapping(
     args: argparse.Namespace, collection_info: CollectionInfo, wattro_api: WattroNodeApi
 ) -> None:
-    raw_fields = wattro_api.get_fields(TARGET_NODE_MAPPING[args.target])
+    raw_fields = wattro_api.get_fields(
+        TARGET_NODE_MAPPING[args.target], use_cache=not args.refresh
+    )
     field_mapping: dict[str, dict[str, None | int | str]] = {}
     src_fields = collection_info.fields
     for key, value in raw_fields.items():
         if value.get("read_only", True):
             logging.info("Überspringe 'read_path only' Feld %s; %s", key, value)
             continue
-        if key == "human_id":
+        if key == TARGET_IDENT_FIELD:
             ident = collection_info.ident
-            logging.info(f"Setze 'human_id' auf {ident!r}")
+            logging.info(f"Setze {key!r} auf {ident!r}")
             field_mapping[key] = {**value, "src": _make_cfg_field(ident)}
             continue
         field_mapping[key] = {**value, "src": select_src(key, src_fields, value)}
@@ -79,12 +84,31 @@ def write_source_connection_and_get_info(
     sync_info: SyncInfo
     if api_struct.connection_info == SQLiteSyncInfo:
         con_info = get_sqlite_connection_info()
-        collection_info = create_collection_info(api_struct.api, con_info)
+        collection_info = create_collection_info(
+            api_struct.api,
+            con_info,
+            refresh=args.refresh,
+            keep_samples=args.cache_samples,
+        )
         sync_info = SQLiteSyncInfo(con_info, collection_info)
     elif api_struct.connection_info == MosaikSyncInfo:
         con_info = get_mosaik_connnection_info()
-        collection_info = create_collection_info(api_struct.api, con_info)
+        collection_info = create_collection_info(
+            api_struct.api,
+            con_info,
+            refresh=args.refresh,
+            keep_samples=args.cache_samples,
+        )
         sync_info = MosaikSyncInfo(con_info, collection_info)
+    elif api_struct.connection_info == FileSyncInfo:
+        con_info = get_file_connection_info()
+        collection_info = create_collection_info(
+            api_struct.api,
+            con_info,
+            refresh=args.refresh,
+            keep_samples=args.cache_samples,
+        )
+        sync_info = FileSyncInfo(con_info, collection_info)
     else:
         raise NotImplementedError(f"TODO {api_struct}")
     api = api_struct.api(sync_info)
@@ -191,36 +215,53 @@ def get_sqlite_connection_info() -> str:
         )
 
 
+def get_file_connection_info() -> str:
+    while True:
+        path_str = input(
+            "Pfad zur Exportdatei oder zum Ordner (csv, jsonl, auch .gz):\t"
+        )
+        if pathlib.Path(path_str).resolve().exists():
+            return path_str
+        logging.error(" '%s' existiert nicht.", path_str)
+
+
 def has_dup_idents(api: SrcCli, collection_info: CollectionInfo) -> bool:
-    res = api.get_new([])
-    known_identifiers: dict[str, list[dict]] = dict()
-    dups = list()
-    for data in res:
-        ident = data[collection_info.ident]
-        if ident in known_identifiers:
-            dups.append(ident)
-            known_identifiers[ident].append(data)
-        else:
-            known_identifiers[ident] = [data]
+    dups = api.get_dup_idents()
     if not dups:
         return False
 
+    ident = collection_info.ident
+    dup_keys = [dup[ident] for dup in dups]
+    samples = api.get_old(dup_keys)
     for dup in dups:
-        logging.error("%s ist nicht eindeutig: %s", collection_info.ident, dup)
-        for dat in known_identifiers[dup]:
-            logging.info("\t%s", dat)
+        logging.error(
+            "%s ist nicht eindeutig: %s (%i mal)", ident, dup[ident], dup["dup_count"]
+        )
+        for dat in samples:
+            if dat[ident] == dup[ident]:
+                logging.info("\t%s", dat)
     return True
 
 
 def create_collection_info(
-    api: typing.Type[SrcCli], connection_info: typing.Any
+    api: typing.Type[SrcCli],
+    connection_info: typing.Any,
+    refresh: bool = False,
+    keep_samples: bool = False,
 ) -> CollectionInfo:
-    table_options = api.get_collections(connection_info)
-    table_id = select(
-        table_options, required=True, title="Quelltabelle (Enter zum Auswählen)"
-    )
-    table_name = table_options[table_id]
-    field_options, field_samples = api.get_fields(connection_info, table_name)
+    with SchemaCache(
+        api, connection_info, refresh=refresh, keep_samples=keep_samples
+    ) as schema:
+        table_options = schema.get_collections()
+        table_id = select(
+            table_options,
+            required=True,
+            title="Quelltabelle (Enter zum Auswählen)",
+            preview_title="Felder",
+            preview_command=schema.preview,
+        )
+        table_name = table_options[table_id]
+        field_options, field_samples = schema.get_fields(table_name)
     field_ids = multi_select(
         field_options,
         required=True,
@@ -280,6 +321,20 @@ def parse_args() -> argparse.Namespace:
 
     parser.add_argument("target", help="Daten Ziel", choices=TARGET_NODE_MAPPING.keys())
     parser.add_argument("source", help="Quellsystem", choices=SOURCE_CHOICES)
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Struktur von Quelle und Wattro neu einlesen, "
+        "statt den Zwischenspeicher zu nutzen.",
+        default=False,
+    )
+    parser.add_argument(
+        "--cache_samples",
+        action="store_true",
+        help="Beispielwerte der Quelle 7 Tage im Zwischenspeicher ablegen "
+        "(sonst nur Tabellen- und Feldnamen).",
+        default=False,
+    )
 
     return parser.parse_args()
 
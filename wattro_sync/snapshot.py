@@ -0,0 +1,185 @@
+#!/bin/env python3
+"""
+Export what the sources return into a snapshot file and replay it offline.
+
+`export` reads all rows of each configured target the way the sync does (same columns)
+and writes them column by column into a gzipped JSON file, optionally with anonymised columns.
+`replay` syncs a snapshot against an in-process fake node in a temporary base folder,
+so real data shapes can be benchmarked and profiled without the customer system.
+"""
+import argparse
+import cProfile
+import logging
+import os
+import pathlib
+import secrets
+import tempfile
+import time
+
+import wattro_sync.config_reader.access
+import wattro_sync.file_access.read_write
+from wattro_sync.api.snapshot_api import (
+    Anonymiser,
+    SnapshotSyncInfo,
+    read_snapshot,
+    snapshot_target,
+    write_snapshot,
+)
+from wattro_sync.api.src_cli import CollectionInfo
+from wattro_sync.config_reader.types import ConnectionStructure, FieldMapping
+from wattro_sync.fake_node import FakeNode
+from wattro_sync.file_access import read_write
+from wattro_sync.helpers import TARGET_NODE_MAPPING
+from wattro_sync.sync import SyncState, get_src_api, select_targets, sync
+
+KEY_ENV = "WATTRO_SNAPSHOT_KEY"
+
+
+def export(args: argparse.Namespace) -> int:
+    if not wattro_sync.file_access.read_write.exists("cfg"):
+        logging.error(
+            "Keine Konfiguration gefunden. Bitte zuerst eine via `setup` erstellen."
+        )
+        return -1
+    cfg = wattro_sync.config_reader.access.get_or_create()
+    anonymiser = None
+    if args.anonymise:
+        key = os.environ.get(KEY_ENV, None)
+        if key is None:
+            logging.info(
+                "%s nicht gesetzt, anonymisiere mit zufälligem Schlüssel.", KEY_ENV
+            )
+            key = secrets.token_hex(16)
+        anonymiser = Anonymiser(key.encode())
+
+    state = SyncState()
+    targets = {}
+    for target, con in select_targets(args, cfg).items():
+        src_api = get_src_api(target, con, state)
+        if src_api is None:
+            return -1
+        with src_api.session():
+            src_data = src_api.get_new([])
+        ident = con.sync_info.collection_info.ident
+        collection_info = CollectionInfo(target, list(src_data.description), ident)
+        try:
+            targets[target] = snapshot_target(
+                src_data,
+                collection_info,
+                con.field_mapping,
+                con.encoding,
+                anonymiser,
+                args.anonymise or (),
+            )
+        except ValueError as err:
+            logging.error("%s: %s", target, err)
+            return -1
+        logging.info("%s: %i Datensätze.", target, len(src_data))
+    write_snapshot(pathlib.Path(args.file), targets)
+    print(
+        f"Snapshot {args.file} geschrieben ({os.path.getsize(args.file) / 1024:.1f} kB)."
+    )
+    return 0
+
+
+def replay(args: argparse.Namespace) -> int:
+    snapshot_path = pathlib.Path(args.file).resolve()
+    snapshot = read_snapshot(snapshot_path)
+    profiler = cProfile.Profile() if args.profile else None
+    with tempfile.TemporaryDirectory() as tmp_dir, read_write.use_base_folder(
+        pathlib.Path(tmp_dir)
+    ), FakeNode(keep_posted=False) as node:
+        for data in snapshot["targets"].values():
+            # so the field mapping passes the validation
+            node.fields.update(
+                {
+                    name: {**field_map, "read_only": False, "required": False}
+                    for name, field_map in data["field_mapping"].items()
+                }
+            )
+        wattro_api = node.api()
+        state = SyncState(workers=args.workers)
+        try:
+            for run in range(1, args.runs + 1):
+                for target, data in snapshot["targets"].items():
+                    con = ConnectionStructure(
+                        connection_type="Snapshot",
+                        sync_info=SnapshotSyncInfo(
+                            str(snapshot_path),
+                            CollectionInfo(**data["collection_info"]),
+                        ),
+                        field_mapping=FieldMapping(data["field_mapping"]),
+                        encoding=data["encoding"],
+                    )
+                    start = time.perf_counter()
+                    if profiler is not None:
+                        profiler.enable()
+                    success, fail = sync(target, con, wattro_api, False, state)
+                    if profiler is not None:
+                        profiler.disable()
+                    print(
+                        f"Lauf {run} | {target} | erfolgreich: {success} | "
+                        f"nicht erfolgreich: {fail} | {time.perf_counter() - start:.2f} s"
+                    )
+        finally:
+            state.close()
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+        print(f"Profil in {args.profile} (z.B. `python -m pstats {args.profile}`).")
+    return 0
+
+
+def main() -> int:
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO if args.v else logging.WARNING)
+    if args.command == "export":
+        return export(args)
+    return replay(args)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Exportiert die Daten der Quellen in einen Snapshot "
+        "oder synchronisiert einen Snapshot gegen eine lokale Test-Node."
+    )
+    parser.add_argument(
+        "command",
+        choices=("export", "replay"),
+        help="export: Quellen lesen und speichern, replay: Snapshot synchronisieren.",
+    )
+    parser.add_argument("file", help="Snapshot Datei, z.B. snapshot.json.gz")
+    parser.add_argument("-v", help="Setzt das Loglevel auf 'info'", action="store_true")
+    parser.add_argument(
+        "--limit_target",
+        help="export: Schränkt die Ziele ein.",
+        choices=TARGET_NODE_MAPPING.keys(),
+        nargs="*",
+    )
+    parser.add_argument(
+        "--anonymise",
+        nargs="*",
+        help=f"export: Spalten, die durch einen HMAC ersetzt werden (Schlüssel aus {KEY_ENV}). "
+        "Typ, Länge und Gleichheit der Werte bleiben erhalten.",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=2,
+        help="replay: Anzahl Läufe; der erste legt alles an, weitere prüfen auf Änderungen.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="replay: Anzahl Prozesse für Umwandlung und Hashing.",
+    )
+    parser.add_argument(
+        "--profile",
+        help="replay: Schreibt ein cProfile Profil der Synchronisation in diese Datei.",
+    )
+    parser.set_defaults(limit_src=None)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    exit(main())
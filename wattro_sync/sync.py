@@ -1,26 +1,57 @@
 #!/bin/env python3
 import argparse
+import concurrent.futures
+import contextlib
+import contextvars
 import dataclasses
 import datetime
+import itertools
+import json
 import logging
 import random
-from typing import Iterable, Sequence
+import re
+import string
+import time
+from typing import Collection, Iterable, Iterator, Sequence
+
+import requests
 
 import wattro_sync.config_reader.access
 import wattro_sync.file_access.read_write
+from wattro_sync import parallel
 from wattro_sync.api.api_mapping import ApiNameToStructureMapping
 from wattro_sync.api.mail import MailApi
-from wattro_sync.api.rest_api import WattroNodeApi
-from wattro_sync.api.src_cli import SrcCli
+from wattro_sync.api.rest_api import RequestRejected, WattroNodeApi
+from wattro_sync.api.src_cli import DBRes, SrcCli
 from wattro_sync.config_reader.types import (
     SyncCfg,
     ConnectionStructure,
     FieldMapping,
     ConfigDegenerated,
 )
-from wattro_sync.file_access.logging import get_file_handler, get_stdout_handler
+from wattro_sync.config_reader.validate import (
+    field_mapping_issues,
+    field_mapping_warnings,
+)
+from wattro_sync.file_access.dead_letter import DeadLetters
+from wattro_sync.file_access.logging import (
+    formatter,
+    get_file_handler,
+    get_stdout_handler,
+    log_fields,
+    start_queue_logging,
+)
+from wattro_sync.file_access.stats import RequestKind, RequestTimings
 from wattro_sync.hash_history import history
-from wattro_sync.helpers import SOURCE_CHOICES, TARGET_NODE_MAPPING
+from wattro_sync.helpers import (
+    SOURCE_CHOICES,
+    TARGET_IDENT_FIELD,
+    TARGET_NODE_MAPPING,
+)
+from wattro_sync.scheduler import GracefulShutdown, Scheduler, positive_int
+
+# errors of single rows, e.g. a template referencing a malformed value
+ROW_ERRORS = (KeyError, IndexError, ValueError, TypeError, AttributeError)
 
 
 def main() -> int:
@@ -34,6 +65,7 @@ def main() -> int:
         return -1
     cfg: SyncCfg = wattro_sync.config_reader.access.get_or_create()
     mail_api = MailApi(cfg.mail_cfg)
+    mail_api.resume()
 
     logging.info("Prüfe Verbindung zu Wattro.")
     try:
@@ -44,10 +76,35 @@ def main() -> int:
             "Verbindung zu Wattro API fehlgeschlagen. Es wurden keine Daten gesendet.",
         )
         logging.critical(err)
+        mail_api.close()
         return -1
     logging.info("Verbindung zu Wattro ok.")
 
-    tot_success, tot_fail = 0, 0
+    targets = select_targets(args, cfg)
+    if args.estimate:
+        state = SyncState(workers=args.workers)
+        for target, connection_struct in targets.items():
+            estimation = estimate(target, connection_struct, wattro_api, state)
+            if estimation is not None:
+                estimation.log()
+        state.close()
+    elif args.daemon:
+        run_daemon(args, targets, wattro_api, mail_api)
+    else:
+        state = SyncState(workers=args.workers)
+        run_once(args, targets, wattro_api, mail_api, state)
+        state.close()
+
+    mail_api.close()
+    logging.info("Sync beendet.")
+    return 0
+
+
+def select_targets(
+    args: argparse.Namespace, cfg: SyncCfg
+) -> dict[str, ConnectionStructure]:
+    """configured targets that are not excluded by the cli args"""
+    targets: dict[str, ConnectionStructure] = {}
     for target in TARGET_NODE_MAPPING:
         if args.limit_target and target not in args.limit_target:
             logging.info(f"Überspringe {target!r}, da nicht in {args.limit_target}.")
@@ -62,11 +119,13 @@ def main() -> int:
                 f"Überspringe {target}, da {con_type} nicht in {args.limit_src}."
             )
             continue
+        targets[target] = connection_struct
+    return targets
 
-        success, fail = sync(target, connection_struct, wattro_api, args.dry)
-        tot_success += success
-        tot_fail += fail
 
+def report(
+    mail_api: MailApi, tot_success: int, tot_fail: int, is_dry_run: bool
+) -> None:
     mail_log_lvl = logging.DEBUG
     tot = tot_fail + tot_success
     msg = "Synchronisation durchgeführt.<br /><br />"
@@ -84,25 +143,129 @@ def main() -> int:
         else:
             msg += f"Dabei trat <strong>ein Fehler</strong> auf.<br />"
 
-    if args.dry:
+    if is_dry_run:
         msg += "Da es sich um einen Testaufruf handelt wurden <emph>keine Daten verändert</emph>."
 
     mail_api.send(mail_log_lvl, msg)
 
-    logging.info("Sync beendet.")
-    return 0
 
+@dataclasses.dataclass
+class SyncState:
+    """Everything that may be reused between two runs of the same process."""
+
+    src_apis: dict[str, SrcCli] = dataclasses.field(default_factory=dict)
+    validated: set[str] = dataclasses.field(default_factory=set)
+    hist: None | history.HistoryHandler = None
+    timings: None | RequestTimings = None
+    dead_letters: None | DeadLetters = None
+    workers: int = 0
+    pool: None | concurrent.futures.Executor = None
+
+    def get_history(self) -> history.HistoryHandler:
+        if self.hist is None:
+            self.hist = history.HistoryHandler()
+        return self.hist
+
+    def get_timings(self) -> RequestTimings:
+        if self.timings is None:
+            self.timings = RequestTimings()
+        return self.timings
+
+    def get_dead_letters(self) -> DeadLetters:
+        if self.dead_letters is None:
+            self.dead_letters = DeadLetters()
+        return self.dead_letters
+
+    def get_pool(self) -> None | concurrent.futures.Executor:
+        if self.pool is None:
+            self.pool = parallel.get_pool(self.workers)
+        return self.pool
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+def run_daemon(
+    args: argparse.Namespace,
+    targets: dict[str, ConnectionStructure],
+    wattro_api: WattroNodeApi,
+    mail_api: MailApi,
+) -> None:
+    """sync targets on their schedule until SIGINT/SIGTERM is received"""
+    if not targets:
+        logging.error("Keine Ziele zum Synchronisieren konfiguriert.")
+        return
+    intervals = {
+        target: float(con.interval or args.interval) for target, con in targets.items()
+    }
+    scheduler = Scheduler(intervals, jitter=args.jitter)
+    shutdown = GracefulShutdown()
+    state = SyncState(workers=args.workers)
+    logging.info("Daemon gestartet. Intervalle in Sekunden: %s", intervals)
+
+    while not shutdown.stop.is_set():
+        tot_success, tot_fail = 0, 0
+        for target in scheduler.due():
+            if shutdown.stop.is_set():
+                break
+            try:
+                success, fail = sync(
+                    target, targets[target], wattro_api, args.dry, state
+                )
+            except Exception as err:
+                logging.exception("Sync für %s fehlgeschlagen: %s", target, err)
+                # reconnect on the next run
+                state.src_apis.pop(target, None)
+                success, fail = 0, 1
+            scheduler.mark_run(target)
+            tot_success += success
+            tot_fail += fail
+        if tot_success + tot_fail > 0:
+            if not args.dry:
+                compact_if_due(targets, wattro_api, state, args.compact_every)
+            report(mail_api, tot_success, tot_fail, args.dry)
+        shutdown.wait(scheduler.seconds_until_next())
+    state.close()
+    logging.info("Daemon beendet.")
+
+
+def run_once(
+    args: argparse.Namespace,
+    targets: dict[str, ConnectionStructure],
+    wattro_api: WattroNodeApi,
+    mail_api: MailApi,
+    state: SyncState,
+) -> tuple[int, int]:
+    """sync all targets once and report, returns number of successfull and failed updates"""
+    tot_success, tot_fail = 0, 0
+    for target, connection_struct in targets.items():
+        success, fail = sync(target, connection_struct, wattro_api, args.dry, state)
+        tot_success += success
+        tot_fail += fail
+    if not args.dry:
+        compact_if_due(targets, wattro_api, state, args.compact_every)
+    report(mail_api, tot_success, tot_fail, args.dry)
+    return tot_success, tot_fail
 
-def setup_logger(args):
+
+def setup_logger(args, text_formatter: logging.Formatter = formatter):
     base_logger = logging.getLogger()
     base_logger.setLevel(logging.INFO)
-    file_handler, stdout_handler = get_file_handler(), get_stdout_handler()
-    base_logger.addHandler(file_handler)
-    base_logger.addHandler(stdout_handler)
-
+    file_handler = get_file_handler(
+        max_bytes=args.log_max_mb * 1024 * 1024,
+        backup_count=args.log_backups,
+        when=args.log_rotate_when,
+        json_lines=args.log_json,
+        text_formatter=text_formatter,
+    )
+    stdout_handler = get_stdout_handler()
+    stdout_handler.setFormatter(text_formatter)
     stdout_handler.setLevel(logging.WARNING)
-    if args.v or args.dry:
+    if args.v or args.dry or args.estimate:
         stdout_handler.setLevel(logging.INFO)
+    start_queue_logging(base_logger, file_handler, stdout_handler)
     logging.info(" === Started %s  ===", datetime.datetime.now())
     if args.dry:
         logging.info("Dry Run.")
@@ -113,60 +276,188 @@ def sync(
     src_con_struct: ConnectionStructure,
     wattro_api: WattroNodeApi,
     is_dry_run: bool,
+    state: None | SyncState = None,
 ) -> tuple[int, int]:
     """returns number of successfull and failed updates"""
+    if state is None:
+        state = SyncState()
+    with log_fields(target=target):
+        return _sync(target, src_con_struct, wattro_api, is_dry_run, state)
+
+
+def _sync(
+    target: str,
+    src_con_struct: ConnectionStructure,
+    wattro_api: WattroNodeApi,
+    is_dry_run: bool,
+    state: SyncState,
+) -> tuple[int, int]:
     logging.info(
         f"Starte Prozess für {target!r} (Quelle: {src_con_struct.connection_type})"
     )
-    source_api_struct = ApiNameToStructureMapping[src_con_struct.connection_type]
-    api_class: type[SrcCli] = source_api_struct.api
-    try:
-        src_api: SrcCli = api_class.get_healthy_connection(src_con_struct.sync_info)
-    except ConnectionError:
-        logging.error("Prozess für %s abgebrochen.", target)
+    src_api = get_src_api(target, src_con_struct, state)
+    if src_api is None:
         return 0, 1
+    if target not in state.validated:
+        if not field_mapping_is_valid(target, src_con_struct, wattro_api):
+            logging.error("Prozess für %s abgebrochen.", target)
+            return 0, 1
+        state.validated.add(target)
+    timings = state.get_timings()
     logging.info("Hole Daten von Wattro...")
     known_idents = wattro_api.get_idents(target)
 
     logging.info("%s gefunden. Hole neue Daten von Quelle...", len(known_idents))
-    hist = history.HistoryHandler()
+    hist = state.get_history()
     ident = src_con_struct.sync_info.collection_info.ident
-    src_data_new_idents = src_api.get_new(known_idents)
-    logging.info("%s neue gefunden.", len(src_data_new_idents.rows))
+    dead_letters = state.get_dead_letters()
+    # both reads see the same state of the source, uploads happen after the session
+    try:
+        with src_api.session():
+            src_data_new_idents = src_api.get_new(known_idents)
+            logging.info("%s neue gefunden.", len(src_data_new_idents.rows))
+            logging.info("Hole Daten von Quelle...")
+            # raw row hashes of older versions cover all fields, not only the projected ones
+            full_rows = hist.needs_full_rows(target)
+            with src_api.unprojected() if full_rows else contextlib.nullcontext():
+                logged_changes = src_api.get_changed(known_idents)
+                tracks_changes = logged_changes is not None
+                # the change log does not know about a changed mapping, compare all once
+                remapped = tracks_changes and hist.mapping_changed(
+                    target, src_con_struct.field_mapping
+                )
+                if remapped:
+                    logging.info("Feldzuordnung geändert. Vergleiche alle Datensätze.")
+                src_data_known_idents = (
+                    src_api.get_old(known_idents)
+                    if logged_changes is None or remapped
+                    else logged_changes
+                )
+                # only a comparison of all known entries completes the history migration
+                compared_all = (
+                    logged_changes is None or remapped
+                ) and src_api.compares_all(known_idents)
+    except ConnectionError as err:
+        logging.error(
+            "Quelle nicht lesbar (%s). Prozess für %s abgebrochen.", err, target
+        )
+        return 0, 1
+    src_data_new_idents = skip_quarantined(
+        target, src_data_new_idents, ident, dead_letters
+    )
+    # logged changes that are not handled in this run stay in the change log
+    keep_logged: set[str] = set()
+    if tracks_changes:
+        keep_logged = {str(val[ident]) for val in src_data_known_idents}
+    src_data_known_idents = skip_quarantined(
+        target, src_data_known_idents, ident, dead_letters
+    )
+    if tracks_changes:
+        keep_logged -= {str(val[ident]) for val in src_data_known_idents}
 
     success_updates = 0
     failed_updates = 0
-    success = send_to_wattro(
-        target, src_con_struct, wattro_api, is_dry_run, src_data_new_idents
+    records = TransformedRecords(
+        src_data_new_idents,
+        src_con_struct.field_mapping,
+        src_con_struct.encoding,
+        state.get_pool(),
     )
-    if success and not is_dry_run:
-        for val in src_data_new_idents:
-            hist.update(target, val, ident)
+    with log_fields(phase="create"):
+        success, rejected, created = send_to_wattro(
+            target,
+            src_con_struct,
+            wattro_api,
+            is_dry_run,
+            src_data_new_idents,
+            timings=timings,
+            records=records,
+        )
+    # also after a failed write, so the accepted parts are not created again
+    if (success or created) and not is_dry_run:
+        new_hashes: Iterable[str] = records.hashes or get_hashes(
+            src_data_new_idents, src_con_struct, state.get_pool()
+        )
+        for idx, (val, hashed) in enumerate(zip(src_data_new_idents, new_hashes)):
+            key = str(val[ident])
+            if idx in rejected:
+                dead_letters.record(target, key, history.hash_row(val), rejected[idx])
+            elif idx in created and hashed != history.NO_HASH:
+                hist.update(target, val, ident, hashed)
+                dead_letters.resolve(target, key)
         hist.save()
     if success:
-        success_updates += len(src_data_new_idents)
+        success_updates += len(src_data_new_idents) - len(rejected)
+        failed_updates += len(rejected)
     else:
-        failed_updates += len(src_data_new_idents)
+        done = sum(1 for idx in created if idx not in rejected)
+        success_updates += done
+        failed_updates += len(src_data_new_idents) - done
 
-    logging.info("Hole Daten von Quelle...")
-    src_data_known_idents = src_api.get_old(known_idents)
     logging.info("%s Datensätze auf Änderung prüfen...", len(src_data_known_idents))
 
-    for changed in hist.iter_changed(target, src_data_known_idents, ident):
-        success = send_to_wattro(
+    migrated = hist.migrated
+    changed_rows = list(
+        hist.iter_changed_hashed(
             target,
-            src_con_struct,
-            wattro_api,
-            is_dry_run,
-            src_data=[changed],
-            update=True,
+            src_data_known_idents,
+            ident,
+            hashes=get_hashes(src_data_known_idents, src_con_struct, state.get_pool()),
         )
+    )
+    migrated = hist.migrated - migrated
+    if migrated > 0:
+        logging.info("%i Einträge der Historie auf Ziel-Hashes umgestellt.", migrated)
+    if compared_all and not is_dry_run:
+        hist.mark_record_hashed(target)
+        if tracks_changes:
+            hist.set_mapping(target, src_con_struct.field_mapping)
+
+    # worker threads do not inherit the context (log fields, base folder)
+    context = contextvars.copy_context()
+
+    def update_one(changed: dict) -> tuple[bool, None | dict[str, str], None | str]:
+        """success, field hashes for partial updates and the error if it was rejected"""
+        with log_fields(phase="update", ident=changed.get(ident, "")):
+            if src_con_struct.partial_updates:
+                return send_partial_update(
+                    target,
+                    src_con_struct,
+                    wattro_api,
+                    is_dry_run,
+                    changed,
+                    hist.get_field_hashes(target, str(changed[ident])),
+                    timings=timings,
+                )
+            success, error = send_update(
+                target, src_con_struct, wattro_api, is_dry_run, changed, timings
+            )
+            return success, None, error
+
+    # the rate controller of the api decides how many requests are really in flight
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=wattro_api.get_max_concurrency()
+    ) as pool:
+        results = list(
+            pool.map(
+                lambda changed: context.copy().run(update_one, changed[0]),
+                changed_rows,
+            )
+        )
+    for (changed, hashed), (success, field_hashes, error) in zip(changed_rows, results):
+        key = str(changed[ident])
         if success:
             success_updates += 1
             if not is_dry_run:
-                hist.update(target, changed, ident)
+                hist.update(target, changed, ident, hashed)
+                dead_letters.resolve(target, key)
+                if field_hashes is not None:
+                    hist.update_field_hashes(target, key, field_hashes)
         else:
             failed_updates += 1
+            keep_logged.add(key)
+            if error is not None and not is_dry_run:
+                dead_letters.record(target, key, history.hash_row(changed), error)
     logging.info(
         f"Sync für %s abgeschlossen. Bearbeitet: %i (erfolgreich: %i | nicht erfolgreich: %i)",
         target,
@@ -174,67 +465,589 @@ def sync(
         success_updates,
         failed_updates,
     )
-    if not is_dry_run and success_updates > 0:
+    if not is_dry_run and (
+        success_updates > 0 or migrated > 0 or full_rows or remapped
+    ):
         hist.save()
+        timings.save()
+    if not is_dry_run:
+        dead_letters.save()
+        src_api.ack_changes(keep_logged)
     return success_updates, failed_updates
 
 
+def skip_quarantined(
+    target: str, src_data: DBRes, ident: str, dead_letters: DeadLetters
+) -> DBRes:
+    """leave out rows of the dead letter store that did not change and are not due yet"""
+    quarantined = dead_letters.keys(target)
+    if not quarantined:
+        return src_data
+    rows = [
+        row
+        for row, val in zip(src_data.rows, src_data)
+        if str(val[ident]) not in quarantined
+        or not dead_letters.should_skip(target, str(val[ident]), history.hash_row(val))
+    ]
+    skipped = len(src_data.rows) - len(rows)
+    if skipped > 0:
+        logging.info(
+            "%i Datensätze in Quarantäne übersprungen "
+            "(siehe `python -m wattro_sync.dead_letter list`).",
+            skipped,
+        )
+    return DBRes(src_data.description, rows, src_data.type_codes, src_data.nullable)
+
+
+def get_hashes(
+    src_data: Sequence[dict],
+    src_con_struct: ConnectionStructure,
+    pool: None | concurrent.futures.Executor,
+) -> Iterator[str]:
+    """hashes of the transformed records, large results are hashed in the process pool"""
+    field_mapping, encoding = src_con_struct.field_mapping, src_con_struct.encoding
+    if pool is not None and parallel.use_pool(pool, src_data):
+        assert isinstance(src_data, DBRes)  # nosec
+        return parallel.iter_hashes(pool, src_data, field_mapping, encoding)
+    return (
+        history.hash_record(record) if isinstance(record, dict) else history.NO_HASH
+        for record in iter_transform_safe(src_data, field_mapping, encoding)
+    )
+
+
+def get_src_api(
+    target: str, src_con_struct: ConnectionStructure, state: SyncState
+) -> None | SrcCli:
+    """check the source and create its api, or reuse the api of an earlier run"""
+    src_api = state.src_apis.get(target, None)
+    if src_api is not None:
+        return src_api
+    source_api_struct = ApiNameToStructureMapping[src_con_struct.connection_type]
+    api_class: type[SrcCli] = source_api_struct.api
+    try:
+        src_api = api_class.get_healthy_connection(src_con_struct.sync_info)
+    except ConnectionError:
+        logging.error("Prozess für %s abgebrochen.", target)
+        return None
+    src_api.project(mapping_columns(src_con_struct.field_mapping))
+    state.src_apis[target] = src_api
+    return src_api
+
+
+def field_mapping_is_valid(
+    target: str, src_con_struct: ConnectionStructure, wattro_api: WattroNodeApi
+) -> bool:
+    """check the field mapping against the (cached) field description of wattro"""
+    try:
+        fields = wattro_api.get_fields(TARGET_NODE_MAPPING[target])
+    except (
+        ConnectionError,
+        requests.RequestException,
+        KeyError,
+        TypeError,
+        ValueError,
+    ) as err:
+        # e.g. unreachable, no OPTIONS support or an answer that is no field description
+        logging.warning(
+            "Feldbeschreibung für %s nicht verfügbar. Überspringe Prüfung: %r",
+            target,
+            err,
+        )
+        return True
+    for warning in field_mapping_warnings(src_con_struct.field_mapping, fields):
+        logging.warning("Konfiguration für %s: %s", target, warning)
+    issues = field_mapping_issues(src_con_struct.field_mapping, fields)
+    for issue in issues:
+        logging.error("Konfiguration für %s: %s", target, issue)
+    return not issues
+
+
+@dataclasses.dataclass
+class Estimate:
+    target: str
+    new: int
+    changed: int
+    unchanged: int
+    payload_bytes: int
+    requests: int
+    seconds: None | float
+    # changed and unchanged are extrapolated from a sample of the known rows
+    approximate: bool = False
+
+    def log(self) -> None:
+        runtime = "unbekannt" if self.seconds is None else f"{self.seconds:.1f} s"
+        logging.info(
+            "Schätzung für %s: %i neu, %s%i geändert, %s%i unverändert | "
+            "ca. %.1f kB in %i Anfragen | Laufzeit: %s",
+            self.target,
+            self.new,
+            "ca. " if self.approximate else "",
+            self.changed,
+            "ca. " if self.approximate else "",
+            self.unchanged,
+            self.payload_bytes / 1024,
+            self.requests,
+            runtime,
+        )
+
+
+def estimate(
+    target: str,
+    src_con_struct: ConnectionStructure,
+    wattro_api: WattroNodeApi,
+    state: SyncState,
+    sample_size: int = 200,
+) -> None | Estimate:
+    """
+    count pending work without transforming all rows or sending anything.
+    Only a random sample of the known rows is transformed and compared,
+    the changed count is extrapolated from it and thus approximate.
+    """
+    src_api = get_src_api(target, src_con_struct, state)
+    if src_api is None:
+        return None
+    ident = src_con_struct.sync_info.collection_info.ident
+    known_idents = wattro_api.get_idents(target)
+    full_rows = state.get_history().needs_full_rows(target)
+    with src_api.session():
+        src_data_new_idents = src_api.get_new(known_idents)
+        with src_api.unprojected() if full_rows else contextlib.nullcontext():
+            src_data_known_idents = src_api.get_old(known_idents)
+    known_count = len(src_data_known_idents)
+    approximate = known_count > sample_size
+    sample = [
+        src_data_known_idents[i]
+        for i in random.sample(range(known_count), k=min(known_count, sample_size))
+    ]
+    changed = list(
+        state.get_history().iter_changed(
+            target, sample, ident, hashes=get_hashes(sample, src_con_struct, None)
+        )
+    )
+    scale = known_count / len(sample) if sample else 0.0
+    new_count, changed_count = len(src_data_new_idents), round(len(changed) * scale)
+
+    seconds: None | float = 0.0
+    timings = state.get_timings()
+    pending: list[tuple[RequestKind, int]] = [
+        ("bulk", new_count),
+        ("update", changed_count),
+    ]
+    for kind, count in pending:
+        rate = timings.seconds_per_record(target, kind)
+        if count == 0:
+            continue
+        if rate is None or seconds is None:
+            seconds = None
+            continue
+        seconds += rate * count
+
+    return Estimate(
+        target=target,
+        new=new_count,
+        changed=changed_count,
+        unchanged=known_count - changed_count,
+        payload_bytes=_estimate_payload_bytes(src_data_new_idents, src_con_struct)
+        + round(_estimate_payload_bytes(changed, src_con_struct) * scale),
+        requests=int(new_count > 0) + changed_count,
+        seconds=seconds,
+        approximate=approximate,
+    )
+
+
+def _estimate_payload_bytes(
+    src_data: Sequence[dict], src_con_struct: ConnectionStructure, sample_size=20
+) -> int:
+    """extrapolate from the transformed size of a few random rows"""
+    count = len(src_data)
+    if count == 0:
+        return 0
+    sample = [
+        src_data[i] for i in random.sample(range(count), k=min(count, sample_size))
+    ]
+    transformed = transform(
+        sample, src_con_struct.field_mapping, src_con_struct.encoding
+    )
+    sample_bytes = sum(len(json.dumps(data).encode()) for data in transformed)
+    return round(sample_bytes / len(sample) * count)
+
+
+def compact(
+    target: str,
+    src_con_struct: ConnectionStructure,
+    wattro_api: WattroNodeApi,
+    state: SyncState,
+) -> tuple[int, int]:
+    """
+    drop history entries whose ident is gone from both wattro and the source,
+    returns removed entries and reclaimed bytes. The history is not saved.
+    Sources that return only part of their rows (e.g. a view of the latest changes
+    or a filtering hardcoded_select) keep the entries of records wattro still has.
+    """
+    src_api = get_src_api(target, src_con_struct, state)
+    if src_api is None:
+        return 0, 0
+    try:
+        live = set(map(str, wattro_api.get_idents(target))) | set(src_api.get_idents())
+    except Exception as err:
+        logging.error("Kompaktierung für %s fehlgeschlagen: %s", target, err)
+        return 0, 0
+    hist = state.get_history()
+    if not live and hist.full_hist.get(target):
+        # an empty answer more likely means an outage than an empty system
+        logging.warning(
+            "Keine Idents für %s gefunden. Historie wird nicht kompaktiert.", target
+        )
+        return 0, 0
+    removed, reclaimed = hist.compact(target, live)
+    logging.info(
+        "Historie für %s kompaktiert: %i Einträge entfernt, %.1f kB freigegeben.",
+        target,
+        removed,
+        reclaimed / 1024,
+    )
+    return removed, reclaimed
+
+
+def compact_if_due(
+    targets: dict[str, ConnectionStructure],
+    wattro_api: WattroNodeApi,
+    state: SyncState,
+    every: int,
+) -> None:
+    """compact the history every `every` runs, 0 disables it"""
+    if every <= 0:
+        return
+    timings = state.get_timings()
+    if timings.count_run("compaction") >= every:
+        removed = 0
+        for target, connection_struct in targets.items():
+            removed += compact(target, connection_struct, wattro_api, state)[0]
+        if removed > 0:
+            state.get_history().save()
+        timings.reset_runs("compaction")
+    timings.save()
+
+
+class TransformedRecords(Iterable[dict]):
+    """Transforms while it is iterated, so bulk uploads can be encoded as a stream."""
+
+    def __init__(
+        self,
+        src_data: Sequence[dict],
+        field_mapping: FieldMapping,
+        encoding: str,
+        pool: None | concurrent.futures.Executor = None,
+    ):
+        self.src_data = src_data
+        self.field_mapping = field_mapping
+        self.encoding = encoding
+        self.pool = pool
+        self.hashes: None | list[str] = None
+        self.failed: dict[int, str] = {}
+
+    def __iter__(self) -> Iterator[dict]:
+        """rows that fail to transform are left out and collected in `failed`"""
+        # the hashes of the last complete pass, to store them once the upload succeeded
+        hashes, failed = [], {}
+        for idx, record in enumerate(self._iter_records()):
+            if isinstance(record, Exception):
+                failed[idx] = describe_error(record)
+                hashes.append(history.NO_HASH)
+                continue
+            hashes.append(history.hash_record(record))
+            yield record
+        self.hashes, self.failed = hashes, failed
+
+    def part(self, start: int, stop: int) -> "TransformedRecords":
+        """the records of `src_data[start:stop]`, transformed again while iterated"""
+        if isinstance(self.src_data, DBRes):
+            res = self.src_data
+            src_part: Sequence[dict] = DBRes(
+                res.description, res.rows[start:stop], res.type_codes, res.nullable
+            )
+        else:
+            src_part = self.src_data[start:stop]
+        return TransformedRecords(src_part, self.field_mapping, self.encoding)
+
+    def _iter_records(self) -> Iterator[dict | Exception]:
+        if self.pool is not None and parallel.use_pool(self.pool, self.src_data):
+            assert isinstance(self.src_data, DBRes)  # nosec
+            return parallel.iter_transform(
+                self.pool, self.src_data, self.field_mapping, self.encoding
+            )
+        return iter_transform_safe(self.src_data, self.field_mapping, self.encoding)
+
+
 def send_to_wattro(
     target: str,
     src_con_struct: ConnectionStructure,
     wattro_api: WattroNodeApi,
     is_dry_run: bool,
     src_data: Sequence[dict],
-    update=False,
-) -> bool:
-    """send to wattro. return Fail if write failed"""
+    timings: None | RequestTimings = None,
+    records: None | TransformedRecords = None,
+) -> tuple[bool, dict[int, str], Collection[int]]:
+    """
+    bulk create `src_data` in wattro. returns False if the write failed, the rows
+    that could not be transformed or were refused by wattro (index in `src_data` -> error)
+    and the indices that were sent in accepted requests, also when the write failed.
+    Refused rows are left out instead of failing the whole batch.
+    `records` may hold the already transformed `src_data`.
+    """
     if len(src_data) == 0:
-        return True
-    new_target_data = transform(
-        src_data, src_con_struct.field_mapping, src_con_struct.encoding
-    )
+        return True, {}, range(0)
     if is_dry_run:
+        new_target_data = transform(
+            src_data, src_con_struct.field_mapping, src_con_struct.encoding
+        )
         count = len(new_target_data)
         logging.info("DRY RUN - Es wurden %i Datensätze erzeugt.", count)
         logging.info("Beispiel Datensätze (quelle --> ziel):")
         k = min(count, 3)
         for i in random.sample(range(count), k=k):
             logging.info("%s --> %s", src_data[i], new_target_data[i])
-        return True
+        return True, {}, range(0)
     logging.info("Schreibe Daten nach Wattro.")
-    success = True
+    if records is None:
+        records = TransformedRecords(
+            src_data, src_con_struct.field_mapping, src_con_struct.encoding
+        )
+    rejected: dict[int, str] = {}
+    created: Collection[int] = range(len(src_data))
+    start = time.perf_counter()
     try:
-        if not update:
-            wattro_api.bulk_create(target, new_target_data)
-        else:
-            wattro_api.update_by_ident(target, new_target_data[0])
+        try:
+            wattro_api.bulk_create(target, records)
+        except RequestRejected as issue:
+            logging.warning("Wattro lehnt Datensätze ab (%s). Isoliere...", issue)
+            complete, accepted, rejected = isolate_rejected(
+                wattro_api, target, records, issue
+            )
+            created = set(itertools.chain.from_iterable(accepted))
+            if not complete:
+                return False, {**records.failed, **rejected}, created
+    except ROW_ERRORS as err:
+        logging.error("Umwandlung von %s fehlgeschlagen. %s", src_data, err)
+        return False, {}, range(0)
     except ConnectionError as issue:
-        logging.error("Schreiben von %s fehlgeschlagen. %s", new_target_data, issue)
-        success = False
+        logging.error(
+            "Schreiben von %i Datensätzen fehlgeschlagen. %s", len(src_data), issue
+        )
+        return False, {}, range(0)
+    if timings is not None:
+        timings.record(target, "bulk", time.perf_counter() - start, len(src_data))
     logging.info("abgeschlossen.")
-    return success
+    return True, {**records.failed, **rejected}, created
+
+
+def send_update(
+    target: str,
+    src_con_struct: ConnectionStructure,
+    wattro_api: WattroNodeApi,
+    is_dry_run: bool,
+    changed: dict,
+    timings: None | RequestTimings = None,
+) -> tuple[bool, None | str]:
+    """
+    update one changed row in wattro. returns False if the write failed,
+    and the error if the row could not be transformed or was refused by wattro
+    """
+    try:
+        record = transform(
+            [changed], src_con_struct.field_mapping, src_con_struct.encoding
+        )[0]
+    except ROW_ERRORS as err:
+        logging.error("Umwandlung von %s fehlgeschlagen. %s", changed, err)
+        return False, describe_error(err)
+    if is_dry_run:
+        logging.info("DRY RUN - %s --> %s", changed, record)
+        return True, None
+    start = time.perf_counter()
+    try:
+        wattro_api.update_by_ident(target, record)
+    except RequestRejected as issue:
+        logging.error("Wattro lehnt %s ab. %s", changed, issue)
+        return False, describe_error(issue)
+    except ConnectionError as issue:
+        logging.error("Schreiben von %s fehlgeschlagen. %s", changed, issue)
+        return False, None
+    if timings is not None:
+        timings.record(target, "update", time.perf_counter() - start, 1)
+    return True, None
+
+
+def isolate_rejected(
+    wattro_api: WattroNodeApi,
+    target: str,
+    records: TransformedRecords,
+    issue: RequestRejected,
+) -> tuple[bool, list[range], dict[int, str]]:
+    """
+    `records` were rejected as a whole with `issue`. Send them in halves until
+    the rejected ones are found. Returns whether that succeeded, the ranges of
+    the created halves and the index of the rejected rows with the error.
+    Gives up on connection errors and once both halves of a split are rejected
+    with the same error, which points to a problem of the whole batch.
+    Each half is transformed again while it is sent, nothing is held in memory.
+    """
+    accepted: list[range] = []
+    rejected: dict[int, str] = {}
+    pending = [(0, len(records.src_data), issue)]
+    while pending:
+        start, stop, issue = pending.pop()
+        if stop - start == 1:
+            if start not in records.failed:
+                rejected[start] = describe_error(issue)
+            continue
+        middle = (start + stop) // 2
+        errors = []
+        for part_start, part_stop in ((start, middle), (middle, stop)):
+            try:
+                wattro_api.bulk_create(target, records.part(part_start, part_stop))
+            except RequestRejected as part_issue:
+                pending.append((part_start, part_stop, part_issue))
+                errors.append(describe_error(part_issue))
+            except ConnectionError as err:
+                logging.error("Isolieren abgebrochen. %s", err)
+                return False, accepted, rejected
+            else:
+                accepted.append(range(part_start, part_stop))
+        # single rows are cheaper to reject one by one than to give up on
+        if len(errors) == 2 and errors[0] == errors[1] and middle - start > 1:
+            logging.error(
+                "Beide Hälften mit demselben Fehler abgelehnt, Isolieren abgebrochen. %s",
+                errors[0],
+            )
+            return False, accepted, rejected
+    logging.info("%i Datensätze abgelehnt.", len(rejected))
+    return True, accepted, rejected
+
+
+def describe_error(err: Exception) -> str:
+    return f"{type(err).__name__}: {err}"
+
+
+def send_partial_update(
+    target: str,
+    src_con_struct: ConnectionStructure,
+    wattro_api: WattroNodeApi,
+    is_dry_run: bool,
+    changed: dict,
+    known_field_hashes: None | dict[str, str],
+    timings: None | RequestTimings = None,
+) -> tuple[bool, dict[str, str], None | str]:
+    """
+    send the ident and only the target fields that changed since the last sync.
+    Without known field hashes the full record is sent.
+    returns success, the field hashes of the record and, like `send_update`, the error
+    """
+    try:
+        record = transform(
+            [changed], src_con_struct.field_mapping, src_con_struct.encoding
+        )[0]
+    except ROW_ERRORS as err:
+        logging.error("Umwandlung von %s fehlgeschlagen. %s", changed, err)
+        return False, {}, describe_error(err)
+    field_hashes = history.hash_fields(record)
+    if known_field_hashes is None or TARGET_IDENT_FIELD not in record:
+        partial = None
+    else:
+        partial = {
+            key: val
+            for key, val in record.items()
+            if key == TARGET_IDENT_FIELD
+            or known_field_hashes.get(key, None) != field_hashes[key]
+        }
+        if len(partial) == 1:
+            logging.debug("Keine Änderung an Zielfeldern von %s.", changed)
+            return True, field_hashes, None
+    if is_dry_run:
+        logging.info("DRY RUN - %s --> %s", changed, partial or record)
+        return True, field_hashes, None
+    start = time.perf_counter()
+    try:
+        if partial is None:
+            wattro_api.update_by_ident(target, record)
+        else:
+            wattro_api.partial_update_by_ident(target, partial)
+    except RequestRejected as issue:
+        logging.error("Wattro lehnt %s ab. %s", changed, issue)
+        return False, field_hashes, describe_error(issue)
+    except ConnectionError as issue:
+        logging.error("Schreiben von %s fehlgeschlagen. %s", changed, issue)
+        return False, field_hashes, None
+    if timings is not None:
+        timings.record(target, "update", time.perf_counter() - start, 1)
+    return True, field_hashes, None
 
 
 def transform(
     new_src_data: Iterable[dict], field_mapping: FieldMapping, encoding: str
 ) -> list[dict]:
-    new_data_list = []
-    for raw_src in new_src_data:
+    return list(iter_transform(new_src_data, field_mapping, encoding))
+
+
+def iter_transform(
+    new_src_data: Iterable[dict], field_mapping: FieldMapping, encoding: str
+) -> Iterator[dict]:
+    for src in iter_parsed(new_src_data, encoding):
+        yield transform_row(src, field_mapping)
+
+
+def iter_transform_safe(
+    new_src_data: Iterable[dict], field_mapping: FieldMapping, encoding: str
+) -> Iterator[dict | Exception]:
+    """like iter_transform, but a row that fails yields its error instead of stopping"""
+    for src in iter_parsed(new_src_data, encoding):
+        try:
+            yield transform_row(src, field_mapping)
+        except ROW_ERRORS as err:
+            yield err
+
+
+def transform_row(src: dict, field_mapping: FieldMapping) -> dict:
+    new_data = {}
+    for field_name, field_map in field_mapping.items():
+        src_str = field_map["src"]
+        if src_str is None:
+            continue
+        if isinstance(src_str, int):
+            raise RuntimeError(
+                "Fehlkonfiguration Feld: {field_name}. Quelle ist fester Wert."
+            )
+        new_data[field_name] = get_date(field_map, field_name, src, src_str)
+    return new_data
+
+
+def mapping_columns(field_mapping: FieldMapping) -> set[str]:
+    """source columns referenced by the `{placeholders}` of the field mapping"""
+    columns = set()
+    for field_map in field_mapping.values():
+        src_str = field_map["src"]
+        if not isinstance(src_str, str):
+            continue
+        templates = [src_str]
+        while templates:
+            for _, name, spec, _ in string.Formatter().parse(templates.pop()):
+                if name:
+                    # "{col.attr}" and "{col[0]}" read `col`
+                    columns.add(re.split(r"[.\[]", name, maxsplit=1)[0])
+                if spec:
+                    # e.g. "{col:>{width}}"
+                    templates.append(spec)
+    return columns
+
+
+def iter_parsed(src_data: Iterable[dict], encoding: str) -> Iterator[dict]:
+    """decode source rows, using the column plan of the result if there is one"""
+    if isinstance(src_data, DBRes):
+        yield from src_data.iter_decoded(encoding)
+        return
+    for raw_src in src_data:
         if not isinstance(raw_src, dict):
             raise RuntimeError(f"Wrong instance format: {raw_src!r}")
-        src = parse_raw_src(raw_src, encoding)
-        new_data = {}
-        for field_name, field_map in field_mapping.items():
-            src_str = field_map["src"]
-            if src_str is None:
-                continue
-            if isinstance(src_str, int):
-                raise RuntimeError(
-                    "Fehlkonfiguration Feld: {field_name}. Quelle ist fester Wert."
-                )
-            new_data[field_name] = get_date(field_map, field_name, src, src_str)
-        new_data_list.append(new_data)
-    return new_data_list
+        yield parse_raw_src(raw_src, encoding)
 
 
 def parse_raw_src(raw_src: dict, encoding: str) -> dict[str, int | str]:
@@ -246,7 +1059,7 @@ def parse_raw_src(raw_src: dict, encoding: str) -> dict[str, int | str]:
             try:
                 str_val = val.decode(encoding=encoding)
             except UnicodeDecodeError as decode_err:
-                logging.warning(decode_err.reason, key, val)
+                logging.warning("%s: %s (%r)", key, decode_err.reason, val)
                 str_val = val.decode(encoding=encoding, errors="ignore")
             src[key] = str_val
         else:
@@ -291,6 +1104,13 @@ def parse_args() -> argparse.Namespace:
         help="Dry Run. Modifiziert keine Daten. Impliziert -v",
         default=False,
     )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="Zählt neue, geänderte und unveränderte Datensätze und schätzt "
+        "Datenmenge und Laufzeit. Modifiziert keine Daten. Impliziert -v",
+        default=False,
+    )
     parser.add_argument(
         "--limit_src",
         help="Schränkt die Quellsysteme ein.",
@@ -304,8 +1124,69 @@ def parse_args() -> argparse.Namespace:
         nargs="*",
     )
     parser.add_argument("-v", help="Setzt das Loglevel auf 'info'", action="store_true")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Anzahl Prozesse für Umwandlung und Hashing großer Datenmengen. "
+        "0 oder 1: kein Prozesspool.",
+        default=0,
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Läuft dauerhaft und synchronisiert im Intervall. Beenden mit SIGINT/SIGTERM.",
+        default=False,
+    )
+    parser.add_argument(
+        "--interval",
+        type=positive_int,
+        help="Sekunden zwischen zwei Durchläufen im Daemon Modus, "
+        "sofern für das Ziel kein 'interval' konfiguriert ist.",
+        default=300,
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        help="Maximale zufällige Verzögerung in Sekunden je Durchlauf im Daemon Modus.",
+        default=0.0,
+    )
+    parser.add_argument(
+        "--compact_every",
+        type=int,
+        help="Entfernt alle N Läufe Einträge aus der Historie, deren Ident weder in Wattro "
+        "noch in der Quelle existiert. 0 (Standard): nie.",
+        default=0,
+    )
+    add_log_args(parser)
     return parser.parse_args()
 
 
+def add_log_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--log_json",
+        action="store_true",
+        help="Schreibt logs.jsonl (eine JSON Zeile je Eintrag, mit target, phase und ident) "
+        "statt logs.log.",
+        default=False,
+    )
+    parser.add_argument(
+        "--log_max_mb",
+        type=int,
+        help="Rotiert die Logdatei ab dieser Größe in MB.",
+        default=10,
+    )
+    parser.add_argument(
+        "--log_rotate_when",
+        help="Rotiert die Logdatei zeitbasiert statt nach Größe, z.B. 'midnight' oder 'W0'.",
+        default=None,
+    )
+    parser.add_argument(
+        "--log_backups",
+        type=int,
+        help="Anzahl aufbewahrter, gzip-komprimierter alter Logdateien.",
+        default=5,
+    )
+
+
 if __name__ == "__main__":
     exit(main())